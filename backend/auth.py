@@ -5,6 +5,7 @@ from jose import JWTError, jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from models import SessionLocal, User, Empresa, Profile
+from services_audit import set_audit_principal, audit_principal_names
 from sqlalchemy.orm import Session
 from dotenv import load_dotenv
 
@@ -82,7 +83,9 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
                 "canCreateFuncionarios": True,
                 "isEmpresa": True
             }
-            return {"type": "empresa", "data": empresa, "profileStatus": "active", "permissions": permissions}
+            current_user = {"type": "empresa", "data": empresa, "profileStatus": "active", "permissions": permissions}
+            set_audit_principal(*audit_principal_names(current_user))
+            return current_user
         # If has empresa_id but not found, invalid token for company
         raise credentials_exception
 
@@ -94,6 +97,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     # Determine permissions and profile status
     profile_status = "active"
     permissions = {}
+    profile = None
     
     if user.role == "admin":
         # Admins get all permissions from Profile schema
@@ -115,7 +119,9 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         # Add special user-level flags
         permissions["isIntegrationApprover"] = user.isIntegrationApprover
     
-    return {"type": "user", "data": user, "profileStatus": profile_status, "permissions": permissions}
+    current_user = {"type": "user", "data": user, "profileStatus": profile_status, "permissions": permissions}
+    set_audit_principal(*audit_principal_names(current_user, profile))
+    return current_user
 
 def check_permission(permission_name: str):
     def permission_checker(current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
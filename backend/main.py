@@ -2,9 +2,32 @@ import os
 from fastapi import FastAPI, Depends, HTTPException, status, File, UploadFile, Form, Body, Response, Request
 from sqlalchemy.orm import Session
 import models
-from models import SessionLocal, engine, Empresa, Contrato, Documento, User, Profile
+from models import SessionLocal, Empresa, Contrato, Documento, User, Profile
 from auth import create_access_token, get_current_user, check_permission, get_db, verify_google_token, check_integration_approver
-from services import ReportingService
+from services import ReportingService, iter_file
+from services_cache import cubo_cache, report_cache, cached_report
+from services_cubo import CuboQueryError, cubo_limiter, cubo_user_key, parse_as_of
+from services_jobs import ReportJobService, start_worker_threads
+from services_snapshots import validate_schedule, next_run, read_materialized_rows
+from services_analytics import CUBO_ANALYTICS_ENABLED, cubo_engine, start_refresher_thread
+from services_historico import HISTORICO_BULK_MAX, HISTORICO_BULK_FORMATS, check_bulk_format, load_employee_histories, iter_bulk_histories, bulk_subtitle, bulk_filename
+from services_pdf import branding_cache
+from services_pool import CPUPoolBusy, cpu_pool
+from services_dashboard import dashboard_stats, approvals_per_day
+from services_events import (
+    EVENT_WORKERS, event_bus, start_event_workers, DocumentUploaded, DocumentStatusChanged,
+    EmployeeDocumentUploaded, EmployeeDocumentStatusChanged, EmpresaInactivated
+)
+from services_feed import FeedFull, FeedSubscriber, change_feed, iter_feed
+from services_funcionarios import documentary_status, status_as_of, approve_when_documents_complete, inactivate_empresa_employees
+from services_audit import AuditMiddleware, audit_writer, audit_principal_names, set_audit_principal, encode_log_cursor, decode_log_cursor
+from services_retention import load_archived_rows, load_archived_page, merge_archived
+from services_uploads import upsert_documento, upsert_anexo, upsert_anexo_funcionario, record_upload_history
+from services_regras import (
+    authorized_categoria_ids, documentos_exigidos_contrato, sync_categoria_documentos, delete_categoria_relations,
+    sync_cubo_membros, delete_cubo_relations
+)
+from services_export import EXPORT_FORMATS, check_export_format, iter_export, query_batches, export_filename
 from pydantic import BaseModel
 from typing import List, Optional, Generic, TypeVar
 
@@ -12,15 +35,36 @@ T = TypeVar('T')
 
 from datetime import datetime, timedelta
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, JSONResponse
 import hashlib
 import re
 from pydantic import field_validator
 from typing import Any
 import json
-
-models.Base.metadata.create_all(bind=engine)
-
-app = FastAPI(title="Gestão de Contratos API")
+import threading
+import time
+import asyncio
+import itertools
+from contextlib import asynccontextmanager
+
+# O esquema é criado/atualizado pelas migrações (alembic upgrade head), não na importação
+
+# Workers da fila de relatórios dentro do processo da API (0 = usar apenas o worker.py)
+REPORT_JOB_WORKERS = int(os.getenv("REPORT_JOB_WORKERS", "1"))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    stop_event = threading.Event()
+    start_worker_threads(REPORT_JOB_WORKERS, stop_event)
+    start_event_workers(EVENT_WORKERS, stop_event)
+    if CUBO_ANALYTICS_ENABLED:
+        start_refresher_thread(stop_event)
+    yield
+    stop_event.set()
+    cpu_pool.shutdown()
+    audit_writer.close()
+
+app = FastAPI(title="Gestão de Contratos API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -30,6 +74,72 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Auditoria: contexto (rota + principal) das requisições de escrita para os hooks da sessão
+app.add_middleware(AuditMiddleware)
+
+@app.exception_handler(CuboQueryError)
+async def cubo_query_error_handler(request: Request, exc: CuboQueryError):
+    return JSONResponse(status_code=exc.status_code, content={"detail": str(exc)})
+
+@app.exception_handler(CPUPoolBusy)
+async def cpu_pool_busy_handler(request: Request, exc: CPUPoolBusy):
+    return JSONResponse(status_code=exc.status_code, content={"detail": str(exc)}, headers={"Retry-After": "5"})
+
+@app.exception_handler(FeedFull)
+async def feed_full_handler(request: Request, exc: FeedFull):
+    return JSONResponse(status_code=exc.status_code, content={"detail": str(exc)}, headers={"Retry-After": "30"})
+
+def export_response(fmt: str, source, base_filename: str, slot_key: str = None):
+    """
+    StreamingResponse para exportações CSV/NDJSON/Parquet; `source(db)` devolve (cabeçalhos, lotes).
+    Com slot_key, a exportação ocupa uma vaga do limite de execuções do cubo até o fim do stream.
+    """
+    try:
+        check_export_format(fmt)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    body = iter_export(fmt, source)
+    if slot_key:
+        body = cubo_limiter.iter_with_slot(slot_key, body)
+    # Primeiro bloco gerado antes da resposta: erro até aqui (consulta, limite de linhas,
+    # Parquet inteiro) ainda sai com o status certo; depois do status 200 vira marca no arquivo
+    try:
+        first = next(body)
+    except StopIteration:
+        first = b""
+    return StreamingResponse(
+        itertools.chain([first], body),
+        media_type=EXPORT_FORMATS[fmt],
+        headers={
+            "Content-Disposition": f"attachment; filename={export_filename(base_filename, fmt)}",
+            "Access-Control-Expose-Headers": "Content-Disposition"
+        }
+    )
+
+def cached_pdf_response(request: Request, cache_key: str, render, filename: str, not_found: str):
+    """
+    PDF servido do cache em disco (services_cache.report_cache) com ETag = chave do cache.
+    If-None-Match igual à chave responde 304 sem ler nem renderizar o arquivo.
+    """
+    etag = f'"{cache_key}"'
+    if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+
+    pdf_content = cached_report(cache_key, render)
+    if not pdf_content:
+        raise HTTPException(status_code=404, detail=not_found)
+
+    return Response(
+        content=pdf_content,
+        media_type="application/pdf",
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}",
+            "ETag": etag,
+            "Cache-Control": "private, no-cache",
+            "Access-Control-Expose-Headers": "Content-Disposition, ETag"
+        }
+    )
+
 # Helper para obter status atual do funcionário
 def get_current_status(db: Session, funcionario_id: int):
     return db.query(models.StatusFuncionario).filter(models.StatusFuncionario.funcionarioId == funcionario_id).order_by(models.StatusFuncionario.id.desc()).first()
@@ -51,23 +161,9 @@ def get_authorized_categories(current_user: dict, db: Session):
     if not user.profileId:
         return []
 
-    # Get categories linked to this profile in the Cubos table (Approval Rules)
-    cubos = db.query(models.Cubo).all()
-    authorized_ids = []
-    
-    import json
-    for cubo in cubos:
-        try:
-            profile_ids = json.loads(cubo.perfilIds) if cubo.perfilIds else []
-            if user.profileId in profile_ids:
-                cat_ids = json.loads(cubo.categoriaIds) if cubo.categoriaIds else []
-                authorized_ids.extend(cat_ids)
-        except (json.JSONDecodeError, TypeError):
-            continue
-            
-    # Return the unique list of authorized category IDs.
+    # Categories linked to this profile by the Cubos (Approval Rules), joined in SQL.
     # If empty, the user will see no documents.
-    return list(set(authorized_ids))
+    return authorized_categoria_ids(db, user.profileId)
 
 # Dependency
 def get_db():
@@ -201,7 +297,7 @@ class PaginatedResponse(BaseModel, Generic[T]):
 class DocumentoResponse(BaseModel):
     id: int
     titulo: str
-    data: str
+    data: datetime
     contratoId: int
     contratoNome: str
     empresaId: int
@@ -274,6 +370,31 @@ class CuboSnapshotUpdate(BaseModel):
     dateRangeStart: Optional[str] = None
     dateRangeEnd: Optional[str] = None
 
+class CuboSnapshotAgendamentoRequest(BaseModel):
+    frequencia: str # DIARIA | SEMANAL
+    horario: str # HH:MM
+    diaSemana: Optional[int] = None # 0 = segunda ... 6 = domingo
+    periodoRelativo: Optional[str] = None # ex.: ultimos_30_dias, mes_anterior
+    ativo: bool = True
+
+class CuboSnapshotAgendamentoResponse(BaseModel):
+    snapshotId: int
+    frequencia: str
+    horario: str
+    diaSemana: Optional[int] = None
+    periodoRelativo: Optional[str] = None
+    ativo: bool
+    proximaExecucao: Optional[datetime] = None
+    status: Optional[str] = None
+    mensagem: Optional[str] = None
+    ultimaExecucao: Optional[datetime] = None
+    materializadoEm: Optional[datetime] = None
+    dataInicioResolvida: Optional[str] = None
+    dataFimResolvida: Optional[str] = None
+    linhas: Optional[int] = None
+    class Config:
+        from_attributes = True
+
 class CuboSnapshotResponse(BaseModel):
     id: int
     nome: str
@@ -284,6 +405,22 @@ class CuboSnapshotResponse(BaseModel):
     dateRangeEnd: Optional[str] = None
     userId: Optional[int] = None
     createdAt: datetime
+    agendamento: Optional[CuboSnapshotAgendamentoResponse] = None
+    class Config:
+        from_attributes = True
+
+class RelatorioJobResponse(BaseModel):
+    id: str
+    tipo: str
+    status: str
+    progresso: Optional[int] = 0
+    mensagem: Optional[str] = None
+    filename: Optional[str] = None
+    tamanho: Optional[int] = None
+    createdAt: Optional[datetime] = None
+    startedAt: Optional[datetime] = None
+    finishedAt: Optional[datetime] = None
+    expiresAt: Optional[datetime] = None
     class Config:
         from_attributes = True
 
@@ -320,10 +457,15 @@ async def google_auth(data: GoogleToken, db: Session = Depends(get_db)):
             loginMethod="google",
             role="user"
         )
+        set_audit_principal(name, "Sem Perfil")
         db.add(user)
         db.commit()
         db.refresh(user)
 
+    profile = db.query(Profile).filter(Profile.id == user.profileId).first() if user.profileId else None
+    user_name, user_perfil = audit_principal_names({"type": "user", "data": user}, profile)
+    audit_writer.record("Login", "LOGIN", "entrou no sistema (Google)", user_name, user_perfil)
+
     access_token = create_access_token(data={"sub": str(user.id), "email": user.email})
     return {"access_token": access_token, "token_type": "bearer"}
 
@@ -340,6 +482,7 @@ async def login_for_access_token(form_data: PrestadoraLogin, db: Session = Depen
             detail="Incorrect company name or access key",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    audit_writer.record("Login", "LOGIN", "entrou no sistema (chave de acesso)", empresa.nome, "PRESTADORA")
     access_token = create_access_token(data={"sub": str(empresa.id), "empresa_id": str(empresa.id)})
     return {"access_token": access_token, "token_type": "bearer"}
 
@@ -390,51 +533,11 @@ def update_empresa(empresa_id: int, empresa: EmpresaCreate, db: Session = Depend
     for key, value in empresa.model_dump().items():
         setattr(db_empresa, key, value)
     
-    db.commit() # Commit first to save company changes
-
-    # Cascade Inactivation if status changed to INATIVO
+    # Cascade Inactivation if status changed to INATIVO (na mesma transação da empresa)
     if empresa.status == "INATIVO" and old_status != "INATIVO":
-        # Find all employees of this company
-        employees = db.query(models.Funcionario).filter(models.Funcionario.empresaId == empresa_id).all()
-        
-        for emp in employees:
-            # Get latest status to copy other fields
-            latest = db.query(models.StatusFuncionario).filter(
-                models.StatusFuncionario.funcionarioId == emp.id
-            ).order_by(models.StatusFuncionario.id.desc()).first()
-            
-            if latest and latest.statusContratual != "INATIVO":
-                new_status = models.StatusFuncionario(
-                    statusContratual="INATIVO",
-                    statusIntegracao=latest.statusIntegracao,
-                    funcionarioId=emp.id,
-                    funcionarioNome=latest.funcionarioNome,
-                    funcaoId=latest.funcaoId,
-                    funcao=latest.funcao,
-                    cargoId=latest.cargoId,
-                    cargo=latest.cargo,
-                    setorId=latest.setorId,
-                    setor=latest.setor,
-                    unidadeIntegracaoId=latest.unidadeIntegracaoId,
-                    unidadeIntegracao=latest.unidadeIntegracao,
-                    unidadeAtividadeId=latest.unidadeAtividadeId,
-                    unidadeAtividade=latest.unidadeAtividade,
-                    empresaId=latest.empresaId,
-                    empresaNome=latest.empresaNome,
-                    dataIntegracao=latest.dataIntegracao,
-                    dataAso=latest.dataAso,
-                    dataValidadeAso=latest.dataValidadeAso,
-                    dataValidadeIntegracao=latest.dataValidadeIntegracao,
-                    prazoAsoDias=latest.prazoAsoDias,
-                    prazoIntegracaoDias=latest.prazoIntegracaoDias,
-                    contratoId=latest.contratoId,
-                    contratoNome=latest.contratoNome,
-                    versao=latest.versao,
-                    data=datetime.now(),
-                    tipo="modificacao_automatica_empresa"
-                )
-                db.add(new_status)
-        db.commit()
+        inactivate_empresa_employees(db, empresa_id)
+        event_bus.emit(db, EmpresaInactivated(empresaId=empresa_id))
+    db.commit()
 
     db.refresh(db_empresa)
     return db_empresa
@@ -669,33 +772,50 @@ def list_documentos(
         "pages": total_pages
     }
 
+@app.get("/documentos/export")
+def export_documentos(
+    format: str = "csv",
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    from sqlalchemy import select
+
+    statement = select(
+        models.Documento.id, models.Documento.titulo, models.Documento.data,
+        models.Documento.contratoId, models.Documento.contratoNome,
+        models.Documento.empresaId, models.Documento.empresaNome,
+        models.Documento.categoriaId, models.Documento.categoriaNome,
+        models.Documento.status, models.Documento.versao, models.Documento.competencia,
+        models.Documento.email, models.Documento.reprovadoPor,
+        models.Documento.funcionarioId, models.Documento.funcionarioNome,
+        models.Documento.createdAt, models.Documento.updatedAt
+    ).order_by(models.Documento.id)
+
+    # Mesmas restrições da listagem
+    if current_user["type"] == "empresa":
+        statement = statement.where(models.Documento.empresaId == current_user["data"].id)
+    else:
+        auth_categories = get_authorized_categories(current_user, db)
+        if auth_categories is not None:
+            statement = statement.where(models.Documento.categoriaId.in_(auth_categories))
+
+    return export_response(
+        format,
+        lambda export_db: (statement.selected_columns.keys(), query_batches(export_db, statement)),
+        "documentos"
+    )
+
 @app.get("/contratos/{contrato_id}/documentos-exigidos")
 def get_contrato_documentos_exigidos(contrato_id: int, db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
-    contrato = db.query(models.Contrato).filter(models.Contrato.id == contrato_id).first()
-    if not contrato:
+    docs = documentos_exigidos_contrato(db, contrato_id)
+    if not docs and not db.query(models.Contrato.id).filter(models.Contrato.id == contrato_id).first():
         raise HTTPException(status_code=404, detail="Contrato not found")
-        
-    if not contrato.categoriaId:
-        return []
-        
-    categoria = db.query(models.Categoria).filter(models.Categoria.id == contrato.categoriaId).first()
-    if not categoria:
-        return []
-        
-    # converter "Doc 1|Doc 2" em lista
-    docs = []
-    if categoria.documentosPedidos:
-        if "|" in categoria.documentosPedidos:
-            docs = [d.strip() for d in categoria.documentosPedidos.split("|")]
-        else:
-            docs = [d.strip() for d in categoria.documentosPedidos.split(",")]
-            
     return docs
 
 @app.post("/documentos")
 async def create_documento(
     titulo: str = Form(...), 
-    data: str = Form(default=datetime.now().strftime("%Y-%m-%d")), 
+    data: Optional[str] = Form(None), 
     contratoId: str = Form(...), 
     contratoNome: str = Form(...),
     empresaId: str = Form(...),
@@ -716,73 +836,40 @@ async def create_documento(
     e_id = int(empresaId) if empresaId and empresaId.isdigit() else 0
     cat_id = int(categoriaId) if categoriaId and categoriaId.isdigit() else 0
     f_id = int(funcionarioId) if funcionarioId and funcionarioId.isdigit() else None
+    try:
+        # AAAA-MM-DD ou data e hora ISO; sem data, vale o momento do envio.
+        # Sem fuso, vale o horário local do servidor (a coluna guarda data com fuso)
+        data_documento = (datetime.fromisoformat(data) if data else datetime.now()).astimezone()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Data inválida. Use AAAA-MM-DD")
 
-    # Check for existing document
-    db_doc = db.query(Documento).filter(
-        Documento.titulo == titulo,
-        Documento.contratoId == c_id,
-        Documento.competencia == competencia,
-        Documento.empresaId == e_id
-    ).first()
-
-    if db_doc:
-        # Update existing
-        db_doc.data = data
-        db_doc.status = "CORRIGIDO"
-        db_doc.uploaded = True
-        
-        # Record in history
-        db_aprovacao = models.Aprovacao(
-            perfilId=0,
-            perfilNome="PRESTADORA",
-            documentoId=db_doc.id,
-            obs=obs or "Documento re-enviado",
-            data=datetime.now().strftime("%Y-%m-%d %H:%M"),
-            status="CORRIGIDO"
-        )
-        db.add(db_aprovacao)
-    else:
-        # Create new
-        db_doc = Documento(
-            titulo=titulo, 
-            data=data, 
-            contratoId=c_id, 
-            contratoNome=contratoNome,
-            empresaId=e_id, 
-            empresaNome=empresaNome, 
-            categoriaId=cat_id,
-            categoriaNome=categoriaNome or "", 
-            email=email, 
-            competencia=competencia,
-            funcionarioId=f_id, 
-            funcionarioNome=funcionarioNome,
-            status="AGUARDANDO", 
-            uploaded=True
-        )
-        db.add(db_doc)
-    
-    db.commit()
-    db.refresh(db_doc)
-    
     file_content = await file.read()
-    
-    # Check for existing anexo
-    db_anexo = db.query(models.Anexo).filter(models.Anexo.documentoId == db_doc.id).first()
-    if db_anexo:
-        db_anexo.filename = file.filename
-        db_anexo.data = file_content
-        db_anexo.hash = hashlib.md5(file_content).hexdigest()
-    else:
-        db_anexo = models.Anexo(
-            filename=file.filename,
-            documentoId=db_doc.id,
-            data=file_content,
-            hash=hashlib.md5(file_content).hexdigest()
-        )
-        db.add(db_anexo)
-        
+
+    # Uma transação: upsert do documento, upsert do anexo e histórico do reenvio
+    documento = upsert_documento(db, {
+        "titulo": titulo,
+        "data": data_documento,
+        "contratoId": c_id,
+        "contratoNome": contratoNome,
+        "empresaId": e_id,
+        "empresaNome": empresaNome,
+        "categoriaId": cat_id,
+        "categoriaNome": categoriaNome or "",
+        "email": email,
+        "competencia": competencia,
+        "funcionarioId": f_id,
+        "funcionarioNome": funcionarioNome,
+    })
+    reenviado = documento["status"] == "CORRIGIDO"
+    if reenviado:
+        record_upload_history(db, "PRESTADORA", "CORRIGIDO", obs or "Documento re-enviado", documento_id=documento["id"])
+    upsert_anexo(db, documento["id"], file.filename, file_content, hashlib.md5(file_content).hexdigest())
+    event_bus.emit(db, DocumentUploaded(
+        documentoId=documento["id"], empresaId=documento["empresaId"], contratoId=documento["contratoId"],
+        categoriaId=documento["categoriaId"], status=documento["status"], reenviado=reenviado
+    ))
     db.commit()
-    return db_doc
+    return documento
 
 @app.delete("/documentos/{documento_id}")
 def delete_documento(documento_id: int, db: Session = Depends(get_db), current_user: dict = Depends(check_permission("canDeleteDocs"))):
@@ -794,7 +881,7 @@ def delete_documento(documento_id: int, db: Session = Depends(get_db), current_u
     return {"message": "Documento deleted"}
 
 @app.patch("/documentos/{documento_id}/status")
-async def update_documento_status(
+def update_documento_status(
     documento_id: int, 
     status: str = Body(..., embed=True), 
     obs: str = Body("", embed=True),
@@ -822,10 +909,14 @@ async def update_documento_status(
         perfilNome=user_profile_name,
         documentoId=documento_id,
         obs=obs,
-        data=datetime.now().strftime("%Y-%m-%d %H:%M"),
+        data=datetime.now().astimezone(),
         status=status
     )
     db.add(db_aprovacao)
+    event_bus.emit(db, DocumentStatusChanged(
+        documentoId=documento_id, empresaId=db_doc.empresaId, contratoId=db_doc.contratoId,
+        categoriaId=db_doc.categoriaId, status=status, perfilId=user_profile_id
+    ))
     db.commit()
     return db_doc
 
@@ -848,7 +939,7 @@ async def justificar_documento(
         perfilNome="PRESTADORA",
         documentoId=documento_id,
         obs=obs,
-        data=datetime.now().strftime("%Y-%m-%d %H:%M"),
+        data=datetime.now().astimezone(),
         status="PENDENTE"
     )
     db.add(db_aprovacao)
@@ -856,8 +947,12 @@ async def justificar_documento(
     return db_doc
 
 @app.get("/documentos/{documento_id}/aprovacoes")
-def get_documento_aprovacoes(documento_id: int, db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
-    return db.query(models.Aprovacao).filter(models.Aprovacao.documentoId == documento_id).order_by(models.Aprovacao.createdAt.desc()).all()
+def get_documento_aprovacoes(documento_id: int, incluir_arquivo: bool = False, db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
+    aprovacoes = db.query(models.Aprovacao).filter(models.Aprovacao.documentoId == documento_id).order_by(models.Aprovacao.data.desc()).all()
+    if incluir_arquivo:
+        # Aprovações antigas movidas pela retenção (services_retention)
+        return merge_archived(aprovacoes, load_archived_rows(db, "aprovacoes", f"documento:{documento_id}"), "createdAt")
+    return aprovacoes
 
 # Processos e Categorias
 @app.get("/tipos-processo")
@@ -889,6 +984,8 @@ def list_categorias(db: Session = Depends(get_db)):
 def create_categoria(categoria: dict, db: Session = Depends(get_db), current_user: dict = Depends(check_permission("canCreateCategorias"))):
     db_cat = models.Categoria(**categoria)
     db.add(db_cat)
+    db.flush()
+    sync_categoria_documentos(db, db_cat)
     db.commit()
     db.refresh(db_cat)
     return db_cat
@@ -901,6 +998,8 @@ def update_categoria(categoria_id: int, categoria: dict, db: Session = Depends(g
     for key, value in categoria.items():
         if hasattr(db_cat, key):
             setattr(db_cat, key, value)
+    if "documentosPedidos" in categoria:
+        sync_categoria_documentos(db, db_cat)
     db.commit()
     db.refresh(db_cat)
     return db_cat
@@ -910,6 +1009,7 @@ def delete_categoria(categoria_id: int, db: Session = Depends(get_db), current_u
     db_cat = db.query(models.Categoria).filter(models.Categoria.id == categoria_id).first()
     if not db_cat:
         raise HTTPException(status_code=404, detail="Categoria not found")
+    delete_categoria_relations(db, categoria_id)
     db.delete(db_cat)
     db.commit()
     return {"message": "Categoria deleted"}
@@ -1002,8 +1102,97 @@ def delete_unidade_integracao(item_id: int, db: Session = Depends(get_db), curre
 
 # Logs
 @app.get("/logs")
-def list_logs(db: Session = Depends(get_db), current_user: dict = Depends(check_permission("canViewLogs"))):
-    return db.query(models.Log).order_by(models.Log.date.desc()).limit(100).all()
+def list_logs(
+    response: Response,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    menu: Optional[str] = None,
+    usuario: Optional[str] = None,
+    data_inicio: Optional[str] = None,
+    data_fim: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(check_permission("canViewLogs"))
+):
+    """
+    Logs mais recentes primeiro, paginados por cursor (keyset em date, id).
+    O cursor da próxima página vem no cabeçalho X-Next-Cursor (ausente na última página).
+    """
+    from sqlalchemy import and_, or_
+
+    limit = max(1, min(limit, 500))
+    query = db.query(models.Log)
+    if menu:
+        query = query.filter(models.Log.menu == menu)
+    if usuario:
+        query = query.filter(models.Log.userName.ilike(f"%{usuario}%"))
+    try:
+        if data_inicio:
+            query = query.filter(models.Log.date >= datetime.strptime(data_inicio, "%Y-%m-%d"))
+        if data_fim:
+            query = query.filter(models.Log.date < datetime.strptime(data_fim, "%Y-%m-%d") + timedelta(days=1))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Datas devem estar no formato YYYY-MM-DD")
+    if cursor:
+        try:
+            cursor_date, cursor_id = decode_log_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        query = query.filter(or_(
+            models.Log.date < cursor_date,
+            and_(models.Log.date == cursor_date, models.Log.id < cursor_id)
+        ))
+
+    logs = query.order_by(models.Log.date.desc(), models.Log.id.desc()).limit(limit + 1).all()
+    if len(logs) > limit:
+        logs = logs[:limit]
+        response.headers["X-Next-Cursor"] = encode_log_cursor(logs[-1].date, logs[-1].id)
+        response.headers["Access-Control-Expose-Headers"] = "X-Next-Cursor"
+    return logs
+
+@app.get("/logs/arquivo")
+def list_archived_logs(
+    response: Response,
+    mes: str,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    menu: Optional[str] = None,
+    usuario: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(check_permission("canViewLogs"))
+):
+    """
+    Logs de um mês (AAAA-MM) já movidos para o arquivo pela retenção, do id mais recente
+    para o mais antigo. O cursor da próxima página vem no cabeçalho X-Next-Cursor, como em /logs.
+    """
+    try:
+        datetime.strptime(mes, "%Y-%m")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Mês deve estar no formato YYYY-MM")
+    before_id = None
+    if cursor:
+        try:
+            before_id = int(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Cursor inválido")
+
+    def matches(log):
+        if menu and log.get("menu") != menu:
+            return False
+        return not usuario or usuario.lower() in (log.get("userName") or "").lower()
+
+    limit = max(1, min(limit, 500))
+    logs = load_archived_page(db, "logs", f"mes:{mes}", limit + 1, before_id, matches)
+    if len(logs) > limit:
+        logs = logs[:limit]
+        response.headers["X-Next-Cursor"] = str(logs[-1]["id"])
+        response.headers["Access-Control-Expose-Headers"] = "X-Next-Cursor"
+    return logs
+
+@app.get("/logs/auditoria")
+def get_audit_writer_stats(current_user: dict = Depends(get_current_user)):
+    if current_user["type"] == "empresa" or not current_user["permissions"].get("isAdmin"):
+        raise HTTPException(status_code=403, detail="Acesso restrito a administradores")
+    return audit_writer.stats()
 
 # Cubo (Regras de Aprovação)
 @app.get("/cubos")
@@ -1027,6 +1216,8 @@ def create_cubo(cubo: dict, db: Session = Depends(get_db), current_user: dict =
         
     db_cubo = models.Cubo(**cubo)
     db.add(db_cubo)
+    db.flush()
+    sync_cubo_membros(db, db_cubo)
     db.commit()
     return db_cubo
 
@@ -1035,6 +1226,7 @@ def delete_cubo(cubo_id: int, db: Session = Depends(get_db), current_user: dict
     db_cubo = db.query(models.Cubo).filter(models.Cubo.id == cubo_id).first()
     if not db_cubo:
         raise HTTPException(status_code=404, detail="Cubo not found")
+    delete_cubo_relations(db, cubo_id)
     db.delete(db_cubo)
     db.commit()
     return {"message": "Cubo deleted"}
@@ -1054,6 +1246,8 @@ def update_cubo(cubo_id: int, cubo: dict, db: Session = Depends(get_db), current
             value = json.dumps(value)
         if hasattr(db_cubo, key):
             setattr(db_cubo, key, value)
+    if "categoriaIds" in cubo or "perfilIds" in cubo:
+        sync_cubo_membros(db, db_cubo)
     
     db.commit()
     db.refresh(db_cubo)
@@ -1214,6 +1408,7 @@ def list_relatorios(db: Session = Depends(get_db), current_user: dict = Depends(
 def report_integracoes_agendadas(
     data_inicio: str, 
     data_fim: str, 
+    request: Request,
     unidade_id: Optional[str] = None, 
     empresa_id: Optional[str] = None,
     db: Session = Depends(get_db), 
@@ -1232,64 +1427,19 @@ def report_integracoes_agendadas(
     if empresa_id and empresa_id.strip():
         e_id = int(empresa_id)
 
-    # Busca Configurações para Logo e Nome da Empresa
-    config = db.query(models.Configuracao).first()
-    if not config:
-        config = models.Configuracao(nomeEmpresa="Gestão de Contratos")
-
-    unidade_nome = ""
-    if u_id:
-         unidade = db.query(models.UnidadeIntegracao).filter(models.UnidadeIntegracao.id == u_id).first()
-         if unidade:
-             unidade_nome = unidade.nome
-
-    # Query Data - Usando StatusFuncionario como base (histórico/agendamentos)
-    query = db.query(
-        models.StatusFuncionario.dataIntegracao.label("data_integracao"),
-        models.StatusFuncionario.funcionarioNome.label("funcionario_nome"),
-        models.StatusFuncionario.cargo.label("cargo_nome"),
-        models.StatusFuncionario.setor.label("setor_nome"),
-        models.StatusFuncionario.empresaNome.label("empresa_nome"),
-        models.StatusFuncionario.unidadeIntegracao.label("unidade_nome")
-    )
-
-    # Filtros de Data
     try:
-        dt_start = datetime.strptime(data_inicio, "%Y-%m-%d")
-        # Ajusta data fim para o final do dia
-        dt_end = datetime.strptime(data_fim, "%Y-%m-%d").replace(hour=23, minute=59, second=59)
-        query = query.filter(models.StatusFuncionario.dataIntegracao >= dt_start)
-        query = query.filter(models.StatusFuncionario.dataIntegracao <= dt_end)
+        datetime.strptime(data_inicio, "%Y-%m-%d")
+        datetime.strptime(data_fim, "%Y-%m-%d")
     except ValueError:
         raise HTTPException(status_code=400, detail="Formato de data inválido. Use AAAA-MM-DD")
 
-    if u_id:
-        query = query.filter(models.StatusFuncionario.unidadeIntegracaoId == u_id)
-    
-    if e_id:
-        query = query.filter(models.StatusFuncionario.empresaId == e_id)
-
-    # Filtra apenas registros do tipo 'agendamento' e statusIntegracao "AGENDADA" para o relatório de integrações agendadas
-    query = query.filter(models.StatusFuncionario.tipo == 'agendamento')
-    query = query.filter(models.StatusFuncionario.statusIntegracao == 'AGENDADA')
-    
-    results = query.order_by(models.StatusFuncionario.empresaNome, models.StatusFuncionario.dataIntegracao).all()
-
-    if not results:
-        raise HTTPException(status_code=404, detail="Nenhum registro encontrado para o período/filtros selecionados.")
-
     service = ReportingService(db)
-    pdf_content = service.generate_scheduled_integration_pdf(results, config, data_inicio, data_fim, unidade_nome)
-
-    filename = f"relatorio_integracoes_{data_inicio}_a_{data_fim}.pdf"
-    
-    return Response(
-        content=pdf_content,
-        media_type="application/pdf",
-        headers={
-            "Content-Disposition": f"attachment; filename={filename}",
-            "Access-Control-Expose-Headers": "Content-Disposition"
-        }
+    return cached_pdf_response(
+        request,
+        service.scheduled_integration_cache_key(data_inicio, data_fim, u_id, e_id),
+        lambda: service.generate_scheduled_integration_report(data_inicio, data_fim, u_id, e_id),
+        f"relatorio_integracoes_{data_inicio}_a_{data_fim}.pdf",
+        "Nenhum registro encontrado para o período/filtros selecionados."
     )
 
 # Generic Pagination Schema
@@ -1318,7 +1468,7 @@ def list_funcionarios(
         if not current_user["permissions"].get("isAdmin") and not current_user["permissions"].get("canViewFuncionarios"):
             raise HTTPException(status_code=403, detail="Você não tem permissão para visualizar funcionários")
             
-    check_expirations(db)
+    check_expirations_throttled(db)
     
     from sqlalchemy import func as sql_func
     
@@ -1408,6 +1558,146 @@ def list_funcionarios(
         "pages": total_pages
     }
 
+@app.get("/funcionarios/export")
+def export_funcionarios(
+    format: str = "csv",
+    empresa_id: Optional[int] = None,
+    contrato_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Exporta os funcionários com o status mais recente de cada um.
+    Não inclui o status documental calculado da listagem (uma consulta por funcionário).
+    """
+    if current_user["type"] == "user":
+        if not current_user["permissions"].get("isAdmin") and not current_user["permissions"].get("canViewFuncionarios"):
+            raise HTTPException(status_code=403, detail="Você não tem permissão para visualizar funcionários")
+
+    from sqlalchemy import select, func as sql_func
+
+    latest_status_ids = select(
+        models.StatusFuncionario.funcionarioId,
+        sql_func.max(models.StatusFuncionario.id).label("latest_id")
+    ).group_by(models.StatusFuncionario.funcionarioId).subquery()
+
+    status = models.StatusFuncionario
+    statement = select(
+        models.Funcionario.id,
+        models.Funcionario.nome,
+        models.Funcionario.empresaId,
+        models.Empresa.nome.label("empresaNome"),
+        models.Funcionario.contratoId,
+        models.Contrato.nome.label("contratoNome"),
+        status.statusContratual, status.statusIntegracao, status.dataIntegracao,
+        status.dataValidadeIntegracao, status.dataAso, status.dataValidadeAso,
+        status.funcao, status.cargo, status.setor, status.unidadeIntegracao, status.unidadeAtividade,
+        models.Funcionario.createdAt
+    ).outerjoin(
+        models.Empresa, models.Funcionario.empresaId == models.Empresa.id
+    ).outerjoin(
+        models.Contrato, models.Funcionario.contratoId == models.Contrato.id
+    ).outerjoin(
+        latest_status_ids, models.Funcionario.id == latest_status_ids.c.funcionarioId
+    ).outerjoin(
+        status, latest_status_ids.c.latest_id == status.id
+    ).order_by(models.Funcionario.id)
+
+    if current_user["type"] == "empresa":
+        statement = statement.where(models.Funcionario.empresaId == current_user["data"].id)
+    if empresa_id:
+        statement = statement.where(models.Funcionario.empresaId == empresa_id)
+    if contrato_id:
+        statement = statement.where(models.Funcionario.contratoId == contrato_id)
+
+    return export_response(
+        format,
+        lambda export_db: (statement.selected_columns.keys(), query_batches(export_db, statement)),
+        "funcionarios"
+    )
+
+@app.get("/funcionarios/status-historico/export")
+def export_status_historico(
+    format: str = "csv",
+    funcionario_id: Optional[int] = None,
+    empresa_id: Optional[int] = None,
+    data_inicio: Optional[str] = None,
+    data_fim: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """Exporta o histórico completo de status (statusFuncionarios), do mais antigo ao mais recente."""
+    if current_user["type"] == "user":
+        if not current_user["permissions"].get("isAdmin") and not current_user["permissions"].get("canViewFuncionarios"):
+            raise HTTPException(status_code=403, detail="Você não tem permissão para visualizar funcionários")
+
+    from sqlalchemy import select
+
+    statement = select(*[c for c in models.StatusFuncionario.__table__.columns]).order_by(models.StatusFuncionario.id)
+
+    if current_user["type"] == "empresa":
+        statement = statement.where(models.StatusFuncionario.empresaId == current_user["data"].id)
+    if funcionario_id:
+        statement = statement.where(models.StatusFuncionario.funcionarioId == funcionario_id)
+    if empresa_id:
+        statement = statement.where(models.StatusFuncionario.empresaId == empresa_id)
+    try:
+        if data_inicio:
+            statement = statement.where(models.StatusFuncionario.data >= datetime.strptime(data_inicio, "%Y-%m-%d"))
+        if data_fim:
+            statement = statement.where(models.StatusFuncionario.data < datetime.strptime(data_fim, "%Y-%m-%d") + timedelta(days=1))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Formato de data inválido. Use YYYY-MM-DD")
+
+    return export_response(
+        format,
+        lambda export_db: (statement.selected_columns.keys(), query_batches(export_db, statement)),
+        "historico_status"
+    )
+
+@app.get("/funcionarios/status-em")
+def get_status_em(
+    response: Response,
+    momento: str,
+    contrato_id: Optional[int] = None,
+    empresa_id: Optional[int] = None,
+    funcionario_ids: Optional[str] = None,
+    integracao_valida: Optional[bool] = None,
+    aso_valido: Optional[bool] = None,
+    limit: int = 1000,
+    cursor: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Status vigente de cada funcionário em `momento` (AAAA-MM-DD = fim do dia, ou data e hora ISO),
+    com integracaoValida/asoValido calculados para aquele dia. Paginado por funcionário:
+    o cursor da próxima página vem no cabeçalho X-Next-Cursor.
+    """
+    if current_user["type"] == "user":
+        if not current_user["permissions"].get("isAdmin") and not current_user["permissions"].get("canViewFuncionarios"):
+            raise HTTPException(status_code=403, detail="Você não tem permissão para visualizar funcionários")
+    elif current_user["type"] == "empresa":
+        empresa_id = current_user["data"].id
+
+    try:
+        referencia = parse_as_of(momento)
+        ids = [int(i) for i in funcionario_ids.split(",") if i.strip()] if funcionario_ids else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    limit = max(1, min(limit, 5000))
+    rows = status_as_of(
+        db, referencia, funcionario_ids=ids, contrato_id=contrato_id, empresa_id=empresa_id,
+        integracao_valida=integracao_valida, aso_valido=aso_valido,
+        after_funcionario_id=cursor, limit=limit + 1
+    )
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = str(rows[-1]["funcionarioId"])
+        response.headers["Access-Control-Expose-Headers"] = "X-Next-Cursor"
+    return {"momento": referencia, "data": rows}
+
 @app.post("/funcionarios", response_model=FuncionarioResponse)
 def create_funcionario(funcionario: FuncionarioCreate, db: Session = Depends(get_db), current_user: dict = Depends(check_permission("canCreateFuncionarios"))):
     if current_user["type"] != "empresa":
@@ -1599,47 +1889,23 @@ def upload_funcionario_doc(
     content = file.file.read()
     file_hash = hashlib.sha256(content).hexdigest()
     
-    # Check for existing anexo
-    db_anexo = db.query(models.AnexoFuncionario).filter(
-        models.AnexoFuncionario.funcionarioId == func_id,
-        models.AnexoFuncionario.tipo == tipo
-    ).first()
+    anexo = upsert_anexo_funcionario(db, func_id, tipo, file.filename, content, file_hash, obs or None)
+    reenviado = anexo["status"] == "CORRIGIDO"
 
-    if db_anexo:
-        db_anexo.filename = file.filename
-        db_anexo.status = "CORRIGIDO"
-        db_anexo.data = content
-        db_anexo.hash = file_hash
-        db_anexo.observacao = obs or db_anexo.observacao
-    else:
-        db_anexo = models.AnexoFuncionario(
-            filename=file.filename,
-            funcionarioId=func_id,
-            tipo=tipo,
-            status="AGUARDANDO",
-            data=content,
-            hash=file_hash,
-            observacao=obs
-        )
-        db.add(db_anexo)
-    
-    db.commit()
-    db.refresh(db_anexo)
-    
-    # Grava histórico
+    # Grava histórico (mesmo commit do upsert)
     perfil_nome = "PRESTADORA" if current_user["type"] == "empresa" else "GESTOR"
-    db_aprovacao = models.Aprovacao(
-        perfilId=0,
-        perfilNome=perfil_nome,
-        anexoFuncionarioId=db_anexo.id,
-        obs=obs or ("Documento re-enviado" if db_anexo.status == "CORRIGIDO" else "Upload inicial"),
-        data=datetime.now().strftime("%Y-%m-%d %H:%M"),
-        status=db_anexo.status
+    record_upload_history(
+        db, perfil_nome, anexo["status"], obs or ("Documento re-enviado" if reenviado else "Upload inicial"),
+        anexo_funcionario_id=anexo["id"]
     )
-    db.add(db_aprovacao)
+    func = db.query(models.Funcionario.empresaId, models.Funcionario.contratoId).filter(models.Funcionario.id == func_id).first()
+    event_bus.emit(db, EmployeeDocumentUploaded(
+        anexoId=anexo["id"], funcionarioId=func_id, tipoDocumento=tipo, status=anexo["status"],
+        empresaId=func.empresaId if func else None, contratoId=func.contratoId if func else None
+    ))
     db.commit()
     
-    return db_anexo
+    return anexo
 
 @app.patch("/funcionarios/documentos/{anexo_id}/status", response_model=AnexoFuncionarioResponse)
 def update_funcionario_doc_status(
@@ -1673,29 +1939,20 @@ def update_funcionario_doc_status(
         perfilNome=user_profile_name,
         anexoFuncionarioId=anexo_id,
         obs=observacao or "",
-        data=datetime.now().strftime("%Y-%m-%d %H:%M"),
+        data=datetime.now().astimezone(),
         status=status
     )
     db.add(db_aprovacao)
+    func = db.query(models.Funcionario.empresaId, models.Funcionario.contratoId).filter(models.Funcionario.id == db_anexo.funcionarioId).first()
+    # Transição automática para APROVADO (documentação completa), na mesma transação
+    db.flush()
+    approve_when_documents_complete(db, db_anexo.funcionarioId)
+    event_bus.emit(db, EmployeeDocumentStatusChanged(
+        anexoId=anexo_id, funcionarioId=db_anexo.funcionarioId, tipoDocumento=db_anexo.tipo, status=status,
+        empresaId=func.empresaId if func else None, contratoId=func.contratoId if func else None
+    ))
     db.commit()
 
-    # Automatic Transition: If all docs are ready now, update general status
-    status_docs = get_funcionario_status_documental(db_anexo.funcionarioId, db)
-    if status_docs["is_ready"]:
-        current_st = get_current_status(db, db_anexo.funcionarioId)
-        if current_st and current_st.statusIntegracao == "APROVADO (COM DOCUMENTAÇÃO PENDENTE)":
-            new_status = models.StatusFuncionario(
-                funcionarioId=db_anexo.funcionarioId,
-                funcionarioNome=current_st.funcionarioNome,
-                statusIntegracao="APROVADO",
-                data=datetime.now(),
-                tipo="Aprovação Automática (Documentação Completa)",
-                contratoId=current_st.contratoId,
-                empresaId=current_st.empresaId
-            )
-            db.add(new_status)
-            db.commit()
-
     return db_anexo
 
 @app.patch("/funcionarios/documentos/{anexo_id}/justificar", response_model=AnexoFuncionarioResponse)
@@ -1717,7 +1974,7 @@ def justificar_funcionario_doc(
         perfilNome="PRESTADORA",
         anexoFuncionarioId=anexo_id,
         obs=obs,
-        data=datetime.now().strftime("%Y-%m-%d %H:%M"),
+        data=datetime.now().astimezone(),
         status="PENDENTE"
     )
     db.add(db_aprovacao)
@@ -1738,47 +1995,18 @@ def download_funcionario_doc(anexo_id: int, db: Session = Depends(get_db)):
     )
 
 @app.get("/funcionarios/documentos/{anexo_id}/aprovacoes")
-def get_funcionario_doc_aprovacoes(anexo_id: int, db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
-    return db.query(models.Aprovacao).filter(models.Aprovacao.anexoFuncionarioId == anexo_id).order_by(models.Aprovacao.createdAt.desc()).all()
+def get_funcionario_doc_aprovacoes(anexo_id: int, incluir_arquivo: bool = False, db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
+    aprovacoes = db.query(models.Aprovacao).filter(models.Aprovacao.anexoFuncionarioId == anexo_id).order_by(models.Aprovacao.data.desc()).all()
+    if incluir_arquivo:
+        return merge_archived(aprovacoes, load_archived_rows(db, "aprovacoes", f"anexoFuncionario:{anexo_id}"), "createdAt")
+    return aprovacoes
 
 @app.get("/funcionarios/{func_id}/status-documental")
 def get_funcionario_status_documental(func_id: int, db: Session = Depends(get_db)):
     func = db.query(models.Funcionario).filter(models.Funcionario.id == func_id).first()
     if not func:
         raise HTTPException(status_code=404, detail="Funcionario not found")
-        
-    from sqlalchemy import or_
-    exigidos = db.query(models.DocumentoExigidoFuncionario).filter(
-        or_(
-            models.DocumentoExigidoFuncionario.contratoId == None,
-            models.DocumentoExigidoFuncionario.contratoId == func.contratoId
-        )
-    ).all()
-    
-    anexos = db.query(models.AnexoFuncionario).filter(models.AnexoFuncionario.funcionarioId == func_id).all()
-    
-    status_map = {a.tipo: a.status for a in anexos}
-    pendentes = []
-    reprovados = []
-    
-    for req in exigidos:
-        status = status_map.get(req.nome)
-        if not status:
-            pendentes.append(req.nome)
-        elif status == "REPROVADO":
-            reprovados.append(req.nome)
-        elif status == "AGUARDANDO":
-            pendentes.append(req.nome)
-            
-    is_ready = len(pendentes) == 0 and len(reprovados) == 0
-    
-    return {
-        "is_ready": is_ready,
-        "pendentes": pendentes,
-        "reprovados": reprovados,
-        "total_exigidos": len(exigidos),
-        "total_enviados": len(anexos)
-    }
+    return documentary_status(db, func)
 
 @app.post("/funcionarios/agendar-integracao")
 def agendar_integracao(request: AgendarIntegracaoRequest, db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
@@ -1864,14 +2092,17 @@ def agendar_integracao(request: AgendarIntegracaoRequest, db: Session = Depends(
     return {"message": "Integração agendada com sucesso"}
 
 @app.get("/funcionarios/{func_id}/historico-integracao")
-def get_funcionario_historico(func_id: int, db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
+def get_funcionario_historico(func_id: int, incluir_arquivo: bool = False, db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
     # Empresas só veem seus funcionários
     if current_user["type"] == "empresa":
         func = db.query(models.Funcionario).filter(models.Funcionario.id == func_id, models.Funcionario.empresaId == current_user["data"].id).first()
         if not func:
             raise HTTPException(status_code=403, detail="Acesso negado")
             
-    return db.query(models.StatusFuncionario).filter(models.StatusFuncionario.funcionarioId == func_id).order_by(models.StatusFuncionario.data.desc()).all()
+    historico = db.query(models.StatusFuncionario).filter(models.StatusFuncionario.funcionarioId == func_id).order_by(models.StatusFuncionario.data.desc()).all()
+    if incluir_arquivo:
+        return merge_archived(historico, load_archived_rows(db, "statusFuncionarios", f"funcionario:{func_id}"), "data")
+    return historico
 
 @app.post("/funcionarios/{func_id}/aprovar")
 def aprovar_funcionario(func_id: int, db: Session = Depends(get_db), current_user: dict = Depends(check_integration_approver)):
@@ -2164,10 +2395,28 @@ def check_expirations(db: Session):
             
     db.commit()
 
+# check_expirations grava novos status; nas leituras roda no máximo uma vez por intervalo por processo
+EXPIRATION_CHECK_SECONDS = float(os.getenv("EXPIRATION_CHECK_SECONDS", "60"))
+_expiration_check_lock = threading.Lock()
+_last_expiration_check = 0.0
+
+def check_expirations_throttled(db: Session):
+    global _last_expiration_check
+    with _expiration_check_lock:
+        if time.monotonic() - _last_expiration_check < EXPIRATION_CHECK_SECONDS:
+            return
+        _last_expiration_check = time.monotonic()
+    check_expirations(db)
+
 class CustomCuboRequest(BaseModel):
-    columns: List[str]
-    date_filter: Optional[dict] = None
+    columns: List[str] = []
+    date_filter: Optional[dict] = None # { "field", "start", "end" } e/ou { "as_of": "AAAA-MM-DD" } (status vigente na data)
     filters: Optional[dict] = None # { "Column Name": { "operator": "igual", "value": "xyz" } }
+    include_history: bool = False # False: apenas o status mais recente de cada funcionário
+    # Modo agregado (pivot): dimensões e medidas calculadas no banco
+    group_by: Optional[List[str]] = None
+    measures: Optional[List[dict]] = None # [{ "op": "count" }, { "op": "dias_ate_vencimento", "field": "Validade ASO" }]
+    format: Optional[str] = "xlsx" # xlsx | json | csv | ndjson | parquet
 
 @app.post("/relatorios/cubo-custom")
 def get_relatorio_cubo_custom(
@@ -2176,12 +2425,45 @@ def get_relatorio_cubo_custom(
     current_user: dict = Depends(check_permission("canViewCubos"))
 ):
     service = ReportingService(db)
-    excel_content = service.generate_custom_cube_excel(request.columns, request.date_filter, request.filters)
+    user_key = cubo_user_key(current_user)
+
+    if request.format in EXPORT_FORMATS:
+        if request.group_by or request.measures:
+            try:
+                with cubo_limiter.slot(user_key):
+                    headers, rows = service.aggregate_custom_cube(request.group_by, request.measures, request.date_filter, request.filters, request.include_history)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            return export_response(request.format, lambda export_db: (headers, iter([rows])), "planilha_cubo_agregado")
+        # Custo validado antes de abrir o stream: depois do primeiro byte não há como devolver o erro
+        service.check_custom_cube_cost(request.columns, request.date_filter, request.filters, request.include_history)
+        return export_response(
+            request.format,
+            lambda export_db: ReportingService(export_db).iter_custom_cube_batches(request.columns, request.date_filter, request.filters, request.include_history, check_cost=False),
+            "planilha_cubo_custom",
+            slot_key=user_key
+        )
 
-    filename = f"planilha_cubo_custom_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-    
-    return Response(
-        content=excel_content,
+    if request.format == "json" and not (request.group_by or request.measures):
+        # Sem agregação o resultado não tem limite de linhas: em JSON só paginado ou em stream
+        raise HTTPException(status_code=400, detail="Formato json exige group_by ou measures; para as linhas use /relatorios/cubo-custom/preview ou o formato ndjson")
+
+    with cubo_limiter.slot(user_key):
+        if request.group_by or request.measures:
+            try:
+                if request.format == "json":
+                    headers, rows = service.aggregate_custom_cube(request.group_by, request.measures, request.date_filter, request.filters, request.include_history)
+                    return {"columns": headers, "data": [dict(zip(headers, row)) for row in rows], "total": len(rows)}
+                excel_file = service.generate_custom_cube_aggregate_excel(request.group_by, request.measures, request.date_filter, request.filters, request.include_history)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            filename = f"planilha_cubo_agregado_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+        else:
+            excel_file = service.generate_custom_cube_excel(request.columns, request.date_filter, request.filters, request.include_history)
+            filename = f"planilha_cubo_custom_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+
+    return StreamingResponse(
+        iter_file(excel_file),
         media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         headers={
             "Content-Disposition": f"attachment; filename={filename}",
@@ -2189,8 +2471,46 @@ def get_relatorio_cubo_custom(
         }
     )
 
+class CuboPreviewRequest(CustomCuboRequest):
+    limit: int = 50
+    cursor: Optional[str] = None
+    estimate_count: bool = False
+
+@app.post("/relatorios/cubo-custom/preview")
+def preview_relatorio_cubo_custom(
+    request: CuboPreviewRequest,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(check_permission("canViewCubos"))
+):
+    service = ReportingService(db)
+    with cubo_limiter.slot(cubo_user_key(current_user)):
+        return service.preview_custom_cube(
+            request.columns, request.date_filter, request.filters, request.include_history,
+            limit=request.limit, cursor=request.cursor, estimate_count=request.estimate_count
+        )
+
+@app.get("/relatorios/cubo-custom/cache")
+def get_relatorio_cubo_cache_stats(current_user: dict = Depends(check_permission("canViewCubos"))):
+    return cubo_cache.stats()
+
+@app.get("/relatorios/pdf-cache")
+def get_relatorio_pdf_cache_stats(current_user: dict = Depends(get_current_user)):
+    if current_user["type"] == "empresa" or not current_user["permissions"].get("isAdmin"):
+        raise HTTPException(status_code=403, detail="Acesso restrito a administradores")
+    return report_cache.stats()
+
+@app.get("/relatorios/pool-cpu")
+def get_relatorio_cpu_pool_stats(current_user: dict = Depends(get_current_user)):
+    if current_user["type"] == "empresa" or not current_user["permissions"].get("isAdmin"):
+        raise HTTPException(status_code=403, detail="Acesso restrito a administradores")
+    return cpu_pool.stats()
+
+@app.get("/relatorios/cubo-custom/motor")
+def get_relatorio_cubo_engine_stats(current_user: dict = Depends(check_permission("canViewCubos"))):
+    return cubo_engine.stats()
+
 @app.get("/funcionarios/{id}/historico-pdf")
-def get_funcionario_historico_pdf(id: int, db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
+def get_funcionario_historico_pdf(id: int, request: Request, db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
     # Check permissions (either view documents or view logs/reports)
     # Using check_permission logic manually since we need to check multiple potential permissions OR if user is the company of the employee?
     # For simplicity, if internal user, allows if has canViewFuncionarios or canViewDocs.
@@ -2214,59 +2534,169 @@ def get_funcionario_historico_pdf(id: int, db: Session = Depends(get_db), curren
              raise HTTPException(status_code=403, detail="Sem permissão para visualizar histórico")
 
     service = ReportingService(db)
-    pdf_content = service.generate_employee_history_pdf(id)
-    
-    if not pdf_content:
-        raise HTTPException(status_code=404, detail="Erro ao gerar relatório")
+    return cached_pdf_response(
+        request,
+        service.employee_history_cache_key(id),
+        lambda: service.generate_employee_history_pdf(id),
+        f"historico_integracao_{emp.nome.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}.pdf",
+        "Erro ao gerar relatório"
+    )
+
+def check_bulk_history_request(db: Session, current_user: dict, empresa_id: Optional[int], contrato_id: Optional[int], fmt: str):
+    """Valida permissão, escopo e tamanho do lote de históricos; empresas só acessam os próprios funcionários."""
+    if current_user["type"] == "user":
+        if not (current_user["permissions"].get("canViewFuncionarios") or current_user["permissions"].get("canViewDocs")):
+            raise HTTPException(status_code=403, detail="Sem permissão para visualizar histórico")
+    else:
+        if empresa_id and empresa_id != current_user["data"].id:
+            raise HTTPException(status_code=403, detail="Acesso negado")
+        empresa_id = current_user["data"].id
+
+    if not empresa_id and not contrato_id:
+        raise HTTPException(status_code=400, detail="Informe empresa_id e/ou contrato_id")
+    try:
+        check_bulk_format(fmt)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    query = db.query(models.Funcionario.id)
+    if empresa_id:
+        query = query.filter(models.Funcionario.empresaId == empresa_id)
+    if contrato_id:
+        query = query.filter(models.Funcionario.contratoId == contrato_id)
+    total = query.count()
+    if not total:
+        raise HTTPException(status_code=404, detail="Nenhum funcionário encontrado para os filtros informados")
+    if total > HISTORICO_BULK_MAX:
+        raise HTTPException(
+            status_code=422,
+            detail=f"O lote tem {total} funcionários; o limite é {HISTORICO_BULK_MAX}. Filtre por contrato."
+        )
+    return empresa_id, contrato_id
+
+@app.get("/funcionarios/historico-pdf/lote")
+def get_funcionarios_historico_pdf_lote(
+    empresa_id: Optional[int] = None,
+    contrato_id: Optional[int] = None,
+    format: str = "zip",
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Históricos de integração de todos os funcionários de uma empresa e/ou contrato:
+    ZIP com um PDF por funcionário (format=zip) ou um PDF único com marcadores (format=pdf).
+    """
+    empresa_id, contrato_id = check_bulk_history_request(db, current_user, empresa_id, contrato_id, format)
+
+    historicos = load_employee_histories(db, empresa_id=empresa_id, contrato_id=contrato_id)
+    branding = branding_cache.get(db)
+    return StreamingResponse(
+        iter_bulk_histories(format, branding, historicos, bulk_subtitle(historicos, empresa_id, contrato_id)),
+        media_type=HISTORICO_BULK_FORMATS[format],
+        headers={
+            "Content-Disposition": f"attachment; filename={bulk_filename(format, empresa_id, contrato_id)}",
+            "Access-Control-Expose-Headers": "Content-Disposition"
+        }
+    )
+
+# --- Relatórios em segundo plano ---
+
+@app.post("/relatorios/cubo-custom/jobs", response_model=RelatorioJobResponse)
+def submit_relatorio_cubo_custom_job(
+    request: CustomCuboRequest,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(check_permission("canViewCubos"))
+):
+    return ReportJobService(db).submit("cubo-custom", request.model_dump(), current_user)
+
+@app.post("/relatorios/integracoes-agendadas/jobs", response_model=RelatorioJobResponse)
+def submit_relatorio_integracoes_agendadas_job(
+    data_inicio: str,
+    data_fim: str,
+    unidade_id: Optional[str] = None,
+    empresa_id: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    if current_user["type"] == "empresa":
+        raise HTTPException(status_code=403, detail="Acesso restrito a usuários internos.")
+
+    try:
+        datetime.strptime(data_inicio, "%Y-%m-%d")
+        datetime.strptime(data_fim, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Formato de data inválido. Use AAAA-MM-DD")
+
+    params = {
+        "data_inicio": data_inicio,
+        "data_fim": data_fim,
+        "unidade_id": int(unidade_id) if unidade_id and unidade_id.strip() else None,
+        "empresa_id": int(empresa_id) if empresa_id and empresa_id.strip() else None,
+    }
+    return ReportJobService(db).submit("integracoes-agendadas", params, current_user)
+
+@app.post("/funcionarios/{id}/historico-pdf/jobs", response_model=RelatorioJobResponse)
+def submit_funcionario_historico_pdf_job(id: int, db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
+    emp = db.query(models.Funcionario).filter(models.Funcionario.id == id).first()
+    if not emp:
+        raise HTTPException(status_code=404, detail="Funcionário não encontrado")
+
+    if current_user["type"] == "user":
+         if not (current_user["permissions"].get("canViewFuncionarios") or current_user["permissions"].get("canViewDocs")):
+             raise HTTPException(status_code=403, detail="Sem permissão para visualizar histórico")
+
+    return ReportJobService(db).submit("historico-pdf", {"funcionario_id": id}, current_user)
+
+@app.post("/funcionarios/historico-pdf/lote/jobs", response_model=RelatorioJobResponse)
+def submit_funcionarios_historico_pdf_lote_job(
+    empresa_id: Optional[int] = None,
+    contrato_id: Optional[int] = None,
+    format: str = "zip",
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    empresa_id, contrato_id = check_bulk_history_request(db, current_user, empresa_id, contrato_id, format)
+    params = {"empresa_id": empresa_id, "contrato_id": contrato_id, "format": format}
+    return ReportJobService(db).submit("historico-pdf-lote", params, current_user)
+
+@app.get("/relatorios/jobs", response_model=List[RelatorioJobResponse])
+def list_relatorio_jobs(db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
+    return ReportJobService(db).list_for_user(current_user)
+
+@app.get("/relatorios/jobs/{job_id}", response_model=RelatorioJobResponse)
+def get_relatorio_job(job_id: str, db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
+    job = ReportJobService(db).get_for_user(job_id, current_user)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return job
+
+@app.get("/relatorios/jobs/{job_id}/download")
+def download_relatorio_job(job_id: str, db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
+    job = ReportJobService(db).get_for_user(job_id, current_user)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    if job.status == "ERRO":
+        raise HTTPException(status_code=400, detail=job.mensagem or "Erro ao gerar relatório")
+    if job.status != "CONCLUIDO" or job.resultado is None:
+        raise HTTPException(status_code=409, detail="Relatório ainda em processamento")
 
-    filename = f"historico_integracao_{emp.nome.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}.pdf"
-    
     return Response(
-        content=pdf_content,
-        media_type="application/pdf",
+        content=job.resultado,
+        media_type=job.mediaType,
         headers={
-            "Content-Disposition": f"attachment; filename={filename}",
+            "Content-Disposition": f"attachment; filename={job.filename}",
             "Access-Control-Expose-Headers": "Content-Disposition"
         }
     )
 
 @app.get("/dashboard/stats")
 def get_dashboard_stats(db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
-    check_expirations(db)
     if current_user["type"] == "empresa":
         raise HTTPException(status_code=403, detail="Acesso apenas para usuários internos")
-        
-    now = datetime.now()
-    first_day_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    from sqlalchemy import func as sql_func, or_
-    
-    empresas_ativas = db.query(models.Empresa).filter(models.Empresa.status == "ATIVA").count()
-    total_funcionarios = db.query(models.Funcionario).count()
-    
-    # Docs Pendentes
-    docs_pendentes = db.query(models.Documento).filter(models.Documento.status == "AGUARDANDO").count()
-    anexos_pendentes = db.query(models.AnexoFuncionario).filter(models.AnexoFuncionario.status == "AGUARDANDO").count()
-    
-    # Alertas Críticos (Vencidos - Lógica com Histórico)
-    latest_status_ids = db.query(
-        models.StatusFuncionario.funcionarioId,
-        sql_func.max(models.StatusFuncionario.id).label('latest_id')
-    ).group_by(models.StatusFuncionario.funcionarioId).subquery()
-    
-    # Busca funcionários que estão com status VENCIDO no histórico se dataValidadeIntegracao ou dataValidadeAso estiverem vencidas
-    vencidos = db.query(models.StatusFuncionario).join(
-        latest_status_ids, models.StatusFuncionario.id == latest_status_ids.c.latest_id
-    ).filter(
-        models.StatusFuncionario.statusIntegracao == "VENCIDO"
-    ).count()
-    
-    return {
-        "empresasAtivas": empresas_ativas,
-        "docsPendentes": docs_pendentes + anexos_pendentes,
-        "totalFuncionarios": total_funcionarios,
-        "aprovadosMes": db.query(models.Documento).filter(models.Documento.status == "APROVADO", models.Documento.updatedAt >= first_day_of_month).count(),
-        "vencidos": vencidos
-    }
+
+    check_expirations_throttled(db)
+    # Contadores mantidos nas escritas (services_dashboard); recalculados em uma consulta se ausentes
+    return dashboard_stats.get(db)
 
 @app.get("/dashboard/activities")
 def get_dashboard_activities(db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
@@ -2276,6 +2706,92 @@ def get_dashboard_activities(db: Session = Depends(get_db), current_user: dict =
     activities = db.query(models.Log).order_by(models.Log.date.desc()).limit(10).all()
     return activities
 
+@app.get("/dashboard/aprovacoes-por-dia")
+def get_aprovacoes_por_dia(
+    data_inicio: str,
+    data_fim: str,
+    status: str = "APROVADO",
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """Vazão de aprovações: quantidade por dia e perfil no período (datas inclusivas)."""
+    if current_user["type"] == "empresa":
+        raise HTTPException(status_code=403, detail="Acesso apenas para usuários internos")
+    try:
+        inicio = datetime.strptime(data_inicio, "%Y-%m-%d").astimezone()
+        fim = (datetime.strptime(data_fim, "%Y-%m-%d") + timedelta(days=1)).astimezone()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Datas devem estar no formato YYYY-MM-DD")
+    return approvals_per_day(db, inicio, fim, status)
+
+# --- Notificações em tempo real (SSE) ---
+
+def feed_subscriber_filter(current_user: dict, db: Session):
+    """(empresa_id, categorias, ver_funcionarios) do principal, com as mesmas regras das listagens."""
+    if current_user["type"] == "empresa":
+        return current_user["data"].id, None, True
+    if current_user["profileStatus"] != "active":
+        raise HTTPException(status_code=403, detail="Usuário sem perfil ativo")
+    permissions = current_user["permissions"]
+    ver_funcionarios = bool(
+        permissions.get("isAdmin") or permissions.get("canViewFuncionarios") or permissions.get("isIntegrationApprover")
+    )
+    return None, get_authorized_categories(current_user, db), ver_funcionarios
+
+async def authenticate_feed(token: str):
+    # Sessão curta: a conexão SSE fica aberta por horas e não deve segurar uma conexão do pool
+    db = SessionLocal()
+    try:
+        current_user = await get_current_user(token=token, db=db)
+        return feed_subscriber_filter(current_user, db)
+    finally:
+        db.close()
+
+@app.get("/eventos")
+async def stream_eventos(request: Request, token: Optional[str] = None, last_event_id: Optional[int] = None):
+    """
+    Server-Sent Events com as alterações confirmadas de documentos, anexos e status de funcionários.
+    O EventSource do navegador não envia cabeçalhos: o token pode vir em ?token=.
+    Na reconexão, o Last-Event-ID retoma de onde parou; "reset" pede um refetch completo.
+    """
+    authorization = request.headers.get("authorization", "")
+    if not token and authorization.lower().startswith("bearer "):
+        token = authorization[7:]
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+
+    empresa_id, categorias, ver_funcionarios = await authenticate_feed(token)
+    subscriber = FeedSubscriber(asyncio.get_running_loop(), empresa_id, categorias, ver_funcionarios)
+
+    async def refresh(subscriber: FeedSubscriber):
+        empresa_id, categorias, ver_funcionarios = await authenticate_feed(token)
+        subscriber.empresa_id = empresa_id
+        subscriber.categorias = set(categorias) if categorias is not None else None
+        subscriber.ver_funcionarios = ver_funcionarios
+
+    header_event_id = request.headers.get("last-event-id", "")
+    if last_event_id is None and header_event_id.isdigit():
+        last_event_id = int(header_event_id)
+
+    change_feed.subscribe(subscriber)
+    return StreamingResponse(
+        iter_feed(request, subscriber, last_event_id, refresh),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/eventos/stats")
+def get_eventos_stats(current_user: dict = Depends(get_current_user)):
+    if current_user["type"] == "empresa" or not current_user["permissions"].get("isAdmin"):
+        raise HTTPException(status_code=403, detail="Acesso restrito a administradores")
+    return change_feed.stats()
+
+@app.get("/eventos/barramento")
+def get_event_bus_stats(current_user: dict = Depends(get_current_user)):
+    if current_user["type"] == "empresa" or not current_user["permissions"].get("isAdmin"):
+        raise HTTPException(status_code=403, detail="Acesso restrito a administradores")
+    return event_bus.stats()
+
 # --- Cubo Snapshots ---
 
 @app.get("/cubo-snapshots", response_model=List[CuboSnapshotResponse])
@@ -2287,6 +2803,7 @@ def list_cubo_snapshots(db: Session = Depends(get_db), current_user: dict = Depe
         raise HTTPException(status_code=403, detail="Sem permissão para visualizar snapshots")
     
     snapshots = db.query(models.CuboSnapshot).order_by(models.CuboSnapshot.createdAt.desc()).all()
+    agendamentos = {a.snapshotId: a for a in db.query(models.CuboSnapshotAgendamento).all()}
     
     # Parse JSON fields for response
     result = []
@@ -2300,7 +2817,8 @@ def list_cubo_snapshots(db: Session = Depends(get_db), current_user: dict = Depe
             "dateRangeStart": s.dateRangeStart,
             "dateRangeEnd": s.dateRangeEnd,
             "userId": s.userId,
-            "createdAt": s.createdAt
+            "createdAt": s.createdAt,
+            "agendamento": agendamentos.get(s.id)
         })
     return result
 
@@ -2389,6 +2907,125 @@ def delete_cubo_snapshot(snapshot_id: int, db: Session = Depends(get_db), curren
     if not snapshot:
         raise HTTPException(status_code=404, detail="Snapshot não encontrado")
     
+    db.query(models.CuboSnapshotAgendamento).filter(models.CuboSnapshotAgendamento.snapshotId == snapshot_id).delete(synchronize_session=False)
     db.delete(snapshot)
     db.commit()
     return {"message": "Snapshot excluído com sucesso"}
+
+# --- Agendamento e resultado materializado dos snapshots ---
+
+@app.put("/cubo-snapshots/{snapshot_id}/agendamento", response_model=CuboSnapshotAgendamentoResponse)
+def set_cubo_snapshot_agendamento(snapshot_id: int, data: CuboSnapshotAgendamentoRequest, db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
+    if current_user["type"] == "empresa":
+        raise HTTPException(status_code=403, detail="Acesso restrito a usuários internos")
+    
+    if not current_user["permissions"].get("isAdmin") and not current_user["permissions"].get("canEditCubos"):
+        raise HTTPException(status_code=403, detail="Sem permissão para agendar snapshots")
+    
+    snapshot = db.query(models.CuboSnapshot).filter(models.CuboSnapshot.id == snapshot_id).first()
+    if not snapshot:
+        raise HTTPException(status_code=404, detail="Snapshot não encontrado")
+    
+    try:
+        validate_schedule(data.frequencia, data.horario, data.diaSemana, data.periodoRelativo)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if data.periodoRelativo and not snapshot.dateFilterField:
+        raise HTTPException(status_code=400, detail="O snapshot não tem campo de data para aplicar o período relativo")
+    
+    agendamento = db.query(models.CuboSnapshotAgendamento).filter(models.CuboSnapshotAgendamento.snapshotId == snapshot_id).first()
+    if not agendamento:
+        agendamento = models.CuboSnapshotAgendamento(snapshotId=snapshot_id, status="AGUARDANDO")
+        db.add(agendamento)
+    
+    agendamento.frequencia = data.frequencia
+    agendamento.horario = data.horario
+    agendamento.diaSemana = data.diaSemana if data.frequencia == "SEMANAL" else None
+    agendamento.periodoRelativo = data.periodoRelativo
+    agendamento.ativo = data.ativo
+    agendamento.proximaExecucao = next_run(data.frequencia, data.horario, agendamento.diaSemana)
+    
+    db.commit()
+    db.refresh(agendamento)
+    return agendamento
+
+@app.delete("/cubo-snapshots/{snapshot_id}/agendamento")
+def delete_cubo_snapshot_agendamento(snapshot_id: int, db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
+    if current_user["type"] == "empresa":
+        raise HTTPException(status_code=403, detail="Acesso restrito a usuários internos")
+    
+    if not current_user["permissions"].get("isAdmin") and not current_user["permissions"].get("canEditCubos"):
+        raise HTTPException(status_code=403, detail="Sem permissão para agendar snapshots")
+    
+    removed = db.query(models.CuboSnapshotAgendamento).filter(models.CuboSnapshotAgendamento.snapshotId == snapshot_id).delete(synchronize_session=False)
+    if not removed:
+        raise HTTPException(status_code=404, detail="Snapshot sem agendamento")
+    db.commit()
+    return {"message": "Agendamento removido"}
+
+@app.post("/cubo-snapshots/{snapshot_id}/executar", response_model=CuboSnapshotAgendamentoResponse)
+def executar_cubo_snapshot(snapshot_id: int, db: Session = Depends(get_db), current_user: dict = Depends(get_current_user)):
+    """Antecipa a próxima execução do agendamento; o worker materializa no próximo ciclo."""
+    if current_user["type"] == "empresa":
+        raise HTTPException(status_code=403, detail="Acesso restrito a usuários internos")
+    
+    if not current_user["permissions"].get("isAdmin") and not current_user["permissions"].get("canEditCubos"):
+        raise HTTPException(status_code=403, detail="Sem permissão para executar snapshots")
+    
+    agendamento = db.query(models.CuboSnapshotAgendamento).filter(models.CuboSnapshotAgendamento.snapshotId == snapshot_id).first()
+    if not agendamento:
+        raise HTTPException(status_code=404, detail="Snapshot sem agendamento")
+    
+    agendamento.proximaExecucao = datetime.now()
+    agendamento.ativo = True
+    db.commit()
+    db.refresh(agendamento)
+    return agendamento
+
+@app.get("/cubo-snapshots/{snapshot_id}/resultado")
+def get_cubo_snapshot_resultado(
+    snapshot_id: int,
+    format: str = "xlsx",
+    limit: int = 500,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """Último resultado materializado do snapshot: XLSX completo ou as primeiras linhas em JSON (cache colunar)."""
+    if current_user["type"] == "empresa":
+        raise HTTPException(status_code=403, detail="Acesso restrito a usuários internos")
+    
+    if not current_user["permissions"].get("isAdmin") and not current_user["permissions"].get("canViewCubos"):
+        raise HTTPException(status_code=403, detail="Sem permissão para visualizar snapshots")
+    
+    agendamento = db.query(models.CuboSnapshotAgendamento).filter(models.CuboSnapshotAgendamento.snapshotId == snapshot_id).first()
+    if not agendamento or not agendamento.materializadoEm:
+        raise HTTPException(status_code=404, detail="Snapshot ainda não materializado")
+    
+    if format == "json":
+        columns, rows = read_materialized_rows(agendamento.resultadoColunar, limit=max(1, limit))
+        return {
+            "columns": columns,
+            "data": rows,
+            "total": agendamento.linhas,
+            "materializadoEm": agendamento.materializadoEm,
+            "dataInicio": agendamento.dataInicioResolvida,
+            "dataFim": agendamento.dataFimResolvida
+        }
+    
+    if format == "parquet":
+        content, media_type = agendamento.resultadoColunar, EXPORT_FORMATS["parquet"]
+    elif format == "xlsx":
+        content, media_type = agendamento.resultadoXlsx, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    else:
+        raise HTTPException(status_code=400, detail="Formato inválido. Use xlsx, parquet ou json")
+    
+    filename = f"snapshot_{snapshot_id}_{agendamento.materializadoEm.strftime('%Y%m%d_%H%M%S')}.{format}"
+    return Response(
+        content=content,
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}",
+            "Access-Control-Expose-Headers": "Content-Disposition, X-Materializado-Em",
+            "X-Materializado-Em": agendamento.materializadoEm.isoformat()
+        }
+    )
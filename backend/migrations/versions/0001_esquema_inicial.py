@@ -0,0 +1,505 @@
+"""esquema inicial (tabelas existentes até a adoção das migrações)
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-19 17:32:06.677072
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Bancos criados pelo antigo create_all já têm as tabelas: cada tabela só é criada se faltar
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'anexos' not in existing:
+        op.create_table('anexos',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('filename', sa.String(), nullable=False),
+        sa.Column('documentoId', sa.Integer(), nullable=False),
+        sa.Column('data', sa.LargeBinary(), nullable=True),
+        sa.Column('link', sa.String(), nullable=True),
+        sa.Column('corrigido', sa.Boolean(), nullable=True),
+        sa.Column('hash', sa.String(), nullable=False),
+        sa.Column('uploadDate', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_anexos_id'), 'anexos', ['id'])
+
+    if 'anexosFuncionarios' not in existing:
+        op.create_table('anexosFuncionarios',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('filename', sa.String(), nullable=False),
+        sa.Column('funcionarioId', sa.Integer(), nullable=False),
+        sa.Column('tipo', sa.String(), nullable=True),
+        sa.Column('status', sa.String(), nullable=True),
+        sa.Column('observacao', sa.Text(), nullable=True),
+        sa.Column('data', sa.LargeBinary(), nullable=True),
+        sa.Column('link', sa.String(), nullable=True),
+        sa.Column('corrigido', sa.Boolean(), nullable=True),
+        sa.Column('hash', sa.String(), nullable=False),
+        sa.Column('uploadDate', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_anexosFuncionarios_id'), 'anexosFuncionarios', ['id'])
+
+    if 'aprovacoes' not in existing:
+        op.create_table('aprovacoes',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('perfilId', sa.Integer(), nullable=False),
+        sa.Column('perfilNome', sa.String(), nullable=False),
+        sa.Column('documentoId', sa.Integer(), nullable=True),
+        sa.Column('anexoFuncionarioId', sa.Integer(), nullable=True),
+        sa.Column('obs', sa.Text(), nullable=True),
+        sa.Column('data', sa.String(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('createdAt', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_aprovacoes_id'), 'aprovacoes', ['id'])
+
+    if 'arquivoHistorico' not in existing:
+        op.create_table('arquivoHistorico',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('tabela', sa.String(), nullable=False),
+        sa.Column('chave', sa.String(), nullable=False),
+        sa.Column('periodo', sa.String(), nullable=False),
+        sa.Column('quantidade', sa.Integer(), nullable=False),
+        sa.Column('primeiroId', sa.Integer(), nullable=True),
+        sa.Column('ultimoId', sa.Integer(), nullable=True),
+        sa.Column('dados', sa.LargeBinary(), nullable=False),
+        sa.Column('createdAt', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_arquivoHistorico_chave'), 'arquivoHistorico', ['chave'])
+        op.create_index(op.f('ix_arquivoHistorico_id'), 'arquivoHistorico', ['id'])
+        op.create_index(op.f('ix_arquivoHistorico_tabela'), 'arquivoHistorico', ['tabela'])
+
+    if 'cargos' not in existing:
+        op.create_table('cargos',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('nome', sa.String(), nullable=False),
+        sa.Column('active', sa.Boolean(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_cargos_id'), 'cargos', ['id'])
+
+    if 'categorias' not in existing:
+        op.create_table('categorias',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('nome', sa.String(), nullable=False),
+        sa.Column('tipoProcessoId', sa.Integer(), nullable=False),
+        sa.Column('tipoProcessoNome', sa.String(), nullable=False),
+        sa.Column('documentosPedidos', sa.Text(), nullable=False),
+        sa.Column('createdAt', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('updatedAt', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_categorias_id'), 'categorias', ['id'])
+
+    if 'configuracoes' not in existing:
+        op.create_table('configuracoes',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('prazoAsoGeral', sa.Integer(), nullable=True),
+        sa.Column('prazoIntegracaoGeral', sa.Integer(), nullable=True),
+        sa.Column('diasParaConfirmarPresenca', sa.Integer(), nullable=True),
+        sa.Column('diasSemanaAgenda', sa.String(), nullable=True),
+        sa.Column('nomeEmpresa', sa.String(), nullable=True),
+        sa.Column('logoImage', sa.Text(), nullable=True),
+        sa.Column('dominioInterno', sa.String(), nullable=True),
+        sa.Column('updatedAt', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_configuracoes_id'), 'configuracoes', ['id'])
+
+    if 'contratos' not in existing:
+        op.create_table('contratos',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('nome', sa.String(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('empresaId', sa.Integer(), nullable=False),
+        sa.Column('empresaNome', sa.String(), nullable=False),
+        sa.Column('dtInicio', sa.DateTime(), nullable=False),
+        sa.Column('dtFim', sa.DateTime(), nullable=False),
+        sa.Column('categoriaId', sa.Integer(), nullable=True),
+        sa.Column('categoriaNome', sa.String(), nullable=True),
+        sa.Column('createdAt', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('updatedAt', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_contratos_id'), 'contratos', ['id'])
+
+    if 'cuboSnapshotAgendamentos' not in existing:
+        op.create_table('cuboSnapshotAgendamentos',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('snapshotId', sa.Integer(), nullable=False),
+        sa.Column('frequencia', sa.String(), nullable=False),
+        sa.Column('horario', sa.String(), nullable=False),
+        sa.Column('diaSemana', sa.Integer(), nullable=True),
+        sa.Column('periodoRelativo', sa.String(), nullable=True),
+        sa.Column('ativo', sa.Boolean(), nullable=True),
+        sa.Column('proximaExecucao', sa.DateTime(), nullable=True),
+        sa.Column('status', sa.String(), nullable=True),
+        sa.Column('mensagem', sa.Text(), nullable=True),
+        sa.Column('ultimaExecucao', sa.DateTime(), nullable=True),
+        sa.Column('materializadoEm', sa.DateTime(), nullable=True),
+        sa.Column('dataInicioResolvida', sa.String(), nullable=True),
+        sa.Column('dataFimResolvida', sa.String(), nullable=True),
+        sa.Column('linhas', sa.Integer(), nullable=True),
+        sa.Column('resultadoXlsx', sa.LargeBinary(), nullable=True),
+        sa.Column('resultadoColunar', sa.LargeBinary(), nullable=True),
+        sa.Column('createdAt', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('updatedAt', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_cuboSnapshotAgendamentos_id'), 'cuboSnapshotAgendamentos', ['id'])
+        op.create_index(op.f('ix_cuboSnapshotAgendamentos_proximaExecucao'), 'cuboSnapshotAgendamentos', ['proximaExecucao'])
+        op.create_index(op.f('ix_cuboSnapshotAgendamentos_snapshotId'), 'cuboSnapshotAgendamentos', ['snapshotId'], unique=True)
+
+    if 'cuboSnapshots' not in existing:
+        op.create_table('cuboSnapshots',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('nome', sa.String(), nullable=False),
+        sa.Column('columns', sa.Text(), nullable=True),
+        sa.Column('filters', sa.Text(), nullable=True),
+        sa.Column('dateFilterField', sa.String(), nullable=True),
+        sa.Column('dateRangeStart', sa.String(), nullable=True),
+        sa.Column('dateRangeEnd', sa.String(), nullable=True),
+        sa.Column('userId', sa.Integer(), nullable=True),
+        sa.Column('createdAt', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('updatedAt', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_cuboSnapshots_id'), 'cuboSnapshots', ['id'])
+
+    if 'cubos' not in existing:
+        op.create_table('cubos',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('categoriaIds', sa.Text(), nullable=False),
+        sa.Column('categoriaNomes', sa.Text(), nullable=False),
+        sa.Column('perfilIds', sa.Text(), nullable=False),
+        sa.Column('perfilNomes', sa.Text(), nullable=False),
+        sa.Column('pastaDriver', sa.String(), nullable=False),
+        sa.Column('createdAt', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('updatedAt', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_cubos_id'), 'cubos', ['id'])
+
+    if 'dashboardContadores' not in existing:
+        op.create_table('dashboardContadores',
+        sa.Column('chave', sa.String(), nullable=False),
+        sa.Column('valor', sa.Integer(), nullable=False),
+        sa.Column('updatedAt', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('chave')
+        )
+
+    if 'documentos' not in existing:
+        op.create_table('documentos',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('titulo', sa.String(), nullable=False),
+        sa.Column('data', sa.String(), nullable=False),
+        sa.Column('contratoId', sa.Integer(), nullable=False),
+        sa.Column('contratoNome', sa.String(), nullable=False),
+        sa.Column('empresaId', sa.Integer(), nullable=False),
+        sa.Column('empresaNome', sa.String(), nullable=False),
+        sa.Column('categoriaId', sa.Integer(), nullable=False),
+        sa.Column('categoriaNome', sa.String(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('uploaded', sa.Boolean(), nullable=True),
+        sa.Column('versao', sa.String(), nullable=False),
+        sa.Column('email', sa.String(), nullable=False),
+        sa.Column('competencia', sa.String(), nullable=False),
+        sa.Column('reprovadoPor', sa.String(), nullable=True),
+        sa.Column('funcionarioId', sa.Integer(), nullable=True),
+        sa.Column('funcionarioNome', sa.String(), nullable=True),
+        sa.Column('createdAt', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('updatedAt', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_documentos_id'), 'documentos', ['id'])
+
+    if 'documentosExigidosFuncionario' not in existing:
+        op.create_table('documentosExigidosFuncionario',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('nome', sa.String(), nullable=False),
+        sa.Column('contratoId', sa.Integer(), nullable=True),
+        sa.Column('createdAt', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_documentosExigidosFuncionario_id'), 'documentosExigidosFuncionario', ['id'])
+
+    if 'empresas' not in existing:
+        op.create_table('empresas',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('nome', sa.String(), nullable=False),
+        sa.Column('loginName', sa.String(), nullable=True),
+        sa.Column('cnpj', sa.String(), nullable=False),
+        sa.Column('departamento', sa.String(), nullable=False),
+        sa.Column('chave', sa.String(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('createdAt', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('updatedAt', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('chave'),
+        sa.UniqueConstraint('cnpj')
+        )
+        op.create_index(op.f('ix_empresas_id'), 'empresas', ['id'])
+        op.create_index(op.f('ix_empresas_loginName'), 'empresas', ['loginName'], unique=True)
+
+    if 'funcionarios' not in existing:
+        op.create_table('funcionarios',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('nome', sa.String(), nullable=False),
+        sa.Column('empresaId', sa.Integer(), nullable=True),
+        sa.Column('contratoId', sa.Integer(), nullable=True),
+        sa.Column('createdAt', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_funcionarios_id'), 'funcionarios', ['id'])
+
+    if 'funcoes' not in existing:
+        op.create_table('funcoes',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('nome', sa.String(), nullable=False),
+        sa.Column('active', sa.Boolean(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_funcoes_id'), 'funcoes', ['id'])
+
+    if 'logs' not in existing:
+        op.create_table('logs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('menu', sa.String(), nullable=False),
+        sa.Column('userName', sa.String(), nullable=False),
+        sa.Column('userPerfil', sa.String(), nullable=False),
+        sa.Column('action', sa.String(), nullable=False),
+        sa.Column('info', sa.Text(), nullable=False),
+        sa.Column('date', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_logs_id'), 'logs', ['id'])
+
+    if 'profiles' not in existing:
+        op.create_table('profiles',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('description', sa.String(), nullable=True),
+        sa.Column('canCreateContratos', sa.Boolean(), nullable=True),
+        sa.Column('canEditContratos', sa.Boolean(), nullable=True),
+        sa.Column('canDeleteContratos', sa.Boolean(), nullable=True),
+        sa.Column('canViewContratos', sa.Boolean(), nullable=True),
+        sa.Column('canCreateCategorias', sa.Boolean(), nullable=True),
+        sa.Column('canEditCategorias', sa.Boolean(), nullable=True),
+        sa.Column('canDeleteCategorias', sa.Boolean(), nullable=True),
+        sa.Column('canViewCategorias', sa.Boolean(), nullable=True),
+        sa.Column('canApproveDocs', sa.Boolean(), nullable=True),
+        sa.Column('canDeleteDocs', sa.Boolean(), nullable=True),
+        sa.Column('canViewDocs', sa.Boolean(), nullable=True),
+        sa.Column('canCreateEmpresas', sa.Boolean(), nullable=True),
+        sa.Column('canEditEmpresas', sa.Boolean(), nullable=True),
+        sa.Column('canDeleteEmpresas', sa.Boolean(), nullable=True),
+        sa.Column('canViewEmpresas', sa.Boolean(), nullable=True),
+        sa.Column('canCreatePerfis', sa.Boolean(), nullable=True),
+        sa.Column('canEditPerfis', sa.Boolean(), nullable=True),
+        sa.Column('canDeletePerfis', sa.Boolean(), nullable=True),
+        sa.Column('canViewPerfis', sa.Boolean(), nullable=True),
+        sa.Column('canCreateUsers', sa.Boolean(), nullable=True),
+        sa.Column('canEditUsers', sa.Boolean(), nullable=True),
+        sa.Column('canDeleteUsers', sa.Boolean(), nullable=True),
+        sa.Column('canViewUsers', sa.Boolean(), nullable=True),
+        sa.Column('canCreateTipoProcesso', sa.Boolean(), nullable=True),
+        sa.Column('canEditTipoProcesso', sa.Boolean(), nullable=True),
+        sa.Column('canDeleteTipoProcesso', sa.Boolean(), nullable=True),
+        sa.Column('canViewTipoProcesso', sa.Boolean(), nullable=True),
+        sa.Column('canCreateFuncionarios', sa.Boolean(), nullable=True),
+        sa.Column('canEditFuncionarios', sa.Boolean(), nullable=True),
+        sa.Column('canDeleteFuncionarios', sa.Boolean(), nullable=True),
+        sa.Column('canViewFuncionarios', sa.Boolean(), nullable=True),
+        sa.Column('canViewLogs', sa.Boolean(), nullable=True),
+        sa.Column('canViewCubos', sa.Boolean(), nullable=True),
+        sa.Column('canCreateCubos', sa.Boolean(), nullable=True),
+        sa.Column('canEditCubos', sa.Boolean(), nullable=True),
+        sa.Column('canDeleteCubos', sa.Boolean(), nullable=True),
+        sa.Column('canApproveIntegration', sa.Boolean(), nullable=True),
+        sa.Column('canViewRegrasAprovacao', sa.Boolean(), nullable=True),
+        sa.Column('canCreateRegrasAprovacao', sa.Boolean(), nullable=True),
+        sa.Column('canEditRegrasAprovacao', sa.Boolean(), nullable=True),
+        sa.Column('canDeleteRegrasAprovacao', sa.Boolean(), nullable=True),
+        sa.Column('canGeneratePdfReports', sa.Boolean(), nullable=True),
+        sa.Column('createdAt', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('updatedAt', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_profiles_id'), 'profiles', ['id'])
+
+    if 'relatorioJobs' not in existing:
+        op.create_table('relatorioJobs',
+        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('tipo', sa.String(), nullable=False),
+        sa.Column('parametros', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('progresso', sa.Integer(), nullable=True),
+        sa.Column('mensagem', sa.Text(), nullable=True),
+        sa.Column('userId', sa.Integer(), nullable=True),
+        sa.Column('empresaId', sa.Integer(), nullable=True),
+        sa.Column('workerId', sa.String(), nullable=True),
+        sa.Column('tentativas', sa.Integer(), nullable=True),
+        sa.Column('filename', sa.String(), nullable=True),
+        sa.Column('mediaType', sa.String(), nullable=True),
+        sa.Column('resultado', sa.LargeBinary(), nullable=True),
+        sa.Column('tamanho', sa.Integer(), nullable=True),
+        sa.Column('createdAt', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('startedAt', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('finishedAt', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('expiresAt', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_relatorioJobs_id'), 'relatorioJobs', ['id'])
+        op.create_index(op.f('ix_relatorioJobs_status'), 'relatorioJobs', ['status'])
+
+    if 'relatorios' not in existing:
+        op.create_table('relatorios',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('nome', sa.String(), nullable=False),
+        sa.Column('data', sa.DateTime(), nullable=False),
+        sa.Column('query', sa.Text(), nullable=False),
+        sa.Column('createdAt', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_relatorios_id'), 'relatorios', ['id'])
+
+    if 'setores' not in existing:
+        op.create_table('setores',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('nome', sa.String(), nullable=False),
+        sa.Column('active', sa.Boolean(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_setores_id'), 'setores', ['id'])
+
+    if 'statusFuncionarios' not in existing:
+        op.create_table('statusFuncionarios',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('statusContratual', sa.String(), nullable=True),
+        sa.Column('statusIntegracao', sa.String(), nullable=True),
+        sa.Column('funcionarioId', sa.Integer(), nullable=True),
+        sa.Column('funcionarioNome', sa.String(), nullable=True),
+        sa.Column('funcaoId', sa.Integer(), nullable=True),
+        sa.Column('funcao', sa.String(), nullable=True),
+        sa.Column('cargoId', sa.Integer(), nullable=True),
+        sa.Column('cargo', sa.String(), nullable=True),
+        sa.Column('setorId', sa.Integer(), nullable=True),
+        sa.Column('setor', sa.String(), nullable=True),
+        sa.Column('unidadeIntegracaoId', sa.Integer(), nullable=True),
+        sa.Column('unidadeIntegracao', sa.String(), nullable=True),
+        sa.Column('unidadeAtividadeId', sa.Integer(), nullable=True),
+        sa.Column('unidadeAtividade', sa.String(), nullable=True),
+        sa.Column('empresaId', sa.Integer(), nullable=True),
+        sa.Column('empresaNome', sa.String(), nullable=True),
+        sa.Column('dataIntegracao', sa.DateTime(), nullable=True),
+        sa.Column('dataAso', sa.DateTime(), nullable=True),
+        sa.Column('dataValidadeAso', sa.DateTime(), nullable=True),
+        sa.Column('dataValidadeIntegracao', sa.DateTime(), nullable=True),
+        sa.Column('prazoAsoDias', sa.Integer(), nullable=True),
+        sa.Column('prazoIntegracaoDias', sa.Integer(), nullable=True),
+        sa.Column('contratoId', sa.Integer(), nullable=True),
+        sa.Column('contratoNome', sa.String(), nullable=True),
+        sa.Column('versao', sa.String(), nullable=True),
+        sa.Column('data', sa.DateTime(), nullable=True),
+        sa.Column('tipo', sa.String(), nullable=True),
+        sa.Column('justificativaAgendamento', sa.String(), nullable=True),
+        sa.Column('createdAt', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_statusFuncionarios_id'), 'statusFuncionarios', ['id'])
+
+    if 'subcontratadas' not in existing:
+        op.create_table('subcontratadas',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('nome', sa.String(), nullable=False),
+        sa.Column('cnpj', sa.String(), nullable=False),
+        sa.Column('contratoId', sa.Integer(), nullable=False),
+        sa.Column('empresaId', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(), nullable=False),
+        sa.Column('createdAt', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_subcontratadas_id'), 'subcontratadas', ['id'])
+
+    if 'tiposProcesso' not in existing:
+        op.create_table('tiposProcesso',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('nome', sa.String(), nullable=False),
+        sa.Column('createdAt', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_tiposProcesso_id'), 'tiposProcesso', ['id'])
+
+    if 'unidadesIntegracao' not in existing:
+        op.create_table('unidadesIntegracao',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('nome', sa.String(), nullable=False),
+        sa.Column('active', sa.Boolean(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_unidadesIntegracao_id'), 'unidadesIntegracao', ['id'])
+
+    if 'users' not in existing:
+        op.create_table('users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('openId', sa.String(), nullable=False),
+        sa.Column('name', sa.String(), nullable=True),
+        sa.Column('email', sa.String(), nullable=True),
+        sa.Column('loginMethod', sa.String(), nullable=True),
+        sa.Column('role', sa.String(), nullable=False),
+        sa.Column('profileId', sa.Integer(), nullable=True),
+        sa.Column('isIntegrationApprover', sa.Boolean(), nullable=True),
+        sa.Column('createdAt', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('updatedAt', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('lastSignedIn', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(['profileId'], ['profiles.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_users_id'), 'users', ['id'])
+        op.create_index(op.f('ix_users_openId'), 'users', ['openId'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_table('users')
+    op.drop_table('unidadesIntegracao')
+    op.drop_table('tiposProcesso')
+    op.drop_table('subcontratadas')
+    op.drop_table('statusFuncionarios')
+    op.drop_table('setores')
+    op.drop_table('relatorios')
+    op.drop_table('relatorioJobs')
+    op.drop_table('profiles')
+    op.drop_table('logs')
+    op.drop_table('funcoes')
+    op.drop_table('funcionarios')
+    op.drop_table('empresas')
+    op.drop_table('documentosExigidosFuncionario')
+    op.drop_table('documentos')
+    op.drop_table('dashboardContadores')
+    op.drop_table('cubos')
+    op.drop_table('cuboSnapshots')
+    op.drop_table('cuboSnapshotAgendamentos')
+    op.drop_table('contratos')
+    op.drop_table('configuracoes')
+    op.drop_table('categorias')
+    op.drop_table('cargos')
+    op.drop_table('arquivoHistorico')
+    op.drop_table('aprovacoes')
+    op.drop_table('anexosFuncionarios')
+    op.drop_table('anexos')
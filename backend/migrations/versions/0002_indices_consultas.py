@@ -0,0 +1,77 @@
+"""índices das consultas mais frequentes
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 18:05:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (nome, tabela, colunas) — os mesmos declarados em models.py
+INDICES = [
+    ('ix_statusFuncionarios_funcionario_id', 'statusFuncionarios', ['funcionarioId', 'id']),
+    ('ix_statusFuncionarios_funcionario_data', 'statusFuncionarios', ['funcionarioId', 'data', 'id']),
+    ('ix_documentos_titulo_contrato_competencia', 'documentos', ['titulo', 'contratoId', 'competencia', 'empresaId']),
+    ('ix_documentos_categoriaId', 'documentos', ['categoriaId']),
+    ('ix_documentos_status_updatedAt', 'documentos', ['status', 'updatedAt']),
+    ('ix_anexos_documentoId', 'anexos', ['documentoId']),
+    ('ix_anexosFuncionarios_funcionario_tipo', 'anexosFuncionarios', ['funcionarioId', 'tipo']),
+    ('ix_aprovacoes_documentoId', 'aprovacoes', ['documentoId']),
+    ('ix_aprovacoes_anexoFuncionarioId', 'aprovacoes', ['anexoFuncionarioId']),
+    ('ix_funcionarios_empresaId', 'funcionarios', ['empresaId']),
+    ('ix_funcionarios_contratoId', 'funcionarios', ['contratoId']),
+    ('ix_logs_date', 'logs', ['date']),
+]
+
+
+def _postgres_index_state(bind, name):
+    """None se o índice não existe; senão se é válido (CONCURRENTLY interrompido deixa índice inválido)."""
+    return bind.execute(sa.text(
+        "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE c.relname = :name AND pg_table_is_visible(c.oid)"
+    ), {"name": name}).scalar()
+
+
+def _postgres_is_partitioned(bind, table):
+    return bool(bind.execute(sa.text(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.relname = :table AND pg_table_is_visible(c.oid)"
+    ), {"table": table}).scalar())
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        for name, table, columns in INDICES:
+            op.create_index(name, table, columns, if_not_exists=True)
+        return
+
+    # Postgres: CONCURRENTLY não bloqueia escritas, mas não roda dentro de transação.
+    # Tabelas particionadas (scripts/arquivar_historico.py --particionar) não aceitam CONCURRENTLY.
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDICES:
+            state = _postgres_index_state(bind, name)
+            if state:
+                continue
+            cols = ', '.join(f'"{column}"' for column in columns)
+            if _postgres_is_partitioned(bind, table):
+                op.execute(f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" ({cols})')
+                continue
+            if state is False:
+                op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+            op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{name}" ON "{table}" ({cols})')
+
+
+def downgrade() -> None:
+    for name, table, columns in reversed(INDICES):
+        op.drop_index(name, table_name=table, if_exists=True)
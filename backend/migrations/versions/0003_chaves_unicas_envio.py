@@ -0,0 +1,102 @@
+"""chaves únicas de documentos e anexos (remove duplicatas)
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 19:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (índice único novo, índice não único que ele substitui, tabela, colunas)
+INDICES = [
+    ('uq_documentos_titulo_contrato_competencia', 'ix_documentos_titulo_contrato_competencia', 'documentos',
+     ['titulo', 'contratoId', 'competencia', 'empresaId']),
+    ('uq_anexos_documentoId', 'ix_anexos_documentoId', 'anexos', ['documentoId']),
+    ('uq_anexosFuncionarios_funcionario_tipo', 'ix_anexosFuncionarios_funcionario_tipo', 'anexosFuncionarios',
+     ['funcionarioId', 'tipo']),
+]
+
+# Duplicatas: fica a linha de menor id (a que o SELECT ... first() antigo encontrava e atualizava);
+# histórico de aprovações e arquivos das duplicatas passam para ela.
+DOCUMENTO_MESMA_CHAVE = '''
+    k.titulo = d.titulo AND k."contratoId" = d."contratoId"
+    AND k.competencia = d.competencia AND k."empresaId" = d."empresaId"'''
+
+DEDUPLICAR = [
+    # Documentos
+    f'''UPDATE aprovacoes SET "documentoId" = (
+        SELECT MIN(k.id) FROM documentos d JOIN documentos k ON {DOCUMENTO_MESMA_CHAVE}
+        WHERE d.id = aprovacoes."documentoId")
+    WHERE "documentoId" IN (
+        SELECT d.id FROM documentos d WHERE EXISTS (SELECT 1 FROM documentos k WHERE {DOCUMENTO_MESMA_CHAVE} AND k.id < d.id))''',
+    f'''UPDATE anexos SET "documentoId" = (
+        SELECT MIN(k.id) FROM documentos d JOIN documentos k ON {DOCUMENTO_MESMA_CHAVE}
+        WHERE d.id = anexos."documentoId")
+    WHERE "documentoId" IN (
+        SELECT d.id FROM documentos d WHERE EXISTS (SELECT 1 FROM documentos k WHERE {DOCUMENTO_MESMA_CHAVE} AND k.id < d.id))''',
+    f'''DELETE FROM documentos WHERE id IN (
+        SELECT d.id FROM documentos d WHERE EXISTS (SELECT 1 FROM documentos k WHERE {DOCUMENTO_MESMA_CHAVE} AND k.id < d.id))''',
+    # Anexos: um por documento
+    '''DELETE FROM anexos WHERE EXISTS (
+        SELECT 1 FROM anexos k WHERE k."documentoId" = anexos."documentoId" AND k.id < anexos.id)''',
+    # Documentos de funcionário: um por (funcionário, tipo)
+    '''UPDATE aprovacoes SET "anexoFuncionarioId" = (
+        SELECT MIN(k.id) FROM "anexosFuncionarios" a JOIN "anexosFuncionarios" k
+            ON k."funcionarioId" = a."funcionarioId" AND k.tipo = a.tipo
+        WHERE a.id = aprovacoes."anexoFuncionarioId")
+    WHERE "anexoFuncionarioId" IN (
+        SELECT a.id FROM "anexosFuncionarios" a WHERE EXISTS (
+            SELECT 1 FROM "anexosFuncionarios" k
+            WHERE k."funcionarioId" = a."funcionarioId" AND k.tipo = a.tipo AND k.id < a.id))''',
+    '''DELETE FROM "anexosFuncionarios" WHERE EXISTS (
+        SELECT 1 FROM "anexosFuncionarios" k
+        WHERE k."funcionarioId" = "anexosFuncionarios"."funcionarioId" AND k.tipo = "anexosFuncionarios".tipo
+            AND k.id < "anexosFuncionarios".id)''',
+]
+
+
+def _postgres_index_state(bind, name):
+    return bind.execute(sa.text(
+        "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE c.relname = :name AND pg_table_is_visible(c.oid)"
+    ), {"name": name}).scalar()
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    for sql in DEDUPLICAR:
+        op.execute(sql)
+
+    if bind.dialect.name != 'postgresql':
+        for name, old, table, columns in INDICES:
+            op.create_index(name, table, columns, unique=True, if_not_exists=True)
+            op.drop_index(old, table_name=table, if_exists=True)
+        return
+
+    # Sem bloquear escritas. Se um envio recriar uma duplicata entre a limpeza e o índice,
+    # o CREATE falha e a migração pode ser executada de novo (o índice inválido é refeito).
+    with op.get_context().autocommit_block():
+        for name, old, table, columns in INDICES:
+            state = _postgres_index_state(bind, name)
+            if state is False:
+                op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+            if not state:
+                cols = ', '.join(f'"{column}"' for column in columns)
+                op.execute(f'CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS "{name}" ON "{table}" ({cols})')
+            op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{old}"')
+
+
+def downgrade() -> None:
+    for name, old, table, columns in INDICES:
+        op.create_index(old, table, columns, if_not_exists=True)
+        op.drop_index(name, table_name=table, if_exists=True)
@@ -0,0 +1,107 @@
+"""documentos exigidos e membros das regras de aprovação em tabelas relacionais
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 20:20:00.000000
+
+"""
+import json
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+LOTE = 1000
+
+categoria_documentos = sa.table(
+    'categoriaDocumentos',
+    sa.column('categoriaId', sa.Integer), sa.column('nome', sa.String), sa.column('ordem', sa.Integer),
+)
+cubo_categorias = sa.table('cuboCategorias', sa.column('cuboId', sa.Integer), sa.column('categoriaId', sa.Integer))
+cubo_perfis = sa.table('cuboPerfis', sa.column('cuboId', sa.Integer), sa.column('perfilId', sa.Integer))
+
+
+# Cópias das regras de services_regras (a migração não importa o código da aplicação)
+def _split_documentos(value):
+    if not value:
+        return []
+    separator = '|' if '|' in value else ','
+    return [nome.strip() for nome in value.split(separator) if nome.strip()]
+
+
+def _parse_ids(value):
+    try:
+        value = json.loads(value) if value else []
+    except (json.JSONDecodeError, TypeError):
+        return []
+    ids = []
+    for item in value if isinstance(value, list) else []:
+        try:
+            item = int(item)
+        except (TypeError, ValueError):
+            continue
+        if item not in ids:
+            ids.append(item)
+    return ids
+
+
+def _insert_batches(bind, table, rows):
+    for start in range(0, len(rows), LOTE):
+        bind.execute(table.insert(), rows[start:start + LOTE])
+
+
+def upgrade() -> None:
+    op.create_table('categoriaDocumentos',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('categoriaId', sa.Integer(), nullable=False),
+    sa.Column('nome', sa.String(), nullable=False),
+    sa.Column('ordem', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_categoriaDocumentos_id', 'categoriaDocumentos', ['id'])
+    op.create_index('ix_categoriaDocumentos_categoria_ordem', 'categoriaDocumentos', ['categoriaId', 'ordem'])
+    op.create_table('cuboCategorias',
+    sa.Column('cuboId', sa.Integer(), nullable=False),
+    sa.Column('categoriaId', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('cuboId', 'categoriaId')
+    )
+    op.create_index('ix_cuboCategorias_categoriaId', 'cuboCategorias', ['categoriaId'])
+    op.create_table('cuboPerfis',
+    sa.Column('cuboId', sa.Integer(), nullable=False),
+    sa.Column('perfilId', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('cuboId', 'perfilId')
+    )
+    op.create_index('ix_cuboPerfis_perfilId', 'cuboPerfis', ['perfilId'])
+
+    # Carga a partir das colunas de texto (que continuam sendo gravadas pela API)
+    bind = op.get_bind()
+    documentos = []
+    for categoria_id, pedidos in bind.execute(sa.text('SELECT id, "documentosPedidos" FROM categorias')):
+        documentos.extend(
+            {'categoriaId': categoria_id, 'nome': nome, 'ordem': ordem}
+            for ordem, nome in enumerate(_split_documentos(pedidos))
+        )
+    categorias, perfis = [], []
+    for cubo_id, categoria_ids, perfil_ids in bind.execute(sa.text('SELECT id, "categoriaIds", "perfilIds" FROM cubos')):
+        categorias.extend({'cuboId': cubo_id, 'categoriaId': categoria_id} for categoria_id in _parse_ids(categoria_ids))
+        perfis.extend({'cuboId': cubo_id, 'perfilId': perfil_id} for perfil_id in _parse_ids(perfil_ids))
+    _insert_batches(bind, categoria_documentos, documentos)
+    _insert_batches(bind, cubo_categorias, categorias)
+    _insert_batches(bind, cubo_perfis, perfis)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_cuboPerfis_perfilId', table_name='cuboPerfis')
+    op.drop_table('cuboPerfis')
+    op.drop_index('ix_cuboCategorias_categoriaId', table_name='cuboCategorias')
+    op.drop_table('cuboCategorias')
+    op.drop_index('ix_categoriaDocumentos_categoria_ordem', table_name='categoriaDocumentos')
+    op.drop_index('ix_categoriaDocumentos_id', table_name='categoriaDocumentos')
+    op.drop_table('categoriaDocumentos')
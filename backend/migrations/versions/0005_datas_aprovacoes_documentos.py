@@ -0,0 +1,150 @@
+"""aprovacoes.data e documentos.data como DateTime (com índices)
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 21:05:00.000000
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+LOTE = 5000
+
+# (tabela, formato do texto no downgrade)
+TABELAS = [
+    ('aprovacoes', '%Y-%m-%d %H:%M'),
+    ('documentos', '%Y-%m-%d'),
+]
+# (nome, tabela, colunas) — os mesmos declarados em models.py
+INDICES = [
+    ('ix_aprovacoes_data', 'aprovacoes', ['data']),
+    ('ix_aprovacoes_status_data', 'aprovacoes', ['status', 'data']),
+    ('ix_documentos_data', 'documentos', ['data']),
+]
+FORMATOS_LEGADOS = ('%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%Y')
+
+
+def _parse(value):
+    """Texto gravado pelos handlers ('AAAA-MM-DD HH:MM', 'AAAA-MM-DD', ...); None se não reconhecido."""
+    if value is None or isinstance(value, datetime):
+        return value
+    value = str(value).strip()
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        pass
+    for fmt in FORMATOS_LEGADOS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def _copy_batches(table, source, target, target_type, convert):
+    """
+    Preenche target a partir de source em lotes por id. Cada lote é uma transação
+    (autocommit_block): não segura bloqueio na tabela inteira e, se interrompido,
+    a migração retoma das linhas com target nulo.
+    """
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        last_id = 0
+        while True:
+            rows = bind.execute(sa.text(
+                f'SELECT id, "{source}", "createdAt" FROM "{table}" '
+                f'WHERE "{target}" IS NULL AND id > :last ORDER BY id LIMIT {LOTE}'
+            ), {"last": last_id}).all()
+            if not rows:
+                break
+            bind.execute(
+                sa.text(f'UPDATE "{table}" SET "{target}" = :valor WHERE id = :id')
+                .bindparams(sa.bindparam('valor', type_=target_type)),
+                [{"id": row.id, "valor": convert(row)} for row in rows],
+            )
+            last_id = rows[-1].id
+
+
+def _columns(table):
+    return {column['name'] for column in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def _local(value):
+    """
+    Data com fuso: o texto antigo foi gravado com datetime.now() da API, então sem fuso vale o
+    horário local de quem roda a migração (o mesmo servidor da API). Os handlers gravam .astimezone().
+    """
+    return value.astimezone() if value is not None else None
+
+
+def _postgres_index_state(bind, name):
+    """None se o índice não existe; senão se é válido (CONCURRENTLY interrompido deixa índice inválido)."""
+    return bind.execute(sa.text(
+        "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE c.relname = :name AND pg_table_is_visible(c.oid)"
+    ), {"name": name}).scalar()
+
+
+def _postgres_is_partitioned(bind, table):
+    return bool(bind.execute(sa.text(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.relname = :table AND pg_table_is_visible(c.oid)"
+    ), {"table": table}).scalar())
+
+
+def _create_indices():
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        for name, table, columns in INDICES:
+            op.create_index(name, table, columns, if_not_exists=True)
+        return
+
+    # Postgres: CONCURRENTLY não bloqueia escritas, mas não roda dentro de transação.
+    # Tabelas particionadas (scripts/arquivar_historico.py --particionar) não aceitam CONCURRENTLY.
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDICES:
+            state = _postgres_index_state(bind, name)
+            if state:
+                continue
+            cols = ', '.join(f'"{column}"' for column in columns)
+            if _postgres_is_partitioned(bind, table):
+                op.execute(f'CREATE INDEX IF NOT EXISTS "{name}" ON "{table}" ({cols})')
+                continue
+            if state is False:
+                op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+            op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{name}" ON "{table}" ({cols})')
+
+
+def upgrade() -> None:
+    for table, _ in TABELAS:
+        if 'dataHora' not in _columns(table):
+            op.add_column(table, sa.Column('dataHora', sa.DateTime(timezone=True), nullable=True))
+        # Texto não reconhecido fica com a data de criação da linha
+        _copy_batches(table, 'data', 'dataHora', sa.DateTime(timezone=True),
+                      lambda row: _local(_parse(row.data) or _parse(row.createdAt) or datetime.now()))
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('data')
+            batch_op.alter_column('dataHora', new_column_name='data', existing_type=sa.DateTime(timezone=True),
+                                  nullable=False, server_default=sa.func.now())
+    _create_indices()
+
+
+def downgrade() -> None:
+    for name, table, _ in INDICES:
+        op.drop_index(name, table_name=table, if_exists=True)
+    for table, fmt in TABELAS:
+        op.add_column(table, sa.Column('dataTexto', sa.String(), nullable=True))
+        _copy_batches(table, 'data', 'dataTexto', sa.String(), lambda row, fmt=fmt: _local(_parse(row.data)).strftime(fmt))
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('data')
+            batch_op.alter_column('dataTexto', new_column_name='data', existing_type=sa.String(), nullable=False)
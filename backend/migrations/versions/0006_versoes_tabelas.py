@@ -0,0 +1,31 @@
+"""versões das tabelas no banco (invalidação de caches entre processos)
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-20 09:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('tabelaVersoes',
+    sa.Column('tabela', sa.String(), nullable=False),
+    sa.Column('versao', sa.BigInteger(), nullable=False),
+    sa.Column('updatedAt', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.PrimaryKeyConstraint('tabela')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('tabelaVersoes')
@@ -1,6 +1,6 @@
 from sqlalchemy import *
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy.orm import sessionmaker, relationship, deferred
 import datetime
 from sqlalchemy.sql import func
 
@@ -145,20 +145,30 @@ class Categoria(Base):
     nome = Column(String, nullable=False)
     tipoProcessoId = Column(Integer, nullable=False)
     tipoProcessoNome = Column(String, nullable=False)
-    documentosPedidos = Column(Text, nullable=False)
+    documentosPedidos = Column(Text, nullable=False)  # "Doc 1|Doc 2", espelhado em categoriaDocumentos
     createdAt = Column(DateTime(timezone=True), server_default=func.now())
     updatedAt = Column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now())
 
+class CategoriaDocumento(Base):
+    # Documentos exigidos pela categoria, uma linha por documento (services_regras)
+    __tablename__ = "categoriaDocumentos"
+    id = Column(Integer, primary_key=True, index=True)
+    categoriaId = Column(Integer, nullable=False)
+    nome = Column(String, nullable=False)
+    ordem = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (Index("ix_categoriaDocumentos_categoria_ordem", "categoriaId", "ordem"),)
+
 class Documento(Base):
     __tablename__ = "documentos"
     id = Column(Integer, primary_key=True, index=True)
     titulo = Column(String, nullable=False)
-    data = Column(String, nullable=False)
+    data = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), index=True)
     contratoId = Column(Integer, nullable=False)
     contratoNome = Column(String, nullable=False)
     empresaId = Column(Integer, nullable=False)
     empresaNome = Column(String, nullable=False)
-    categoriaId = Column(Integer, nullable=False)
+    categoriaId = Column(Integer, nullable=False, index=True)
     categoriaNome = Column(String, nullable=False)
     status = Column(String, default="AGUARDANDO", nullable=False)
     uploaded = Column(Boolean, default=False)
@@ -171,6 +181,12 @@ class Documento(Base):
     createdAt = Column(DateTime(timezone=True), server_default=func.now())
     updatedAt = Column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now())
 
+    # Chave natural do envio (reenvio = upsert nela, services_uploads) e contadores de aprovados no mês
+    __table_args__ = (
+        Index("uq_documentos_titulo_contrato_competencia", "titulo", "contratoId", "competencia", "empresaId", unique=True),
+        Index("ix_documentos_status_updatedAt", "status", "updatedAt"),
+    )
+
 class Anexo(Base):
     __tablename__ = "anexos"
     id = Column(Integer, primary_key=True, index=True)
@@ -182,24 +198,30 @@ class Anexo(Base):
     hash = Column(String, nullable=False)
     uploadDate = Column(DateTime(timezone=True), server_default=func.now())
 
+    # Um arquivo por documento (reenvio = upsert, services_uploads)
+    __table_args__ = (Index("uq_anexos_documentoId", "documentoId", unique=True),)
+
 class Aprovacao(Base):
     __tablename__ = "aprovacoes"
     id = Column(Integer, primary_key=True, index=True)
     perfilId = Column(Integer, nullable=False)
     perfilNome = Column(String, nullable=False)
-    documentoId = Column(Integer, nullable=True)
-    anexoFuncionarioId = Column(Integer, nullable=True)
+    documentoId = Column(Integer, nullable=True, index=True)
+    anexoFuncionarioId = Column(Integer, nullable=True, index=True)
     obs = Column(Text, default="")
-    data = Column(String, nullable=False)
+    data = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), index=True)
     status = Column(String, default="AGUARDANDO", nullable=False)
     createdAt = Column(DateTime(timezone=True), server_default=func.now())
 
+    # Vazão e SLA de aprovações por período (status + faixa de data)
+    __table_args__ = (Index("ix_aprovacoes_status_data", "status", "data"),)
+
 class Funcionario(Base):
     __tablename__ = "funcionarios"
     id = Column(Integer, primary_key=True, index=True)
     nome = Column(String, nullable=False)
-    empresaId = Column(Integer)
-    contratoId = Column(Integer)
+    empresaId = Column(Integer, index=True)
+    contratoId = Column(Integer, index=True)
     
     createdAt = Column(DateTime(timezone=True), server_default=func.now())
 
@@ -240,6 +262,13 @@ class StatusFuncionario(Base):
     justificativaAgendamento = Column(String, nullable=True)
     createdAt = Column(DateTime(timezone=True), server_default=func.now())
 
+    # Último status por funcionário (MAX(id) GROUP BY) e "status vigente em uma data"
+    # (services_funcionarios.status_as_of e cubo com as_of)
+    __table_args__ = (
+        Index("ix_statusFuncionarios_funcionario_id", "funcionarioId", "id"),
+        Index("ix_statusFuncionarios_funcionario_data", "funcionarioId", "data", "id"),
+    )
+
 class AnexoFuncionario(Base):
     __tablename__ = "anexosFuncionarios"
     id = Column(Integer, primary_key=True, index=True)
@@ -254,6 +283,9 @@ class AnexoFuncionario(Base):
     hash = Column(String, nullable=False)
     uploadDate = Column(DateTime(timezone=True), server_default=func.now())
 
+    # Um documento por tipo e funcionário (reenvio = upsert, services_uploads)
+    __table_args__ = (Index("uq_anexosFuncionarios_funcionario_tipo", "funcionarioId", "tipo", unique=True),)
+
 class DocumentoExigidoFuncionario(Base):
     __tablename__ = "documentosExigidosFuncionario"
     id = Column(Integer, primary_key=True, index=True)
@@ -293,19 +325,31 @@ class Log(Base):
     userPerfil = Column(String, nullable=False)
     action = Column(String, nullable=False)
     info = Column(Text, nullable=False)
-    date = Column(DateTime(timezone=True), server_default=func.now())
+    date = Column(DateTime(timezone=True), server_default=func.now(), index=True)
 
 class Cubo(Base):
     __tablename__ = "cubos"
     id = Column(Integer, primary_key=True, index=True)
-    categoriaIds = Column(Text, nullable=False)
+    categoriaIds = Column(Text, nullable=False)  # JSON, espelhado em cuboCategorias
     categoriaNomes = Column(Text, nullable=False)
-    perfilIds = Column(Text, nullable=False)
+    perfilIds = Column(Text, nullable=False)  # JSON, espelhado em cuboPerfis
     perfilNomes = Column(Text, nullable=False)
     pastaDriver = Column(String, nullable=False)
     createdAt = Column(DateTime(timezone=True), server_default=func.now())
     updatedAt = Column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now())
 
+class CuboCategoria(Base):
+    # Categorias da regra de aprovação (services_regras)
+    __tablename__ = "cuboCategorias"
+    cuboId = Column(Integer, primary_key=True)
+    categoriaId = Column(Integer, primary_key=True, index=True)
+
+class CuboPerfil(Base):
+    # Perfis da regra de aprovação; perfil -> regras -> categorias autorizadas (services_regras)
+    __tablename__ = "cuboPerfis"
+    cuboId = Column(Integer, primary_key=True)
+    perfilId = Column(Integer, primary_key=True, index=True)
+
 class Relatorio(Base):
     __tablename__ = "relatorios"
     id = Column(Integer, primary_key=True, index=True)
@@ -338,3 +382,74 @@ class CuboSnapshot(Base):
     userId = Column(Integer)  # Who created it
     createdAt = Column(DateTime(timezone=True), server_default=func.now())
     updatedAt = Column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now())
+
+class CuboSnapshotAgendamento(Base):
+    __tablename__ = "cuboSnapshotAgendamentos"
+    id = Column(Integer, primary_key=True, index=True)
+    snapshotId = Column(Integer, nullable=False, unique=True, index=True)
+    frequencia = Column(String, nullable=False)  # DIARIA, SEMANAL
+    horario = Column(String, nullable=False)  # HH:MM (horário do servidor)
+    diaSemana = Column(Integer)  # 0 = segunda ... 6 = domingo (apenas SEMANAL)
+    periodoRelativo = Column(String)  # ex.: ultimos_30_dias, mes_anterior; resolvido a cada execução
+    ativo = Column(Boolean, default=True)
+    proximaExecucao = Column(DateTime, index=True)
+    status = Column(String, default="AGUARDANDO")  # AGUARDANDO, PROCESSANDO, CONCLUIDO, ERRO
+    mensagem = Column(Text)
+    ultimaExecucao = Column(DateTime)
+    # Último resultado materializado
+    materializadoEm = Column(DateTime)
+    dataInicioResolvida = Column(String)
+    dataFimResolvida = Column(String)
+    linhas = Column(Integer)
+    resultadoXlsx = deferred(Column(LargeBinary))
+    resultadoColunar = deferred(Column(LargeBinary))  # Parquet
+    createdAt = Column(DateTime(timezone=True), server_default=func.now())
+    updatedAt = Column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now())
+
+class RelatorioJob(Base):
+    __tablename__ = "relatorioJobs"
+    id = Column(String, primary_key=True, index=True)  # uuid4 hex
+    tipo = Column(String, nullable=False)  # cubo-custom, integracoes-agendadas, historico-pdf
+    parametros = Column(Text, nullable=False)  # JSON string
+    status = Column(String, default="PENDENTE", nullable=False, index=True)  # PENDENTE, PROCESSANDO, CONCLUIDO, ERRO
+    progresso = Column(Integer, default=0)  # 0-100
+    mensagem = Column(Text)
+    userId = Column(Integer)
+    empresaId = Column(Integer)
+    workerId = Column(String)
+    tentativas = Column(Integer, default=0)
+    filename = Column(String)
+    mediaType = Column(String)
+    resultado = Column(LargeBinary)
+    tamanho = Column(Integer)
+    createdAt = Column(DateTime(timezone=True), server_default=func.now())
+    startedAt = Column(DateTime(timezone=True))
+    finishedAt = Column(DateTime(timezone=True))
+    expiresAt = Column(DateTime(timezone=True))
+
+class DashboardContador(Base):
+    # Contadores do dashboard mantidos nas escritas (services_dashboard); linha ausente = recalcular
+    __tablename__ = "dashboardContadores"
+    chave = Column(String, primary_key=True)  # empresasAtivas, totalFuncionarios, docsPendentes, vencidos, aprovadosMes:AAAA-MM
+    valor = Column(Integer, nullable=False, default=0)
+    updatedAt = Column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now())
+
+class TabelaVersao(Base):
+    # Versão por tabela, incrementada no mesmo commit das escritas (services_cache); vale para todos os processos
+    __tablename__ = "tabelaVersoes"
+    tabela = Column(String, primary_key=True)
+    versao = Column(BigInteger, nullable=False, default=0)
+    updatedAt = Column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now())
+
+class ArquivoHistorico(Base):
+    # Linhas antigas de logs, aprovacoes e statusFuncionarios movidas pela retenção (services_retention)
+    __tablename__ = "arquivoHistorico"
+    id = Column(Integer, primary_key=True, index=True)
+    tabela = Column(String, nullable=False, index=True)  # logs, aprovacoes, statusFuncionarios
+    chave = Column(String, nullable=False, index=True)  # funcionario:12, documento:5, anexoFuncionario:3, mes:2024-05
+    periodo = Column(String, nullable=False)  # AAAA-MM das linhas
+    quantidade = Column(Integer, nullable=False)
+    primeiroId = Column(Integer)
+    ultimoId = Column(Integer)
+    dados = deferred(Column(LargeBinary, nullable=False))  # JSON (lista de linhas) comprimido com gzip
+    createdAt = Column(DateTime(timezone=True), server_default=func.now())
@@ -0,0 +1,76 @@
+"""
+Arquivamento do histórico antigo (logs, aprovacoes, statusFuncionarios).
+
+Uso (na pasta backend, com DATABASE_URL apontando para o banco):
+    python scripts/arquivar_historico.py --simular
+    python scripts/arquivar_historico.py
+    python scripts/arquivar_historico.py --tabela logs --tabela aprovacoes
+    python scripts/arquivar_historico.py --particionar   # Postgres, em janela de manutenção
+
+Sem --simular, move para arquivoHistorico as linhas mais antigas que a retenção configurada
+(RETENCAO_*_DIAS, desativada por padrão), em lotes de ARQUIVAMENTO_LOTE. O worker faz o mesmo periodicamente;
+o script serve para a primeira carga e para conferir os números antes.
+--particionar converte as tabelas em particionadas por mês (bloqueia as tabelas durante a cópia).
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import SessionLocal
+from services_retention import (
+    RETENTION_POLICIES, RetentionService, count_archivable, ensure_partitions,
+    is_partitioned, is_postgres, partition_table
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Arquivamento do histórico antigo")
+    parser.add_argument("--tabela", action="append", choices=sorted(RETENTION_POLICIES))
+    parser.add_argument("--simular", action="store_true", help="só conta as linhas que seriam arquivadas")
+    parser.add_argument("--particionar", action="store_true", help="particiona as tabelas por mês (Postgres)")
+    args = parser.parse_args()
+    tabelas = args.tabela or list(RETENTION_POLICIES)
+
+    db = SessionLocal()
+    try:
+        if args.particionar:
+            if not is_postgres(db):
+                print("Particionamento disponível apenas no Postgres")
+                return
+            for tabela in tabelas:
+                if is_partitioned(db, tabela):
+                    print(f"{tabela}: já particionada")
+                    continue
+                started = time.perf_counter()
+                try:
+                    partition_table(db, tabela)
+                except ValueError as e:
+                    db.rollback()
+                    print(e)
+                    continue
+                print(f"{tabela}: particionada em {time.perf_counter() - started:.1f}s")
+            ensure_partitions(db)
+
+        for tabela in tabelas:
+            policy = RETENTION_POLICIES[tabela]
+            if policy.days <= 0:
+                print(f"{tabela}: retenção desativada")
+                continue
+            print(f"{tabela}: {count_archivable(db, policy)} linhas com mais de {policy.days} dias")
+
+        if args.simular:
+            return
+        started = time.perf_counter()
+        result = RetentionService(db).run(tabelas)
+        for tabela, total in result.items():
+            print(f"{tabela}: {total} linhas arquivadas")
+        print(f"Concluído em {time.perf_counter() - started:.1f}s")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark do cubo: caminho SQL x motor analítico em memória.
+
+Uso (na pasta backend, com DATABASE_URL apontando para o banco a medir):
+    python scripts/benchmark_cubo.py
+    python scripts/benchmark_cubo.py --repeticoes 10
+
+Somente leitura. Para cada consulta mede o tempo médio dos dois caminhos e confere
+se ambos devolvem o mesmo conjunto de linhas.
+"""
+import os
+import sys
+import time
+import argparse
+from collections import Counter
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import services_analytics
+from models import SessionLocal
+from services import ReportingService
+from services_analytics import cubo_engine
+from services_cubo import CuboQueryError
+
+CONSULTAS = [
+    ("linhas: funcionário × empresa", "rows", {"columns": ["Funcionário", "Empresa", "Contrato", "Status Integração"]}),
+    ("linhas: com documentos", "rows", {"columns": ["Funcionário", "Empresa", "Título do Documento", "Status do Documento"]}),
+    ("linhas: filtro status", "rows", {
+        "columns": ["Funcionário", "Empresa", "Validade ASO"],
+        "column_filters": {"Status Integração": {"operator": "in", "value": "REALIZADA,AGENDADA"}},
+    }),
+    ("agregado: empresa × status doc", "aggregate", {
+        "group_by": ["Empresa", "Status do Documento"],
+        "measures": [{"op": "count"}, {"op": "count_distinct_funcionario"}],
+    }),
+    ("agregado: contrato × vencimento ASO", "aggregate", {
+        "group_by": ["Contrato"],
+        "measures": [{"op": "count"}, {"op": "dias_ate_vencimento", "field": "Validade ASO"}],
+    }),
+]
+
+
+def _normalize(rows):
+    def value(v):
+        if isinstance(v, datetime):
+            return v.replace(tzinfo=None).isoformat(sep=" ")
+        return None if v is None else str(v)
+    return Counter(tuple(value(v) for v in row) for row in rows)
+
+
+def _run(db, kind, params, motor: bool):
+    # engine_for consulta a flag a cada chamada: liga/desliga o desvio para o motor
+    services_analytics.CUBO_ANALYTICS_ENABLED = motor
+    service = ReportingService(db)
+    if kind == "rows":
+        _, batches = service.iter_custom_cube_batches(params["columns"], None, params.get("column_filters"), check_cost=False)
+        return [row for batch in batches for row in batch]
+    _, rows = service.aggregate_custom_cube(params["group_by"], params["measures"], None, params.get("column_filters"), use_cache=False)
+    return rows
+
+
+def _timed(fn, repeticoes):
+    result = None
+    started = time.perf_counter()
+    for _ in range(repeticoes):
+        result = fn()
+    return result, (time.perf_counter() - started) / repeticoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do cubo: SQL x motor analítico")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        cubo_engine.refresh(db)
+        print(f"Carga completa do motor: {time.perf_counter() - started:.3f}s {cubo_engine.stats()['linhas']}")
+        started = time.perf_counter()
+        cubo_engine.refresh(db)
+        print(f"Refresh incremental (sem alterações): {time.perf_counter() - started:.3f}s\n")
+
+        print(f"{'consulta':40} {'linhas':>8} {'sql (s)':>10} {'motor (s)':>10} {'ganho':>7}  iguais")
+        for nome, kind, params in CONSULTAS:
+            try:
+                sql_rows, sql_time = _timed(lambda: _run(db, kind, params, motor=False), args.repeticoes)
+            except CuboQueryError as e:
+                db.rollback()
+                print(f"{nome:40} caminho SQL falhou: {e}")
+                continue
+            engine_rows, engine_time = _timed(lambda: _run(db, kind, params, motor=True), args.repeticoes)
+            iguais = "sim" if _normalize(sql_rows) == _normalize(engine_rows) else "NÃO"
+            ganho = sql_time / engine_time if engine_time else float("inf")
+            print(f"{nome:40} {len(sql_rows):>8} {sql_time:>10.4f} {engine_time:>10.4f} {ganho:>6.1f}x  {iguais}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
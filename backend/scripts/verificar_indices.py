@@ -0,0 +1,117 @@
+"""
+Confere, pelo plano de execução (EXPLAIN), se cada consulta frequente usa o seu índice.
+
+Uso (na pasta backend, com DATABASE_URL apontando para o banco a verificar):
+    python scripts/verificar_indices.py
+
+Somente leitura. No Postgres o seq scan é desligado na sessão (SET enable_seqscan = off):
+em tabelas pequenas o planejador prefere varrer a tabela, e aqui interessa saber se o
+índice existe e é utilizável pela consulta. Sai com código 1 se alguma consulta não usar índice.
+"""
+import os
+import re
+import sys
+import json
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+from models import SessionLocal
+
+AGORA = datetime.now()
+
+# (descrição, SQL, parâmetros, índices aceitos)
+CONSULTAS = [
+    ("último status do funcionário",
+     'SELECT MAX(id) FROM "statusFuncionarios" WHERE "funcionarioId" = :id',
+     {"id": 1}, {"ix_statusFuncionarios_funcionario_id", "ix_statusFuncionarios_funcionario_data"}),
+    ("status vigente em uma data",
+     'SELECT MAX(id) FROM "statusFuncionarios" WHERE "funcionarioId" = :id AND data <= :momento',
+     {"id": 1, "momento": AGORA}, {"ix_statusFuncionarios_funcionario_data"}),
+    ("reenvio de documento",
+     'SELECT id FROM documentos WHERE titulo = :titulo AND "contratoId" = :contrato AND competencia = :competencia AND "empresaId" = :empresa',
+     {"titulo": "x", "contrato": 1, "competencia": "01/2026", "empresa": 1}, {"uq_documentos_titulo_contrato_competencia"}),
+    ("documentos da categoria",
+     'SELECT id FROM documentos WHERE "categoriaId" = :id',
+     {"id": 1}, {"ix_documentos_categoriaId"}),
+    ("documentos aprovados no mês",
+     'SELECT COUNT(*) FROM documentos WHERE status = :status AND "updatedAt" >= :inicio',
+     {"status": "APROVADO", "inicio": AGORA.replace(day=1)}, {"ix_documentos_status_updatedAt"}),
+    ("anexos do documento",
+     'SELECT id FROM anexos WHERE "documentoId" = :id',
+     {"id": 1}, {"uq_anexos_documentoId"}),
+    ("anexo do funcionário por tipo",
+     'SELECT id FROM "anexosFuncionarios" WHERE "funcionarioId" = :id AND tipo = :tipo',
+     {"id": 1, "tipo": "ASO"}, {"uq_anexosFuncionarios_funcionario_tipo"}),
+    ("aprovações do documento",
+     'SELECT id FROM aprovacoes WHERE "documentoId" = :id',
+     {"id": 1}, {"ix_aprovacoes_documentoId"}),
+    ("aprovações do anexo de funcionário",
+     'SELECT id FROM aprovacoes WHERE "anexoFuncionarioId" = :id',
+     {"id": 1}, {"ix_aprovacoes_anexoFuncionarioId"}),
+    ("aprovações por dia no período",
+     'SELECT date(data), "perfilId", COUNT(*) FROM aprovacoes WHERE status = :status AND data >= :inicio AND data < :fim GROUP BY date(data), "perfilId"',
+     {"status": "APROVADO", "inicio": AGORA.replace(day=1), "fim": AGORA}, {"ix_aprovacoes_status_data"}),
+    ("funcionários da empresa",
+     'SELECT id FROM funcionarios WHERE "empresaId" = :id',
+     {"id": 1}, {"ix_funcionarios_empresaId"}),
+    ("funcionários do contrato",
+     'SELECT id FROM funcionarios WHERE "contratoId" = :id',
+     {"id": 1}, {"ix_funcionarios_contratoId"}),
+    ("categorias autorizadas do perfil",
+     'SELECT DISTINCT cc."categoriaId" FROM "cuboCategorias" cc JOIN "cuboPerfis" cp ON cp."cuboId" = cc."cuboId" WHERE cp."perfilId" = :id',
+     {"id": 1}, {"ix_cuboPerfis_perfilId"}),
+    ("documentos exigidos da categoria",
+     'SELECT nome FROM "categoriaDocumentos" WHERE "categoriaId" = :id ORDER BY ordem',
+     {"id": 1}, {"ix_categoriaDocumentos_categoria_ordem"}),
+    ("logs mais recentes",
+     'SELECT id FROM logs ORDER BY date DESC LIMIT 100',
+     {}, {"ix_logs_date"}),
+]
+
+
+def _postgres_indexes(plan):
+    """Nomes dos índices usados em qualquer nó do plano JSON do Postgres."""
+    found = set()
+    if isinstance(plan, dict):
+        if plan.get("Index Name"):
+            found.add(plan["Index Name"])
+        for value in plan.values():
+            found |= _postgres_indexes(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            found |= _postgres_indexes(item)
+    return found
+
+
+def used_indexes(db, sql: str, params: dict):
+    if db.get_bind().dialect.name == "postgresql":
+        plan = db.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"), params).scalar()
+        return _postgres_indexes(json.loads(plan) if isinstance(plan, str) else plan)
+    # SQLite: "SEARCH documentos USING INDEX ix_... (...)" / "USING COVERING INDEX ix_..."
+    rows = db.execute(text(f"EXPLAIN QUERY PLAN {sql}"), params).all()
+    return {match for row in rows for match in re.findall(r"USING (?:COVERING )?INDEX (\S+)", row[-1])}
+
+
+def main():
+    db = SessionLocal()
+    falhas = 0
+    try:
+        if db.get_bind().dialect.name == "postgresql":
+            db.execute(text("SET enable_seqscan = off"))
+        for nome, sql, params, esperados in CONSULTAS:
+            usados = used_indexes(db, sql, params)
+            ok = bool(usados & esperados)
+            falhas += not ok
+            detalhe = ", ".join(sorted(usados)) or "nenhum índice"
+            print(f"{'OK   ' if ok else 'FALHA'} {nome:40} {detalhe}")
+    finally:
+        db.rollback()
+        db.close()
+    print(f"\n{len(CONSULTAS) - falhas}/{len(CONSULTAS)} consultas usando o índice esperado")
+    sys.exit(1 if falhas else 0)
+
+
+if __name__ == "__main__":
+    main()
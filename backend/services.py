@@ -1,10 +1,198 @@
 import os
-import base64
 import io
+import asyncio
+import tempfile
+from sqlalchemy import text, select, func
 from sqlalchemy.orm import Session
 import models
-from fpdf import FPDF
-from datetime import datetime
+from services_cubo import (
+    CuboQueryPlanner, CUBO_DATE_KEYWORDS, CUBO_PREVIEW_MAX_LIMIT, CUBO_PREVIEW_TIMEOUT_MS,
+    CUBO_QUERY_TIMEOUT_MS, compile_measures, is_date_field, statement_timeout, estimate_row_count,
+    encode_cursor, decode_cursor, check_query_cost, limit_rows, cap_batches
+)
+from services_cache import cubo_cache, cubo_cache_key, report_cache_key
+from services_analytics import engine_for
+from services_pdf import PDFBranding, PDFReport, branding_cache
+from services_pool import cpu_pool
+from services_historico import load_employee_histories, render_employee_history
+from services_events import event_bus, run_coroutine, DocumentStatusChanged
+from datetime import datetime, date
+
+# Cubo: tamanho dos lotes lidos do cursor do servidor e limites da exportação
+CUBO_BATCH_SIZE = int(os.getenv("CUBO_BATCH_SIZE", "2000"))
+CUBO_WIDTH_SAMPLE_ROWS = 500
+CUBO_SPOOL_MAX_BYTES = 8 * 1024 * 1024
+
+def _to_excel_date(value):
+    if value is None or isinstance(value, str) and not value:
+        return value
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return datetime.fromisoformat(str(value)).date()
+    except ValueError:
+        return value
+
+def iter_file(fileobj, chunk_size: int = 64 * 1024):
+    """Transmite um arquivo em blocos e o fecha ao final (usado com StreamingResponse)."""
+    try:
+        while True:
+            chunk = fileobj.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        fileobj.close()
+
+def write_rows_excel(output, headers: list, batches, date_idx: list = (), progress=None, sheet_name: str = 'Cubo Customizado'):
+    """
+    Escreve lotes de linhas em um XLSX write-only (memória constante).
+    `date_idx` indica as colunas convertidas para data. Retorna o número de linhas escritas.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+    from openpyxl.utils import get_column_letter
+
+    def convert(row):
+        values = list(row)
+        for i in date_idx:
+            values[i] = _to_excel_date(values[i])
+        return values
+
+    # Lê apenas uma amostra antes de escrever: no modo write-only as larguras
+    # precisam ser definidas antes da primeira linha.
+    sample = []
+    for batch in batches:
+        sample.extend(convert(row) for row in batch)
+        if len(sample) >= CUBO_WIDTH_SAMPLE_ROWS:
+            break
+
+    wb = Workbook(write_only=True)
+    worksheet = wb.create_sheet(sheet_name)
+
+    for i, col in enumerate(headers):
+        max_length = len(col)
+        for values in sample[:CUBO_WIDTH_SAMPLE_ROWS]:
+            if values[i] is not None:
+                max_length = max(max_length, len(str(values[i])))
+        worksheet.column_dimensions[get_column_letter(i + 1)].width = min(max_length + 4, 70)
+
+    header_cells = []
+    for col in headers:
+        cell = WriteOnlyCell(worksheet, value=col)
+        cell.font = Font(bold=True)
+        header_cells.append(cell)
+    worksheet.append(header_cells)
+
+    count = 0
+    for values in sample:
+        worksheet.append(values)
+        count += 1
+    if progress:
+        progress(count)
+    for batch in batches:
+        for row in batch:
+            worksheet.append(convert(row))
+            count += 1
+        if progress:
+            progress(count)
+
+    wb.save(output)
+    return count
+
+def render_scheduled_integration_pdf(branding: PDFBranding, results, date_start: str, date_end: str, unidade_nome: str):
+    """Ficha de presença das integrações agendadas (sem acesso ao banco; roda no pool de processos)."""
+    # Logo, título e rodapé vêm do template com o branding em cache
+    pdf = PDFReport(branding, 'Integrações Agendadas por Período', 'Ficha de Presença')
+    pdf.add_page()
+
+    # Helper for date formatting
+    def format_date_br(date_str):
+        try:
+            if not date_str: return "-"
+            if isinstance(date_str, datetime):
+                return date_str.strftime("%d/%m/%Y")
+            # Assume YYYY-MM-DD
+            dt = datetime.strptime(date_str, "%Y-%m-%d")
+            return dt.strftime("%d/%m/%Y")
+        except:
+            return date_str
+
+    date_start_br = format_date_br(date_start)
+    date_end_br = format_date_br(date_end)
+
+    # Info Header
+    pdf.set_font('helvetica', 'B', 10)
+    pdf.cell(0, 5, f"Empresa: {pdf.branding.nome_empresa}", ln=True)
+    pdf.cell(0, 5, f"Unidade de Integração: {unidade_nome or 'Todas'}", ln=True)
+    pdf.cell(0, 5, f"Período: {date_start_br} até {date_end_br}", ln=True)
+    pdf.ln(8)
+
+    # Group results by Provider
+    grouped = {}
+    for row in results:
+        emp = row.empresa_nome
+        if emp not in grouped:
+            grouped[emp] = []
+        grouped[emp].append(row)
+
+    for emp_nome, emps in grouped.items():
+        # Provider Header
+        pdf.set_font('helvetica', 'B', 11)
+        pdf.set_fill_color(245, 245, 245)
+        pdf.cell(0, 8, f"Prestadora: {emp_nome}", ln=True, fill=True, border='LTBR')
+        
+        # Table Header
+        pdf.set_font('helvetica', 'B', 9)
+        pdf.cell(80, 7, 'Nome do Funcionário', border=1, align='C')
+        pdf.cell(40, 7, 'Cargo', border=1, align='C')
+        pdf.cell(35, 7, 'Setor', border=1, align='C')
+        pdf.cell(35, 7, 'Data Agendada', border=1, ln=True, align='C')
+
+        # Table Rows
+        pdf.set_font('helvetica', '', 8)
+        for e in emps:
+            data_str = e.data_integracao.strftime("%d/%m/%Y %H:%M") if e.data_integracao else "-"
+            
+            # Check for page break before drawing row
+            if pdf.get_y() > 260:
+                pdf.add_page()
+                pdf.set_font('helvetica', 'B', 9)
+                pdf.cell(80, 7, 'Nome do Funcionário', border=1, align='C')
+                pdf.cell(40, 7, 'Cargo', border=1, align='C')
+                pdf.cell(35, 7, 'Setor', border=1, align='C')
+                pdf.cell(35, 7, 'Data Agendada', border=1, ln=True, align='C')
+                pdf.set_font('helvetica', '', 8)
+
+            pdf.cell(80, 6, e.funcionario_nome[:45], border=1)
+            pdf.cell(40, 6, (e.cargo_nome or "-")[:25], border=1)
+            pdf.cell(35, 6, (e.setor_nome or "-")[:20], border=1)
+            pdf.cell(35, 6, data_str, border=1, ln=True, align='C')
+        pdf.ln(6)
+
+    # Signatures section
+    pdf.ln(5)
+    signature_areas = [
+        "RSC",
+        "Ambiência e Certificação",
+        "TI",
+        "Saúde e Segurança do Trabalho",
+        "Recursos Humanos"
+    ]
+
+    for area in signature_areas:
+        if pdf.get_y() > 240:
+            pdf.add_page()
+        pdf.ln(12)
+        y_pos = pdf.get_y()
+        pdf.line(10, y_pos, 110, y_pos)
+        pdf.set_font('helvetica', 'I', 8)
+        pdf.cell(0, 5, area, ln=True)
+
+    return bytes(pdf.output())
 
 class GoogleDriveService:
     def __init__(self, db: Session):
@@ -18,423 +206,301 @@ class GoogleDriveService:
         print(f"Uploading {filename} to Google Drive for Doc ID {documento_id}")
         return {"success": True, "file_id": "google-drive-id-placeholder"}
 
-class PDFReport(FPDF):
-    def header(self):
-        pass
+async def _upload_to_drive(documento_id: int, file_content: bytes, filename: str):
+    # Sessão própria: agendada no event loop, a corrotina pode rodar depois que o handler fechou a dele
+    db = models.SessionLocal()
+    try:
+        return await GoogleDriveService(db).upload_approved_document(documento_id, file_content, filename)
+    finally:
+        db.close()
+
+@event_bus.on(DocumentStatusChanged, background=True)
+def upload_approved_document_to_drive(db: Session, evento: DocumentStatusChanged):
+    """Documento aprovado: envia o anexo para o Google Drive (fora da requisição de aprovação)."""
+    if evento.status != "APROVADO":
+        return
+    anexo = db.query(models.Anexo.filename, models.Anexo.data).filter(models.Anexo.documentoId == evento.documentoId).first()
+    if not anexo or not anexo.data:
+        return
+    result = run_coroutine(_upload_to_drive(evento.documentoId, anexo.data, anexo.filename))
+    if isinstance(result, asyncio.Task):
+        # Agendado no event loop da API (handler chamado de uma rota async); falhas vão para o log
+        return
+    if not result.get("success"):
+        raise RuntimeError(f"Falha no envio ao Google Drive: {result}")
 
 class ReportingService:
     def __init__(self, db: Session):
         self.db = db
 
-    def generate_custom_cube_excel(self, columns: list, date_filter: dict = None, column_filters: dict = None):
-        import pandas as pd
-        from sqlalchemy import text
-        import io
-        
-        # Field mapping: Human Readable -> SQL Column
-        # Tables: sf (statusFuncionarios), e (empresas), c (contratos), d (documentos)
-        field_map = {
-            # --- Funcionário / Integração ---
-            "Funcionário": "sf.funcionarioNome",
-            "Status Integração": "sf.statusIntegracao",
-            "Data Integração": "sf.dataIntegracao",
-            "Unidade Integração": "sf.unidadeIntegracao",
-            "Unidade Atividade": "sf.unidadeAtividade",
-            "Função": "sf.funcao",
-            "Cargo": "sf.cargo",
-            "Setor": "sf.setor",
-            "Status Contratual": "sf.statusContratual",
-            "Data ASO": "sf.dataAso",
-            "Validade ASO": "sf.dataValidadeAso",
-            "Validade Integração": "sf.dataValidadeIntegracao",
-            "Dias Restantes ASO": "sf.prazoAsoDias",
-            "Dias Restantes Integração": "sf.prazoIntegracaoDias",
-            
-            # --- Empresa ---
-            "Empresa": "COALESCE(sf.empresaNome, e.nome)",
-            "CNPJ Empresa": "e.cnpj",
-            "Departamento": "e.departamento",
-            "Status Empresa": "e.status",
-            
-            # --- Contrato ---
-            "Contrato": "COALESCE(sf.contratoNome, c.nome)",
-            "Início Contrato": "c.dtInicio",
-            "Fim Contrato": "c.dtFim",
-            "Status Contrato": "c.status",
-            "Categoria Contrato": "c.categoriaNome",
-            
-            # --- Documentação ---
-            "Título do Documento": "d.titulo",
-            "Categoria do Documento": "d.categoriaNome",
-            "Competência": "d.competencia",
-            "Status do Documento": "d.status",
-            "Email Responsável": "d.email",
-            "Data Documento": "d.data",
-            "Data Criação Doc": "d.createdAt"
-        }
+    def _build_custom_cube_query(self, columns: list, date_filter: dict = None, column_filters: dict = None, include_history: bool = False):
+        planner = CuboQueryPlanner(columns, date_filter, column_filters, include_history=include_history)
+        return planner.build()
 
-        # Build Select Clause
-        select_parts = []
-        df_columns = []
-        for col_name in columns:
-            if col_name in field_map:
-                select_parts.append(f'{field_map[col_name]} as "{col_name}"')
-                df_columns.append(col_name)
-
-        if not select_parts:
-            # Default fallback columns if somehow empty
-            select_parts = ['sf.funcionarioNome as "Funcionário"', 'sf.empresaNome as "Empresa"']
-            df_columns = ["Funcionário", "Empresa"]
-
-        # Base query with joins
-        # Using LEFT JOIN to ensure we don't lose records
-        # Joining documents with employees or contracts if available
-        sql = f"""
-            SELECT {", ".join(select_parts)}
-            FROM statusFuncionarios sf
-            LEFT JOIN empresas e ON sf.empresaId = e.id
-            LEFT JOIN contratos c ON sf.contratoId = c.id
-            LEFT JOIN documentos d ON (sf.funcionarioId = d.funcionarioId OR (d.funcionarioId IS NULL AND sf.contratoId = d.contratoId))
-        """
-
-        # Filter Logic
-        params = {}
-        where_clauses = []
-        
-        if date_filter and "field" in date_filter and date_filter["field"] in field_map:
-            filter_col = field_map[date_filter["field"]]
-            if date_filter.get("start") and date_filter.get("end"):
-                where_clauses.append(f"{filter_col} BETWEEN :start AND :end")
-                params["start"] = date_filter["start"]
-                params["end"] = date_filter["end"] + " 23:59:59"
-            elif date_filter.get("start"):
-                where_clauses.append(f"{filter_col} >= :start")
-                params["start"] = date_filter["start"]
-            elif date_filter.get("end"):
-                where_clauses.append(f"{filter_col} <= :end")
-                params["end"] = date_filter["end"] + " 23:59:59"
-
-        # 2. Per-Column Filters
-        if column_filters:
-            for i, (col_name, filter_info) in enumerate(column_filters.items()):
-                if col_name in field_map:
-                    sql_col = field_map[col_name]
-                    operator = filter_info.get("operator", "igual")
-                    value = filter_info.get("value")
-                    
-                    if value is not None and value != "":
-                        param_name = f"col_filter_{i}"
-                        if operator == "igual":
-                            where_clauses.append(f"{sql_col} = :{param_name}")
-                            params[param_name] = value
-                        elif operator == "contem":
-                            where_clauses.append(f"{sql_col} LIKE :{param_name}")
-                            params[param_name] = f"%{value}%"
-                        elif operator == "in":
-                            # Process comma-separated values
-                            val_list = [v.strip() for v in str(value).split(",")]
-                            # SQL IN clause with dynamic parameters
-                            in_params = []
-                            for j, val in enumerate(val_list):
-                                p_name = f"{param_name}_{j}"
-                                in_params.append(f":{p_name}")
-                                params[p_name] = val
-                            where_clauses.append(f"{sql_col} IN ({', '.join(in_params)})")
-
-        if where_clauses:
-            sql += " WHERE " + " AND ".join(where_clauses)
-            
-        sql += " ORDER BY sf.id DESC"
+    def check_custom_cube_cost(self, columns: list, date_filter: dict = None, column_filters: dict = None, include_history: bool = False):
+        """Valida o custo estimado da consulta (CuboQueryTooLarge se passar dos limites)."""
+        sql, params = CuboQueryPlanner(columns, date_filter, column_filters, include_history=include_history).build_sql()
+        return check_query_cost(self.db, sql, params)
 
-        result = self.db.execute(text(sql), params)
-        df = pd.DataFrame(result.fetchall(), columns=df_columns)
-        
-        # Identity and format date columns automatically
-        date_keywords = ["Data", "Validade", "Início", "Fim", "Criação"]
-        for col in df.columns:
-            if any(key in col for key in date_keywords):
+    def iter_custom_cube_batches(self, columns: list, date_filter: dict = None, column_filters: dict = None, include_history: bool = False, batch_size: int = CUBO_BATCH_SIZE, check_cost: bool = True):
+        """
+        Executa a consulta do cubo com cursor do lado do servidor e devolve
+        (cabeçalhos, gerador de lotes de linhas). Nunca materializa o resultado inteiro.
+        A consulta roda com CUBO_QUERY_TIMEOUT_MS e para ao passar de CUBO_MAX_ROWS linhas;
+        com check_cost o custo estimado é validado antes (chamadores que já validaram passam False).
+        Com o motor analítico sincronizado, as linhas saem da memória em vez do banco.
+        """
+        engine = engine_for(include_history, date_filter)
+        if engine:
+            headers, batches = engine.iter_rows(columns, date_filter, column_filters, batch_size)
+            return headers, cap_batches(batches)
+
+        planner = CuboQueryPlanner(columns, date_filter, column_filters, include_history=include_history)
+        sql, params = planner.build_sql()
+        if check_cost:
+            check_query_cost(self.db, sql, params)
+        query = text(limit_rows(sql))
+
+        def batches():
+            with statement_timeout(self.db, CUBO_QUERY_TIMEOUT_MS):
+                result = self.db.execute(
+                    query.execution_options(stream_results=True, yield_per=batch_size),
+                    params
+                )
                 try:
-                    df[col] = pd.to_datetime(df[col]).dt.date
-                except:
-                    pass
-                
-        # Export to bytes
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, index=False, sheet_name='Cubo Customizado')
-            
-            # Formatting
-            worksheet = writer.sheets['Cubo Customizado']
-            for col in worksheet.columns:
-                max_length = 0
-                column = col[0].column_letter
-                for cell in col:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                worksheet.column_dimensions[column].width = min(max_length + 4, 70)
-                
-        return output.getvalue()
-
-    def generate_scheduled_integration_pdf(self, results, config, date_start: str, date_end: str, unidade_nome: str):
-        pdf = FPDF()
-        pdf.add_page()
-        
-        # Logo handling (Save to temp file to avoid FPDF BytesIO issues)
-        if config.logoImage:
-            try:
-                header_logo = config.logoImage
-                if "," in header_logo:
-                    header_logo = header_logo.split(",")[1]
-                
-                import tempfile
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as temp_logo:
-                    temp_logo.write(base64.b64decode(header_logo))
-                    temp_logo_path = temp_logo.name
-                
-                pdf.image(temp_logo_path, x=10, y=8, h=15)
-                os.unlink(temp_logo_path)
-            except Exception as e:
-                print(f"Error loading logo in PDF: {e}")
-
-        pdf.set_y(25) # Adjust based on logo presence/size
-        pdf.set_font('helvetica', 'B', 16)
-        pdf.cell(0, 8, 'Integrações Agendadas por Período', ln=True, align='C')
-        pdf.set_font('helvetica', '', 11)
-        pdf.cell(0, 6, 'Ficha de Presença', ln=True, align='C')
-        pdf.ln(5)
-
-        # Helper for date formatting
-        def format_date_br(date_str):
-            try:
-                if not date_str: return "-"
-                if isinstance(date_str, datetime):
-                    return date_str.strftime("%d/%m/%Y")
-                # Assume YYYY-MM-DD
-                dt = datetime.strptime(date_str, "%Y-%m-%d")
-                return dt.strftime("%d/%m/%Y")
-            except:
-                return date_str
-
-        date_start_br = format_date_br(date_start)
-        date_end_br = format_date_br(date_end)
-
-        # Info Header
-        pdf.set_font('helvetica', 'B', 10)
-        pdf.cell(0, 5, f"Empresa: {config.nomeEmpresa}", ln=True)
-        pdf.cell(0, 5, f"Unidade de Integração: {unidade_nome or 'Todas'}", ln=True)
-        pdf.cell(0, 5, f"Período: {date_start_br} até {date_end_br}", ln=True)
-        pdf.ln(8)
-
-        # Group results by Provider
-        grouped = {}
-        for row in results:
-            emp = row.empresa_nome
-            if emp not in grouped:
-                grouped[emp] = []
-            grouped[emp].append(row)
-
-        for emp_nome, emps in grouped.items():
-            # Provider Header
-            pdf.set_font('helvetica', 'B', 11)
-            pdf.set_fill_color(245, 245, 245)
-            pdf.cell(0, 8, f"Prestadora: {emp_nome}", ln=True, fill=True, border='LTBR')
-            
-            # Table Header
-            pdf.set_font('helvetica', 'B', 9)
-            pdf.cell(80, 7, 'Nome do Funcionário', border=1, align='C')
-            pdf.cell(40, 7, 'Cargo', border=1, align='C')
-            pdf.cell(35, 7, 'Setor', border=1, align='C')
-            pdf.cell(35, 7, 'Data Agendada', border=1, ln=True, align='C')
-
-            # Table Rows
-            pdf.set_font('helvetica', '', 8)
-            for e in emps:
-                data_str = e.data_integracao.strftime("%d/%m/%Y %H:%M") if e.data_integracao else "-"
-                
-                # Check for page break before drawing row
-                if pdf.get_y() > 260:
-                    pdf.add_page()
-                    pdf.set_font('helvetica', 'B', 9)
-                    pdf.cell(80, 7, 'Nome do Funcionário', border=1, align='C')
-                    pdf.cell(40, 7, 'Cargo', border=1, align='C')
-                    pdf.cell(35, 7, 'Setor', border=1, align='C')
-                    pdf.cell(35, 7, 'Data Agendada', border=1, ln=True, align='C')
-                    pdf.set_font('helvetica', '', 8)
-
-                pdf.cell(80, 6, e.funcionario_nome[:45], border=1)
-                pdf.cell(40, 6, (e.cargo_nome or "-")[:25], border=1)
-                pdf.cell(35, 6, (e.setor_nome or "-")[:20], border=1)
-                pdf.cell(35, 6, data_str, border=1, ln=True, align='C')
-            pdf.ln(6)
-
-        # Signatures section
-        pdf.ln(5)
-        signature_areas = [
-            "RSC",
-            "Ambiência e Certificação",
-            "TI",
-            "Saúde e Segurança do Trabalho",
-            "Recursos Humanos"
-        ]
-
-        for area in signature_areas:
-            if pdf.get_y() > 240:
-                pdf.add_page()
-            pdf.ln(12)
-            y_pos = pdf.get_y()
-            pdf.line(10, y_pos, 110, y_pos)
-            pdf.set_font('helvetica', 'I', 8)
-            pdf.cell(0, 5, area, ln=True)
+                    yield from cap_batches(result.partitions(batch_size))
+                finally:
+                    result.close()
 
-        return pdf.output(dest='S').encode('latin-1')
+        return list(planner.headers), batches()
 
-    def generate_employee_history_pdf(self, funcionario_id: int):
-        # 1. Fetch Data
-        funcionario = self.db.query(models.Funcionario).filter(models.Funcionario.id == funcionario_id).first()
-        if not funcionario:
-            return None
-            
-        status = self.db.query(models.StatusFuncionario).filter(models.StatusFuncionario.funcionarioId == funcionario_id).order_by(models.StatusFuncionario.id.desc()).first()
-        empresa = self.db.query(models.Empresa).filter(models.Empresa.id == funcionario.empresaId).first()
-        contrato = self.db.query(models.Contrato).filter(models.Contrato.id == funcionario.contratoId).first()
-        
-        anexos = self.db.query(models.AnexoFuncionario).filter(models.AnexoFuncionario.funcionarioId == funcionario_id).all()
-        
-        # 2. PDF Setup
-        pdf = FPDF()
-        pdf.add_page()
-        
-        # Logo handling
-        config = self.db.query(models.Configuracao).first()
-        if config and config.logoImage:
+    def write_custom_cube_excel(self, output, columns: list, date_filter: dict = None, column_filters: dict = None, include_history: bool = False, progress=None):
+        """
+        Grava o cubo em `output` (arquivo ou file-like) usando o modo write-only do openpyxl,
+        que mantém memória constante independente do número de linhas.
+        `progress(linhas)` é chamado a cada lote escrito. Retorna o número de linhas escritas.
+        """
+        headers, batches = self.iter_custom_cube_batches(columns, date_filter, column_filters, include_history)
+        # Identify date columns automatically
+        date_idx = [i for i, col in enumerate(headers) if any(key in col for key in CUBO_DATE_KEYWORDS)]
+        return write_rows_excel(output, headers, batches, date_idx, progress)
+
+    def generate_custom_cube_excel(self, columns: list, date_filter: dict = None, column_filters: dict = None, include_history: bool = False, use_cache: bool = True, progress=None):
+        """
+        Gera o XLSX do cubo em um arquivo temporário (em disco acima de CUBO_SPOOL_MAX_BYTES)
+        e o devolve posicionado no início, pronto para ser transmitido com iter_file.
+        Resultados pequenos ficam no cubo_cache até que uma das tabelas de origem mude.
+        """
+        cache_key = None
+        if use_cache:
+            cache_key = cubo_cache_key(self.db, "xlsx", columns, date_filter, column_filters, include_history=include_history)
+            cached = cubo_cache.get(cache_key)
+            if cached is not None:
+                return io.BytesIO(cached)
+
+        output = self._custom_cube_excel_output(columns, date_filter, column_filters, include_history, progress)
+        size = output.seek(0, io.SEEK_END)
+        if cache_key and size <= cubo_cache.max_entry_bytes:
+            output.seek(0)
+            cubo_cache.set(cache_key, output.read(), size)
+        output.seek(0)
+        return output
+
+    def _custom_cube_excel_output(self, columns: list, date_filter: dict = None, column_filters: dict = None, include_history: bool = False, progress=None):
+        """
+        XLSX do cubo em arquivo temporário. Sem o motor colunar em memória (que só existe neste processo),
+        a consulta e a montagem da planilha rodam no pool de processos, fora do GIL da API.
+        """
+        if engine_for(include_history, date_filter) is not None or not cpu_pool.enabled:
+            output = tempfile.SpooledTemporaryFile(max_size=CUBO_SPOOL_MAX_BYTES)
             try:
-                header_logo = config.logoImage
-                if "," in header_logo:
-                    header_logo = header_logo.split(",")[1]
-                
-                import tempfile
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".png") as temp_logo:
-                    temp_logo.write(base64.b64decode(header_logo))
-                    temp_logo_path = temp_logo.name
-                
-                pdf.image(temp_logo_path, x=10, y=8, h=15)
-                os.unlink(temp_logo_path)
-            except Exception as e:
-                print(f"Error loading logo: {e}")
-
-        pdf.set_y(25)
-        pdf.set_font('helvetica', 'B', 16)
-        pdf.cell(0, 8, 'Histórico de Documentação de Integração', ln=True, align='C')
-        pdf.ln(5)
-
-        # 3. Header Info
-        pdf.set_font('helvetica', 'B', 12)
-        pdf.set_fill_color(240, 240, 240)
-        pdf.cell(0, 8, 'Dados do Colaborador', ln=True, fill=True)
-        
-        pdf.set_font('helvetica', '', 10)
-        pdf.ln(2)
-        
-        def draw_info_row(label1, value1, label2=None, value2=None):
-            y = pdf.get_y()
-            pdf.set_font('helvetica', 'B', 10)
-            pdf.cell(35, 6, label1, border=0)
-            pdf.set_font('helvetica', '', 10)
-            pdf.cell(60, 6, value1, border=0)
-            
-            if label2:
-                pdf.set_font('helvetica', 'B', 10)
-                pdf.cell(35, 6, label2, border=0)
-                pdf.set_font('helvetica', '', 10)
-                pdf.cell(60, 6, value2, border=0)
-            pdf.ln(6)
-
-        draw_info_row("Nome:", funcionario.nome[:40], "Status:", status.statusIntegracao if status else "PENDENTE")
-        draw_info_row("Empresa:", empresa.nome[:30] if empresa else "-", "Contrato:", contrato.nome[:30] if contrato else "-")
-        
-        if status:
-            draw_info_row("Função:", status.funcao or "-", "Cargo:", status.cargo or "-")
-            draw_info_row("Data ASO:", status.dataAso.strftime("%d/%m/%Y") if status.dataAso else "-", "Validade ASO:", status.dataValidadeAso.strftime("%d/%m/%Y") if status.dataValidadeAso else "-")
-            draw_info_row("Integração:", status.dataIntegracao.strftime("%d/%m/%Y") if status.dataIntegracao else "-", "Validade Int.:", status.dataValidadeIntegracao.strftime("%d/%m/%Y") if status.dataValidadeIntegracao else "-")
-        
-        pdf.ln(8)
+                self.write_custom_cube_excel(output, columns, date_filter, column_filters, include_history, progress)
+            except Exception:
+                output.close()
+                raise
+            return output
+
+        fd, path = tempfile.mkstemp(suffix=".xlsx")
+        os.close(fd)
+        try:
+            cpu_pool.run(write_custom_cube_excel_file, path, columns, date_filter, column_filters, include_history, progress)
+            return open(path, "rb")
+        finally:
+            os.remove(path)
+
+    def preview_custom_cube(self, columns: list, date_filter: dict = None, column_filters: dict = None, include_history: bool = False, limit: int = 50, cursor: str = None, estimate_count: bool = False):
+        """
+        Primeiras linhas do cubo em JSON para o construtor de relatórios.
+        Usa LIMIT/OFFSET sobre a mesma consulta da exportação e respeita CUBO_PREVIEW_TIMEOUT_MS.
+        """
+        limit = max(1, min(limit, CUBO_PREVIEW_MAX_LIMIT))
+        offset = decode_cursor(cursor)
+        planner = CuboQueryPlanner(columns, date_filter, column_filters, include_history=include_history)
+        sql, params = planner.build_sql()
+
+        with statement_timeout(self.db, CUBO_PREVIEW_TIMEOUT_MS):
+            rows = self.db.execute(
+                text(f"{sql}\n            LIMIT :_preview_limit OFFSET :_preview_offset"),
+                {**params, "_preview_limit": limit + 1, "_preview_offset": offset}
+            ).fetchall()
+            estimate = estimate_row_count(self.db, sql, params) if estimate_count else None
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        return {
+            "columns": planner.headers,
+            "data": [dict(zip(planner.headers, row)) for row in rows],
+            "next_cursor": encode_cursor(offset + limit) if has_more else None,
+            "estimated_total": estimate[0] if estimate else None,
+            "estimated_total_exact": estimate[1] if estimate else None,
+        }
 
-        # 4. Documentation History
-        pdf.set_font('helvetica', 'B', 12)
-        pdf.cell(0, 8, 'Histórico de Validação de Documentos', ln=True, fill=True)
-        pdf.ln(2)
-        
-        if not anexos:
-            pdf.set_font('helvetica', 'I', 10)
-            pdf.cell(0, 10, "Nenhum documento enviado até o momento.", ln=True, align='C')
+    def aggregate_custom_cube(self, group_by: list, measures: list, date_filter: dict = None, column_filters: dict = None, include_history: bool = False, use_cache: bool = True):
+        """
+        Modo pivot do cubo: agrupa pelas dimensões e calcula as medidas no banco.
+        Retorna (cabeçalhos, linhas); ValueError para medidas inválidas.
+        """
+        planner = CuboQueryPlanner.for_aggregate(group_by, measures, date_filter, column_filters, include_history=include_history)
+
+        cache_key = None
+        if use_cache:
+            cache_key = cubo_cache_key(self.db, "agregado", planner.dimensions, date_filter, column_filters,
+                                       include_history=include_history, measures=planner.measures)
+            cached = cubo_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        engine = engine_for(include_history, date_filter)
+        if engine:
+            headers, rows = engine.aggregate(group_by, measures, date_filter, column_filters)
         else:
-            for anexo in anexos:
-                # Check page break
-                if pdf.get_y() > 250:
-                    pdf.add_page()
-                
-                # Document Header
-                pdf.set_font('helvetica', 'B', 11)
-                pdf.cell(0, 8, f"Documento: {anexo.tipo}", ln=True, border='B')
-                
-                # Current Status
-                pdf.set_font('helvetica', '', 9)
-                status_label = anexo.status
-                pdf.cell(30, 6, "Status Atual:", border=0)
-                pdf.set_font('helvetica', 'B', 9)
-                pdf.cell(50, 6, status_label, border=0)
-                pdf.set_font('helvetica', '', 9)
-                pdf.cell(30, 6, "Enviado em:", border=0)
-                pdf.cell(50, 6, anexo.uploadDate.strftime("%d/%m/%Y %H:%M"), border=0, ln=True)
-                
-                # Fetch history for this document
-                history = self.db.query(models.Aprovacao).filter(models.Aprovacao.anexoFuncionarioId == anexo.id).order_by(models.Aprovacao.id.asc()).all()
-                
-                if history:
-                    pdf.ln(2)
-                    pdf.set_font('helvetica', 'B', 8)
-                    pdf.cell(40, 5, "Data/Hora", border=1, fill=True)
-                    pdf.cell(40, 5, "Responsável", border=1, fill=True)
-                    pdf.cell(30, 5, "Ação", border=1, fill=True)
-                    pdf.cell(80, 5, "Observação", border=1, ln=True, fill=True)
-                    
-                    pdf.set_font('helvetica', '', 8)
-                    for h in history:
-                        # Check page break inside table
-                        if pdf.get_y() > 260:
-                            pdf.add_page()
-                            # Re-print headers
-                            pdf.set_font('helvetica', 'B', 8)
-                            pdf.cell(40, 5, "Data/Hora", border=1, fill=True)
-                            pdf.cell(40, 5, "Responsável", border=1, fill=True)
-                            pdf.cell(30, 5, "Ação", border=1, fill=True)
-                            pdf.cell(80, 5, "Observação", border=1, ln=True, fill=True)
-                            pdf.set_font('helvetica', '', 8)
-
-                        # Parse timestamp string from Aprovacao.data (it's string format in model)
-                        # Assuming format stored in 'Aprovacao.data' is 'YYYY-MM-DD HH:MM:SS' or compatible
-                        try:
-                            dt_str = datetime.strptime(h.data, "%Y-%m-%d %H:%M:%S").strftime("%d/%m/%Y %H:%M")
-                        except:
-                            dt_str = h.data
-
-                        pdf.cell(40, 5, dt_str, border=1)
-                        pdf.cell(40, 5, h.perfilNome[:20], border=1)
-                        pdf.cell(30, 5, h.status, border=1)
-                        pdf.cell(80, 5, (h.obs or "-")[:60], border=1, ln=True)
-                else:
-                    pdf.ln(1)
-                    pdf.set_font('helvetica', 'I', 8)
-                    pdf.cell(0, 5, "Sem histórico de aprovações registrado.", ln=True)
-                
-                pdf.ln(4)
-
-        # Footer
-        pdf.set_y(-15)
-        pdf.set_font('helvetica', 'I', 8)
-        pdf.cell(0, 10, f'Relatório gerado em {datetime.now().strftime("%d/%m/%Y %H:%M")}', 0, 0, 'C')
+            query, params, headers = planner.build_aggregate()
+            check_query_cost(self.db, query.text, params)
+            with statement_timeout(self.db, CUBO_QUERY_TIMEOUT_MS):
+                rows = [list(row) for row in self.db.execute(query, params).fetchall()]
+
+        # dias_ate_vencimento: a menor data vem do SQL; a diferença para hoje é calculada aqui
+        today = date.today()
+        offset = len(planner.dimensions)
+        for i, measure in enumerate(planner.measures):
+            if measure["op"] == "dias_ate_vencimento":
+                for row in rows:
+                    expiry = _to_excel_date(row[offset + i])
+                    row[offset + i] = (expiry - today).days if isinstance(expiry, date) else None
+
+        result = (headers, rows)
+        if cache_key:
+            cubo_cache.set(cache_key, result, len(repr(rows)))
+        return result
+
+    def generate_custom_cube_aggregate_excel(self, group_by: list, measures: list, date_filter: dict = None, column_filters: dict = None, include_history: bool = False):
+        headers, rows = self.aggregate_custom_cube(group_by, measures, date_filter, column_filters, include_history)
+        compiled = compile_measures(measures)
+        n_dims = len(headers) - len(compiled)
+        date_idx = [i for i in range(n_dims) if is_date_field(headers[i])]
+        date_idx += [n_dims + i for i, m in enumerate(compiled) if m["op"] in ("min", "max")]
+
+        output = tempfile.SpooledTemporaryFile(max_size=CUBO_SPOOL_MAX_BYTES)
+        write_rows_excel(output, headers, iter([rows]), date_idx, sheet_name='Cubo Agregado')
+        output.seek(0)
+        return output
+
+    def generate_scheduled_integration_report(self, data_inicio: str, data_fim: str, unidade_id: int = None, empresa_id: int = None):
+        """
+        Consulta os agendamentos do período e gera a ficha de presença.
+        Retorna None quando não há registros; ValueError para datas inválidas.
+        """
+        unidade_nome = ""
+        if unidade_id:
+            unidade = self.db.query(models.UnidadeIntegracao).filter(models.UnidadeIntegracao.id == unidade_id).first()
+            if unidade:
+                unidade_nome = unidade.nome
+
+        # Query Data - Usando StatusFuncionario como base (histórico/agendamentos)
+        query = self.db.query(
+            models.StatusFuncionario.dataIntegracao.label("data_integracao"),
+            models.StatusFuncionario.funcionarioNome.label("funcionario_nome"),
+            models.StatusFuncionario.cargo.label("cargo_nome"),
+            models.StatusFuncionario.setor.label("setor_nome"),
+            models.StatusFuncionario.empresaNome.label("empresa_nome"),
+            models.StatusFuncionario.unidadeIntegracao.label("unidade_nome")
+        )
+
+        # Filtros de Data
+        dt_start = datetime.strptime(data_inicio, "%Y-%m-%d")
+        # Ajusta data fim para o final do dia
+        dt_end = datetime.strptime(data_fim, "%Y-%m-%d").replace(hour=23, minute=59, second=59)
+        query = query.filter(models.StatusFuncionario.dataIntegracao >= dt_start)
+        query = query.filter(models.StatusFuncionario.dataIntegracao <= dt_end)
+
+        if unidade_id:
+            query = query.filter(models.StatusFuncionario.unidadeIntegracaoId == unidade_id)
+
+        if empresa_id:
+            query = query.filter(models.StatusFuncionario.empresaId == empresa_id)
+
+        # Filtra apenas registros do tipo 'agendamento' e statusIntegracao "AGENDADA" para o relatório de integrações agendadas
+        query = query.filter(models.StatusFuncionario.tipo == 'agendamento')
+        query = query.filter(models.StatusFuncionario.statusIntegracao == 'AGENDADA')
+
+        results = query.order_by(models.StatusFuncionario.empresaNome, models.StatusFuncionario.dataIntegracao).all()
+        if not results:
+            return None
+
+        return self.generate_scheduled_integration_pdf(results, data_inicio, data_fim, unidade_nome)
+
+    def generate_scheduled_integration_pdf(self, results, date_start: str, date_end: str, unidade_nome: str):
+        return cpu_pool.run(render_scheduled_integration_pdf, branding_cache.get(self.db), results, date_start, date_end, unidade_nome)
 
-        return pdf.output(dest='S').encode('latin-1')
+    def generate_employee_history_pdf(self, funcionario_id: int):
+        # Dados em número fixo de consultas (funcionário/status/empresa/contrato com joins,
+        # metadados dos anexos e aprovações em IN), independente da quantidade de documentos
+        historicos = load_employee_histories(self.db, funcionario_ids=[funcionario_id])
+        if not historicos:
+            return None
+        return cpu_pool.run(render_employee_history, branding_cache.get(self.db), historicos[0])
+
+    # --- Cache dos PDFs renderizados (chave = tipo + parâmetros + impressão digital dos dados) ---
+
+    def employee_history_cache_key(self, funcionario_id: int):
+        """Chave do histórico do funcionário; None se o funcionário não existe. Uma consulta."""
+        anexo_ids = select(models.AnexoFuncionario.id).where(models.AnexoFuncionario.funcionarioId == funcionario_id)
+        row = self.db.execute(select(
+            models.Funcionario.nome,
+            models.Empresa.nome.label("empresa"),
+            models.Contrato.nome.label("contrato"),
+            select(func.max(models.StatusFuncionario.id)).where(
+                models.StatusFuncionario.funcionarioId == funcionario_id
+            ).scalar_subquery().label("max_status"),
+            select(func.max(models.AnexoFuncionario.id)).where(
+                models.AnexoFuncionario.funcionarioId == funcionario_id
+            ).scalar_subquery().label("max_anexo"),
+            select(func.count()).select_from(anexo_ids.subquery()).scalar_subquery().label("anexos"),
+            select(func.max(models.Aprovacao.id)).where(
+                models.Aprovacao.anexoFuncionarioId.in_(anexo_ids)
+            ).scalar_subquery().label("max_aprovacao"),
+        ).outerjoin(
+            models.Empresa, models.Funcionario.empresaId == models.Empresa.id
+        ).outerjoin(
+            models.Contrato, models.Funcionario.contratoId == models.Contrato.id
+        ).where(models.Funcionario.id == funcionario_id)).first()
+        if not row:
+            return None
+        fingerprint = list(row) + [branding_cache.get(self.db).version]
+        return report_cache_key("historico-pdf", {"funcionario_id": funcionario_id}, fingerprint)
+
+    def scheduled_integration_cache_key(self, data_inicio: str, data_fim: str, unidade_id: int = None, empresa_id: int = None):
+        """Chave da ficha de presença: filtros + maior id de statusFuncionarios (registros só são inseridos)."""
+        max_status = self.db.query(func.max(models.StatusFuncionario.id)).scalar()
+        params = {"data_inicio": data_inicio, "data_fim": data_fim, "unidade_id": unidade_id, "empresa_id": empresa_id}
+        return report_cache_key("integracoes-agendadas", params, [max_status, branding_cache.get(self.db).version])
+
+
+def write_custom_cube_excel_file(path: str, columns: list, date_filter: dict = None, column_filters: dict = None, include_history: bool = False, progress=None):
+    """Grava o XLSX do cubo em `path` com uma sessão própria (executado no pool de processos)."""
+    db = models.SessionLocal()
+    try:
+        with open(path, "wb") as output:
+            return ReportingService(db).write_custom_cube_excel(output, columns, date_filter, column_filters, include_history, progress)
+    finally:
+        db.close()
@@ -0,0 +1,396 @@
+import os
+import re
+import time
+import threading
+import warnings
+import pandas as pd
+from datetime import timedelta
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+import models
+from models import SessionLocal
+from services_cache import table_versions, read_table_versions, CUBO_SOURCE_TABLES
+from services_cubo import CUBO_FIELDS, CuboQueryPlanner, compile_measures
+
+# Motor analítico em memória para o cubo (status mais recente × empresa × contrato × documentos).
+# Opcional: CUBO_ANALYTICS_ENABLED=1 liga o refresh em segundo plano e o uso automático pelo cubo.
+CUBO_ANALYTICS_ENABLED = os.getenv("CUBO_ANALYTICS_ENABLED", "0") == "1"
+CUBO_ANALYTICS_REFRESH_SECONDS = float(os.getenv("CUBO_ANALYTICS_REFRESH_SECONDS", "30"))
+CUBO_ANALYTICS_MAX_AGE_SECONDS = float(os.getenv("CUBO_ANALYTICS_MAX_AGE_SECONDS", "120"))
+CUBO_ANALYTICS_BATCH_SIZE = 2000
+
+_SIMPLE_FIELD = re.compile(r'^(sf|e|c|d)\."?(\w+)"?$')
+_COALESCE_FIELD = re.compile(r'^COALESCE\(sf\."(\w+)", (e|c)\.(\w+)\)$')
+
+
+def _field_sources():
+    """Origem de cada campo do cubo nos dataframes, derivada das expressões SQL de CUBO_FIELDS."""
+    sources = {}
+    for name, (expr, _) in CUBO_FIELDS.items():
+        simple = _SIMPLE_FIELD.match(expr)
+        if simple:
+            sources[name] = ((simple.group(1), simple.group(2)),)
+            continue
+        coalesce = _COALESCE_FIELD.match(expr)
+        if coalesce:
+            sources[name] = (("sf", coalesce.group(1)), (coalesce.group(2), coalesce.group(3)))
+            continue
+        raise ValueError(f"Campo do cubo sem equivalente no motor analítico: {name}")
+    return sources
+
+
+FIELD_SOURCES = _field_sources()
+
+
+def _table_columns(alias: str):
+    return sorted({col for sources in FIELD_SOURCES.values() for table, col in sources if table == alias})
+
+
+# Colunas carregadas por tabela (chaves de join + colunas usadas pelos campos do cubo)
+LOADED_COLUMNS = {
+    "sf": sorted({"id", "funcionarioId", "empresaId", "contratoId", *_table_columns("sf")}),
+    "e": sorted({"id", *_table_columns("e")}),
+    "c": sorted({"id", *_table_columns("c")}),
+    "d": sorted({"id", "funcionarioId", "contratoId", "updatedAt", *_table_columns("d")}),
+}
+
+TABLE_MODELS = {
+    "sf": models.StatusFuncionario,
+    "e": models.Empresa,
+    "c": models.Contrato,
+    "d": models.Documento,
+}
+
+
+def _load(db: Session, alias: str, *criteria):
+    model = TABLE_MODELS[alias]
+    columns = LOADED_COLUMNS[alias]
+    rows = db.execute(select(*[getattr(model, col) for col in columns]).where(*criteria)).all()
+    return pd.DataFrame.from_records(rows, columns=columns)
+
+
+def _concat(*frames):
+    # Colunas todas nulas em um dos lados disparam um FutureWarning do pandas sem efeito aqui
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", FutureWarning)
+        return pd.concat(frames, ignore_index=True)
+
+
+def _as_datetime(series: pd.Series):
+    return pd.to_datetime(series, errors="coerce", utc=True).dt.tz_localize(None)
+
+
+def _python_value(value):
+    if value is None or value is pd.NaT:
+        return None
+    if isinstance(value, float) and value != value:
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    return value
+
+
+class CuboAnalyticsEngine:
+    """
+    Mantém em memória o dataset base do cubo (somente o status mais recente de cada
+    funcionário) e responde consultas de linhas e agregações com operações vetorizadas.
+
+    O refresh é incremental: novos registros de statusFuncionarios (id maior que o último
+    lido) e documentos alterados (updatedAt). Empresas e contratos, pequenos, são relidos
+    inteiros. Se as contagens não baterem (exclusões), recarrega tudo.
+    """
+
+    def __init__(self):
+        self._frames = None  # {"sf", "e", "c", "d"}
+        self._bases = {}  # tabelas necessárias -> dataframe base com os campos do cubo
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._status_max_id = 0
+        self._status_count = 0
+        self._docs_updated_at = None
+        self._versions = None
+        self._db_versions = None
+        self.synced_at = None
+        self.last_refresh_seconds = None
+        self.full_reloads = 0
+        self.incremental_refreshes = 0
+
+    # --- Sincronização ---
+
+    def refresh(self, db: Session):
+        with self._refresh_lock:
+            started = time.monotonic()
+            versions = table_versions.get(CUBO_SOURCE_TABLES)
+            db_versions = read_table_versions(db, CUBO_SOURCE_TABLES)
+            status_count, status_max_id = db.execute(
+                select(func.count(models.StatusFuncionario.id), func.max(models.StatusFuncionario.id))
+            ).one()
+            docs_count, docs_updated_at = db.execute(
+                select(func.count(models.Documento.id), func.max(models.Documento.updatedAt))
+            ).one()
+
+            frames = self._incremental(db, status_count, docs_count, db_versions) if self._frames is not None else None
+            if frames is None:
+                frames = {alias: _load(db, alias) for alias in TABLE_MODELS}
+                frames["sf"] = self._latest_status(frames["sf"])
+                self.full_reloads += 1
+            else:
+                self.incremental_refreshes += 1
+
+            with self._lock:
+                self._frames = frames
+                self._bases = {}
+                self._status_max_id = status_max_id or 0
+                self._status_count = status_count
+                self._docs_updated_at = docs_updated_at
+                self._versions = versions
+                self._db_versions = db_versions
+                self.synced_at = time.monotonic()
+                self.last_refresh_seconds = time.monotonic() - started
+
+    def _incremental(self, db: Session, status_count: int, docs_count: int, db_versions: tuple):
+        new_status = _load(db, "sf", models.StatusFuncionario.id > self._status_max_id)
+        if self._status_count + len(new_status) != status_count:
+            return None
+
+        frames = dict(self._frames)
+        if len(new_status):
+            status = _concat(frames["sf"], new_status) if len(frames["sf"]) else new_status
+            frames["sf"] = self._latest_status(status)
+
+        if self._docs_updated_at is None:
+            changed = _load(db, "d")
+        else:
+            # updatedAt é o início da transação (func.now() no Postgres): uma atualização confirmada depois
+            # do último refresh pode ter data anterior a ele, então a leitura volta uma janela no tempo
+            since = self._docs_updated_at - timedelta(seconds=CUBO_ANALYTICS_MAX_AGE_SECONDS)
+            changed = _load(db, "d", models.Documento.updatedAt >= since)
+            docs_version = CUBO_SOURCE_TABLES.index("documentos")
+            if not len(changed) and db_versions[docs_version] != self._db_versions[docs_version]:
+                # Houve escrita em documentos que a janela não alcançou
+                return None
+        if len(changed):
+            docs = frames["d"][~frames["d"]["id"].isin(changed["id"])]
+            frames["d"] = _concat(docs, changed) if len(docs) else changed
+        if len(frames["d"]) != docs_count:
+            return None
+
+        frames["e"] = _load(db, "e")
+        frames["c"] = _load(db, "c")
+        return frames
+
+    @staticmethod
+    def _latest_status(status: pd.DataFrame):
+        return status.sort_values("id").drop_duplicates("funcionarioId", keep="last").reset_index(drop=True)
+
+    def is_fresh(self):
+        """Pronto para uso: sincronizado há pouco e sem escritas nas tabelas de origem (neste processo) desde então."""
+        return (
+            self._frames is not None
+            and time.monotonic() - self.synced_at <= CUBO_ANALYTICS_MAX_AGE_SECONDS
+            and table_versions.get(CUBO_SOURCE_TABLES) == self._versions
+        )
+
+    def stats(self):
+        with self._lock:
+            frames = self._frames or {}
+            return {
+                "habilitado": CUBO_ANALYTICS_ENABLED,
+                "pronto": self.is_fresh(),
+                "idadeSegundos": round(time.monotonic() - self.synced_at, 1) if self.synced_at else None,
+                "ultimoRefreshSegundos": round(self.last_refresh_seconds, 4) if self.last_refresh_seconds is not None else None,
+                "linhas": {alias: len(frame) for alias, frame in frames.items()},
+                "memoriaBytes": int(sum(frame.memory_usage(deep=True).sum() for frame in frames.values())),
+                "recargasCompletas": self.full_reloads,
+                "refreshesIncrementais": self.incremental_refreshes,
+            }
+
+    # --- Dataset base ---
+
+    def _base(self, tables: frozenset):
+        tables = frozenset(tables) | {"sf"}
+        with self._lock:
+            base = self._bases.get(tables)
+            if base is None:
+                base = self._build_base(self._frames, tables)
+                self._bases[tables] = base
+            return base
+
+    @staticmethod
+    def _fields(frame: pd.DataFrame, tables: set):
+        """Calcula os campos do cubo disponíveis nas tabelas dadas; textos repetidos viram categoria."""
+        fields = {}
+        for name, sources in FIELD_SOURCES.items():
+            if any(table not in tables for table, _ in sources) or sources[0][0] not in tables:
+                continue
+            values = frame[f"{sources[0][0]}.{sources[0][1]}"]
+            for table, col in sources[1:]:
+                values = values.where(values.notna(), frame[f"{table}.{col}"])
+            if values.dtype == object and values.nunique(dropna=True) <= max(len(values) // 2, 1):
+                values = values.astype("category")
+            fields[name] = values
+        return pd.DataFrame(fields, index=frame.index)
+
+    @classmethod
+    def _build_base(cls, frames: dict, tables: frozenset):
+        def prefixed(alias):
+            return frames[alias].add_prefix(f"{alias}.")
+
+        # Campos de status/empresa/contrato calculados antes de expandir pelos documentos
+        core = prefixed("sf")
+        if "e" in tables:
+            core = core.merge(prefixed("e"), how="left", left_on="sf.empresaId", right_on="e.id")
+        if "c" in tables:
+            core = core.merge(prefixed("c"), how="left", left_on="sf.contratoId", right_on="c.id")
+        base = cls._fields(core, set(tables) - {"d"})
+        base.insert(0, "_sf_id", core["sf.id"])
+        base.insert(1, "_funcionario_id", core["sf.funcionarioId"])
+        base.insert(2, "_contrato_id", core["sf.contratoId"])
+
+        if "d" in tables:
+            # Mesma reescrita do planner SQL: documentos do funcionário, documentos do
+            # contrato sem funcionário e, por fim, status sem nenhum documento
+            docs_raw = prefixed("d")
+            docs = cls._fields(docs_raw, {"d"})
+            docs["_d_funcionario_id"] = docs_raw["d.funcionarioId"]
+            docs["_d_contrato_id"] = docs_raw["d.contratoId"]
+            contract_docs = docs[docs["_d_funcionario_id"].isna()]
+            by_funcionario = base.merge(docs, how="inner", left_on="_funcionario_id", right_on="_d_funcionario_id")
+            by_contrato = base.merge(contract_docs, how="inner", left_on="_contrato_id", right_on="_d_contrato_id")
+            without_docs = base[
+                ~base["_funcionario_id"].isin(docs["_d_funcionario_id"].dropna())
+                & ~base["_contrato_id"].isin(contract_docs["_d_contrato_id"].dropna())
+            ]
+            base = pd.concat([by_funcionario, by_contrato, without_docs], ignore_index=True)
+            base = base.drop(columns=["_d_funcionario_id", "_d_contrato_id"])
+            # concat de categorias diferentes volta para object; recodifica os campos de documento
+            for name in docs.columns:
+                if name in base and isinstance(docs[name].dtype, pd.CategoricalDtype):
+                    base[name] = pd.Categorical(base[name], categories=docs[name].cat.categories)
+
+        return base.sort_values("_sf_id", ascending=False, kind="stable").reset_index(drop=True)
+
+    # --- Consultas ---
+
+    def _filtered(self, planner: CuboQueryPlanner, date_filter: dict, column_filters: dict):
+        base = self._base(frozenset(planner.tables))
+        mask = pd.Series(True, index=base.index)
+
+        if date_filter and date_filter.get("field") in CUBO_FIELDS:
+            values = _as_datetime(base[date_filter["field"]])
+            if date_filter.get("start"):
+                mask &= values >= pd.Timestamp(date_filter["start"])
+            if date_filter.get("end"):
+                mask &= values <= pd.Timestamp(date_filter["end"] + " 23:59:59")
+
+        for col_name, filter_info in (column_filters or {}).items():
+            if col_name not in CUBO_FIELDS:
+                continue
+            operator = filter_info.get("operator", "igual")
+            value = filter_info.get("value")
+            if value is None or value == "":
+                continue
+            values = base[col_name]
+            if operator == "contem":
+                mask &= values.astype(str).str.contains(str(value), regex=False) & values.notna()
+                continue
+            as_text = values.astype(object).where(values.isna(), values.astype(str))
+            if operator == "igual":
+                mask &= as_text == str(value)
+            elif operator == "in":
+                mask &= as_text.isin([v.strip() for v in str(value).split(",")])
+
+        return base[mask]
+
+    def iter_rows(self, columns: list, date_filter: dict = None, column_filters: dict = None, batch_size: int = CUBO_ANALYTICS_BATCH_SIZE):
+        """Equivalente a ReportingService.iter_custom_cube_batches (sem histórico): (cabeçalhos, lotes)."""
+        planner = CuboQueryPlanner(columns, date_filter, column_filters)
+        frame = self._filtered(planner, date_filter, column_filters)[planner.headers]
+
+        def batches():
+            for start in range(0, len(frame), batch_size):
+                chunk = frame.iloc[start:start + batch_size]
+                yield [tuple(_python_value(v) for v in row) for row in chunk.itertuples(index=False, name=None)]
+
+        return list(planner.headers), batches()
+
+    def aggregate(self, group_by: list, measures: list, date_filter: dict = None, column_filters: dict = None):
+        """Equivalente ao SQL de CuboQueryPlanner.build_aggregate: (cabeçalhos, linhas)."""
+        planner = CuboQueryPlanner.for_aggregate(group_by, measures, date_filter, column_filters)
+        frame = self._filtered(planner, date_filter, column_filters)
+        compiled = compile_measures(measures)
+        dims = planner.dimensions
+
+        work = pd.DataFrame({dim: frame[dim] for dim in dims}, index=frame.index)
+        work["_funcionario_id"] = frame["_funcionario_id"]
+        for i, measure in enumerate(compiled):
+            if measure["field"]:
+                work[f"_m{i}"] = _as_datetime(frame[measure["field"]])
+
+        headers = list(dims) + [m["label"] for m in compiled]
+        # Agrupa pelos códigos das colunas categóricas; observed=True ignora combinações vazias
+        grouped = work.groupby(dims, dropna=False, sort=True, observed=True) if dims else None
+
+        results = []
+        for i, measure in enumerate(compiled):
+            op = measure["op"]
+            if op == "count":
+                results.append(grouped.size() if dims else len(work))
+            elif op == "count_distinct_funcionario":
+                results.append(grouped["_funcionario_id"].nunique() if dims else work["_funcionario_id"].nunique())
+            elif op == "max":
+                results.append(grouped[f"_m{i}"].max() if dims else work[f"_m{i}"].max())
+            else:  # min e dias_ate_vencimento (a menor data; os dias são calculados pelo ReportingService)
+                results.append(grouped[f"_m{i}"].min() if dims else work[f"_m{i}"].min())
+
+        if not dims:
+            return headers, [[_python_value(v) for v in results]]
+
+        table = pd.concat(results, axis=1) if results else pd.DataFrame(index=grouped.size().index)
+        rows = []
+        for key, values in zip(table.index, table.itertuples(index=False, name=None)):
+            key = key if isinstance(key, tuple) else (key,)
+            rows.append([_python_value(v) for v in key] + [_python_value(v) for v in values])
+        return headers, rows
+
+
+cubo_engine = CuboAnalyticsEngine()
+
+
+def engine_for(include_history: bool = False, date_filter: dict = None):
+    """O motor, quando habilitado, sincronizado e a consulta é do formato suportado; senão None (usa SQL)."""
+    # O motor só tem o status mais recente: consultas com data de referência vão ao banco
+    as_of = bool(date_filter and date_filter.get("as_of"))
+    if CUBO_ANALYTICS_ENABLED and not include_history and not as_of and cubo_engine.is_fresh():
+        return cubo_engine
+    return None
+
+
+def run_refresher(stop_event: threading.Event, interval: float = CUBO_ANALYTICS_REFRESH_SECONDS):
+    """
+    Mantém o motor sincronizado. Escritas nas tabelas de origem antecipam o refresh: as deste
+    processo pelo contador em memória, as de outros processos (workers, worker.py) pela tabelaVersoes.
+    """
+    last_refresh = 0.0
+    while not stop_event.is_set():
+        db = SessionLocal()
+        try:
+            stale = (
+                cubo_engine._versions != table_versions.get(CUBO_SOURCE_TABLES)
+                or cubo_engine._db_versions != read_table_versions(db, CUBO_SOURCE_TABLES)
+            )
+            if stale or time.monotonic() - last_refresh >= interval:
+                cubo_engine.refresh(db)
+                last_refresh = time.monotonic()
+        except Exception as e:
+            print(f"Erro ao sincronizar o motor analítico do cubo: {e}")
+            last_refresh = time.monotonic()
+        finally:
+            db.close()
+        stop_event.wait(1.0)
+
+
+def start_refresher_thread(stop_event: threading.Event):
+    thread = threading.Thread(target=run_refresher, args=(stop_event,), name="cubo-analytics-refresh", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,343 @@
+import os
+import json
+import base64
+import threading
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime
+from sqlalchemy import event, insert, inspect, LargeBinary
+from sqlalchemy.orm import Session
+import models
+
+# Auditoria das escritas feitas pela API (tabela logs, lida por /logs e /dashboard/activities).
+# O AuditMiddleware marca as requisições de escrita com a rota; get_current_user completa com o
+# principal. Os hooks da sessão descrevem cada linha criada/alterada/excluída e, depois do commit,
+# as entradas vão para um buffer em memória gravado em lote por uma thread (por tamanho ou tempo).
+# Escritas fora de requisições (worker, barramento de eventos, manutenção) não são auditadas.
+AUDIT_ENABLED = os.getenv("AUDIT_ENABLED", "1") == "1"
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "200"))
+AUDIT_FLUSH_SECONDS = float(os.getenv("AUDIT_FLUSH_SECONDS", "2"))
+AUDIT_BUFFER_SIZE = int(os.getenv("AUDIT_BUFFER_SIZE", "10000"))
+AUDIT_VALUE_MAX_CHARS = 60
+AUDIT_MAX_CHANGES = 6
+
+AUDIT_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+
+# Tabelas auditadas: (menu, nome da entidade). Aprovações e anexos de documentos já são
+# histórico/conteúdo do próprio documento; contadores e fila de relatórios são internos.
+AUDITED_TABLES = {
+    "empresas": ("Empresas", "Empresa"),
+    "subcontratadas": ("Empresas", "Subcontratada"),
+    "contratos": ("Contratos", "Contrato"),
+    "documentos": ("Documentos", "Documento"),
+    "funcionarios": ("Funcionários", "Funcionário"),
+    "statusFuncionarios": ("Funcionários", "Status do funcionário"),
+    "anexosFuncionarios": ("Funcionários", "Documento do funcionário"),
+    "documentosExigidosFuncionario": ("Funcionários", "Documento exigido"),
+    "users": ("Usuários", "Usuário"),
+    "profiles": ("Perfis", "Perfil"),
+    "categorias": ("Categorias", "Categoria"),
+    "tiposProcesso": ("Tipos de Processo", "Tipo de processo"),
+    "funcoes": ("Funções", "Função"),
+    "cargos": ("Cargos", "Cargo"),
+    "setores": ("Setores", "Setor"),
+    "unidadesIntegracao": ("Unidades de Integração", "Unidade de integração"),
+    "cubos": ("Regras de Aprovação", "Regra de aprovação"),
+    "configuracoes": ("Configurações", "Configuração"),
+    "cuboSnapshots": ("Relatórios", "Snapshot do cubo"),
+    "cuboSnapshotAgendamentos": ("Relatórios", "Agendamento de snapshot"),
+}
+
+# Colunas que não entram no resumo (conteúdo de arquivos, chave de acesso, carimbos de data)
+AUDIT_IGNORED_COLUMNS = {"data", "hash", "logoImage", "chave", "createdAt", "updatedAt", "uploadDate", "lastSignedIn"}
+AUDIT_LABEL_COLUMNS = ("nome", "titulo", "name", "tipo", "statusIntegracao")
+
+ACTION_LABELS = {"CREATE": "criou", "UPDATE": "alterou", "DELETE": "excluiu"}
+
+_audit_context = ContextVar("audit_context", default=None)
+
+
+class AuditMiddleware:
+    """Middleware ASGI: abre o contexto de auditoria nas requisições de escrita."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in AUDIT_METHODS or not AUDIT_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        token = _audit_context.set({"rota": f"{scope['method']} {scope['path']}", "userName": None, "userPerfil": None})
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _audit_context.reset(token)
+
+
+def set_audit_principal(user_name: str, user_perfil: str):
+    # O dicionário é compartilhado: vale também nas threads do threadpool da mesma requisição
+    context = _audit_context.get()
+    if context is not None:
+        context["userName"] = user_name
+        context["userPerfil"] = user_perfil
+
+
+def audit_principal_names(current_user: dict, profile=None):
+    """(userName, userPerfil) do principal, com os mesmos nomes usados nas aprovações."""
+    if current_user["type"] == "empresa":
+        return current_user["data"].nome, "PRESTADORA"
+    user = current_user["data"]
+    if user.role == "admin":
+        return user.name, "Admin"
+    return user.name, profile.name if profile else "Sem Perfil"
+
+
+def _format_value(value):
+    if value is None:
+        return "vazio"
+    if isinstance(value, datetime):
+        value = value.strftime("%d/%m/%Y %H:%M")
+    text = str(value)
+    if len(text) > AUDIT_VALUE_MAX_CHARS:
+        text = text[:AUDIT_VALUE_MAX_CHARS - 1] + "…"
+    return text
+
+
+def _audited_columns(obj):
+    for column in obj.__table__.columns:
+        if column.key in AUDIT_IGNORED_COLUMNS or column.primary_key or isinstance(column.type, LargeBinary):
+            continue
+        yield column.key
+
+
+def _diff_summary(obj):
+    """'campo: antigo → novo' das colunas alteradas (valores não carregados aparecem como '?')."""
+    state = inspect(obj)
+    changes = []
+    for key in _audited_columns(obj):
+        history = state.attrs[key].history
+        if not history.added:
+            continue
+        new = history.added[0]
+        if history.deleted:
+            if history.deleted[0] == new:
+                continue
+            old = _format_value(history.deleted[0])
+        else:
+            # Atributo alterado sem ter sido carregado (objeto expirado por um commit anterior)
+            old = "?"
+        changes.append(f"{key}: {old} → {_format_value(new)}")
+    if len(changes) > AUDIT_MAX_CHANGES:
+        changes = changes[:AUDIT_MAX_CHANGES] + [f"+{len(changes) - AUDIT_MAX_CHANGES} campos"]
+    return changes
+
+
+def _label(obj):
+    state = inspect(obj)
+    for key in AUDIT_LABEL_COLUMNS:
+        if key in obj.__table__.columns:
+            value = state.dict.get(key)
+            if value:
+                return _format_value(value)
+    return None
+
+
+def _describe(action: str, obj):
+    menu, entidade = AUDITED_TABLES[obj.__table__.name]
+    state = inspect(obj)
+    # Sem getattr: objetos excluídos no flush não podem mais carregar atributos
+    obj_id = state.dict.get("id", state.identity[0] if state.identity else None)
+    info = f"{ACTION_LABELS[action]} {entidade}"
+    if obj_id is not None:
+        info += f" #{obj_id}"
+    label = _label(obj)
+    if label:
+        info += f" ({label})"
+    if action == "UPDATE":
+        changes = _diff_summary(obj)
+        if not changes:
+            return None
+        info += ": " + "; ".join(changes)
+    return menu, info
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_audit_entries(session, flush_context):
+    context = _audit_context.get()
+    if context is None:
+        return
+    entries = session.info.setdefault("auditoria", [])
+    now = datetime.now()
+    for action, objects in (("CREATE", session.new), ("UPDATE", session.dirty), ("DELETE", session.deleted)):
+        for obj in objects:
+            if getattr(obj, "__table__", None) is None or obj.__table__.name not in AUDITED_TABLES:
+                continue
+            described = _describe(action, obj)
+            if described is None:
+                continue
+            menu, info = described
+            entries.append({
+                "menu": menu,
+                "action": action,
+                "info": f"{info} [{context['rota']}]",
+                "date": now,
+                "context": context,
+            })
+
+
+def record_statement_audit(session, table: str, action: str, obj_id: int, label: str = None, detail: str = None):
+    """Entrada de auditoria para escritas por instrução (ex.: UPSERT), que não passam pelo flush."""
+    context = _audit_context.get()
+    if context is None or table not in AUDITED_TABLES:
+        return
+    menu, entidade = AUDITED_TABLES[table]
+    info = f"{ACTION_LABELS[action]} {entidade} #{obj_id}"
+    if label:
+        info += f" ({_format_value(label)})"
+    if detail:
+        info += f": {detail}"
+    session.info.setdefault("auditoria", []).append({
+        "menu": menu,
+        "action": action,
+        "info": f"{info} [{context['rota']}]",
+        "date": datetime.now(),
+        "context": context,
+    })
+
+
+@event.listens_for(Session, "after_commit")
+def _queue_committed_entries(session):
+    entries = session.info.pop("auditoria", None)
+    if not entries:
+        return
+    rows = []
+    for entry in entries:
+        # O principal é resolvido antes do handler; lido aqui para valer também em flushes anteriores
+        context = entry.pop("context")
+        entry["userName"] = context["userName"] or "Anônimo"
+        entry["userPerfil"] = context["userPerfil"] or "-"
+        rows.append(entry)
+    audit_writer.record_many(rows)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back_entries(session):
+    session.info.pop("auditoria", None)
+
+
+class AuditWriter:
+    """
+    Buffer limitado de entradas de log gravado em lote (INSERT com vários registros).
+    Grava ao juntar AUDIT_BATCH_SIZE entradas ou a cada AUDIT_FLUSH_SECONDS; close() grava o resto.
+    Com o buffer cheio (banco fora do ar), entradas novas são descartadas e contadas.
+    """
+
+    def __init__(self, batch_size: int, flush_seconds: float, buffer_size: int):
+        self.batch_size = max(1, batch_size)
+        self.flush_seconds = flush_seconds
+        self.buffer_size = buffer_size
+        self._buffer = deque()
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+        self.written = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.errors = 0
+
+    def record(self, menu: str, action: str, info: str, user_name: str, user_perfil: str):
+        self.record_many([{
+            "menu": menu, "action": action, "info": info, "date": datetime.now(),
+            "userName": user_name, "userPerfil": user_perfil,
+        }])
+
+    def record_many(self, rows: list):
+        with self._cond:
+            free = self.buffer_size - len(self._buffer)
+            if free < len(rows):
+                self.dropped += len(rows) - max(free, 0)
+                rows = rows[:max(free, 0)]
+            self._buffer.extend(rows)
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify()
+            self._ensure_thread()
+
+    def _ensure_thread(self):
+        if self._thread is None and not self._closed:
+            self._thread = threading.Thread(target=self._run, name="auditoria-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if len(self._buffer) < self.batch_size and not self._closed:
+                    self._cond.wait(self.flush_seconds)
+                if self._closed and not self._buffer:
+                    return
+            self.flush()
+
+    def flush(self):
+        with self._flush_lock:
+            while True:
+                with self._cond:
+                    batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+                if not batch:
+                    return
+                db = models.SessionLocal()
+                try:
+                    db.execute(insert(models.Log), batch)
+                    db.commit()
+                    self.written += len(batch)
+                    self.flushes += 1
+                except Exception as e:
+                    db.rollback()
+                    self.errors += 1
+                    print(f"Error writing audit log ({len(batch)} entradas): {e}")
+                    # Devolve ao buffer para a próxima tentativa (respeitando o limite)
+                    with self._cond:
+                        free = self.buffer_size - len(self._buffer)
+                        self.dropped += max(len(batch) - free, 0)
+                        self._buffer.extendleft(reversed(batch[:max(free, 0)]))
+                    return
+                finally:
+                    db.close()
+
+    def close(self):
+        """Encerramento da API: grava tudo o que está no buffer."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout=10)
+        self.flush()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "naFila": len(self._buffer),
+                "maxFila": self.buffer_size,
+                "gravadas": self.written,
+                "lotes": self.flushes,
+                "descartadas": self.dropped,
+                "erros": self.errors,
+            }
+
+
+audit_writer = AuditWriter(AUDIT_BATCH_SIZE, AUDIT_FLUSH_SECONDS, AUDIT_BUFFER_SIZE)
+
+
+def encode_log_cursor(date: datetime, log_id: int):
+    payload = {"date": date.isoformat() if date else None, "id": log_id}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode("utf-8")).decode("ascii")
+
+
+def decode_log_cursor(cursor: str):
+    """(date, id) do último log da página anterior; ValueError se o cursor for inválido."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        date = datetime.fromisoformat(payload["date"]) if payload["date"] else None
+        return date, int(payload["id"])
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Cursor de paginação inválido")
@@ -0,0 +1,364 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from itertools import chain
+from collections import OrderedDict
+from sqlalchemy import event, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+import models
+from services_cubo import CuboQueryError
+
+
+class TableVersions:
+    """
+    Contadores de versão por tabela, incrementados a cada commit que altera a tabela.
+    Caches usam as versões na chave: qualquer escrita invalida as entradas antigas.
+    Os contadores são do processo; cada worker do uvicorn mantém os seus.
+    """
+
+    def __init__(self):
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def bump(self, tables):
+        with self._lock:
+            for table in tables:
+                self._versions[table] = self._versions.get(table, 0) + 1
+
+    def get(self, tables):
+        with self._lock:
+            return tuple(self._versions.get(table, 0) for table in tables)
+
+
+table_versions = TableVersions()
+
+# Tabelas com versão também no banco (tabelaVersoes): caches compartilhados por processos diferentes
+# (API com vários workers, worker.py) usam estas. O contador em memória continua servindo os caches
+# de um só processo.
+PERSISTED_VERSION_TABLES = ("statusFuncionarios", "documentos", "contratos", "empresas")
+
+
+def _pending_tables(session):
+    return session.info.setdefault("tabelas_alteradas", set())
+
+
+def mark_tables_changed(session, tables):
+    """Para escritas em SQL puro (text()), que os hooks abaixo não enxergam."""
+    _pending_tables(session).update(tables)
+
+
+def read_table_versions(db: Session, tables):
+    """Versões persistidas das tabelas (0 se ainda não houve escrita registrada)."""
+    rows = dict(db.execute(
+        select(models.TabelaVersao.tabela, models.TabelaVersao.versao).where(models.TabelaVersao.tabela.in_(tables))
+    ).all())
+    return tuple(rows.get(table, 0) for table in tables)
+
+
+def _bump_persisted_versions(session, tables):
+    table = models.TabelaVersao.__table__
+    insert = postgresql.insert if session.get_bind().dialect.name == "postgresql" else sqlite.insert
+    stmt = insert(table).values([{"tabela": name, "versao": 1} for name in sorted(tables)])
+    stmt = stmt.on_conflict_do_update(index_elements=["tabela"], set_={"versao": table.c.versao + 1})
+    # Pela conexão (Core): não passa de novo pelos hooks do ORM
+    session.connection().execute(stmt)
+
+
+@event.listens_for(Session, "before_commit")
+def _persist_table_versions(session):
+    # Flush antecipado para saber todas as tabelas alteradas; o incremento entra no mesmo commit,
+    # e a linha de versão fica bloqueada só durante o commit
+    session.flush()
+    tables = _pending_tables(session) & set(PERSISTED_VERSION_TABLES)
+    if tables:
+        _bump_persisted_versions(session, tables)
+
+
+@event.listens_for(Session, "after_flush")
+def _track_flushed_tables(session, flush_context):
+    tables = _pending_tables(session)
+    for obj in chain(session.new, session.deleted):
+        if hasattr(obj, "__table__"):
+            tables.add(obj.__table__.name)
+    for obj in session.dirty:
+        if hasattr(obj, "__table__") and session.is_modified(obj, include_collections=False):
+            tables.add(obj.__table__.name)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_bulk_statements(orm_execute_state):
+    # query(...).delete() / .update() e INSERTs por instrução (upserts) não passam pelo flush
+    if (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete) and orm_execute_state.bind_mapper is not None:
+        _pending_tables(orm_execute_state.session).add(orm_execute_state.bind_mapper.local_table.name)
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_committed_tables(session):
+    tables = session.info.pop("tabelas_alteradas", None)
+    if tables:
+        table_versions.bump(tables)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back_tables(session):
+    session.info.pop("tabelas_alteradas", None)
+
+
+class LRUCache:
+    """Cache LRU em memória limitado por número de entradas, bytes e idade, com métricas."""
+
+    def __init__(self, name: str, max_entries: int, max_bytes: int, ttl_seconds: int, max_entry_bytes: int = None):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.max_entry_bytes = max_entry_bytes or max_bytes
+        self._entries = OrderedDict()  # key -> (value, size, created)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[2] > self.ttl_seconds:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, size: int = 1):
+        if size > self.max_entry_bytes:
+            return False
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, time.monotonic())
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "nome": self.name,
+                "entradas": len(self._entries),
+                "bytes": self._bytes,
+                "maxEntradas": self.max_entries,
+                "maxBytes": self.max_bytes,
+                "ttlSegundos": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hitRate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+class DiskLRUCache:
+    """
+    Cache LRU em disco (um arquivo por chave), limitado por número de entradas e bytes.
+    Pode ser compartilhado entre processos: a gravação é atômica (temporário + rename)
+    e o mtime do arquivo marca o último acesso usado na remoção dos menos usados.
+    """
+
+    def __init__(self, name: str, directory: str, max_entries: int, max_bytes: int, max_entry_bytes: int = None, suffix: str = ".bin"):
+        self.name = name
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes or max_bytes
+        self.suffix = suffix
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _path(self, key: str):
+        return os.path.join(self.directory, key + self.suffix)
+
+    def get(self, key: str):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                content = f.read()
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return content
+
+    def set(self, key: str, content: bytes):
+        if len(content) > self.max_entry_bytes:
+            return False
+        tmp_path = None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            print(f"Erro ao gravar no cache {self.name}: {e}")
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return False
+        self._evict()
+        return True
+
+    def _scan(self):
+        entries = []
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if not entry.name.endswith(self.suffix):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def _evict(self):
+        with self._lock:
+            entries = sorted(self._scan())
+            total = sum(size for _, size, _ in entries)
+            while entries and (len(entries) > self.max_entries or total > self.max_bytes):
+                _, size, path = entries.pop(0)
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            for _, _, path in self._scan():
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def stats(self):
+        entries = self._scan()
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "nome": self.name,
+                "diretorio": self.directory,
+                "entradas": len(entries),
+                "bytes": sum(size for _, size, _ in entries),
+                "maxEntradas": self.max_entries,
+                "maxBytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hitRate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+# --- Cache de PDFs renderizados (histórico do funcionário, ficha de presença) ---
+
+report_cache = DiskLRUCache(
+    "relatorios-pdf",
+    directory=os.getenv("REPORT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "gestao-contratos-relatorios")),
+    max_entries=int(os.getenv("REPORT_CACHE_MAX_ENTRIES", "5000")),
+    max_bytes=int(os.getenv("REPORT_CACHE_MAX_BYTES", str(512 * 1024 * 1024))),
+    max_entry_bytes=int(os.getenv("REPORT_CACHE_MAX_ENTRY_BYTES", str(32 * 1024 * 1024))),
+    suffix=".pdf",
+)
+
+
+def report_cache_key(tipo: str, params: dict, fingerprint):
+    """Chave do PDF: tipo, parâmetros e a impressão digital dos dados de origem."""
+    payload = {"tipo": tipo, "params": params, "fingerprint": fingerprint}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def cached_report(key: str, render):
+    """Conteúdo do cache em disco ou gerado por `render()` e guardado; None se não houver conteúdo."""
+    content = report_cache.get(key)
+    if content is None:
+        content = render()
+        if content:
+            report_cache.set(key, content)
+    return content
+
+
+# --- Cache de resultados do Cubo ---
+
+CUBO_SOURCE_TABLES = PERSISTED_VERSION_TABLES
+
+cubo_cache = LRUCache(
+    "cubo",
+    max_entries=int(os.getenv("CUBO_CACHE_MAX_ENTRIES", "64")),
+    max_bytes=int(os.getenv("CUBO_CACHE_MAX_BYTES", str(256 * 1024 * 1024))),
+    ttl_seconds=int(os.getenv("CUBO_CACHE_TTL_SECONDS", "3600")),
+    max_entry_bytes=int(os.getenv("CUBO_CACHE_MAX_ENTRY_BYTES", str(32 * 1024 * 1024))),
+)
+
+
+def normalize_cubo_query(columns: list, date_filter: dict = None, column_filters: dict = None, **options):
+    """Forma canônica da consulta do cubo: filtros vazios e a ordem dos filtros não alteram a chave."""
+    normalized_date = None
+    if date_filter and date_filter.get("field") and (date_filter.get("start") or date_filter.get("end")):
+        normalized_date = [date_filter["field"], date_filter.get("start") or None, date_filter.get("end") or None]
+    as_of = (date_filter or {}).get("as_of") or None
+
+    normalized_filters = []
+    for col_name, info in sorted((column_filters or {}).items()):
+        if info is not None and not isinstance(info, dict):
+            raise CuboQueryError(f"Filtro inválido para {col_name}")
+        value = (info or {}).get("value")
+        if value is None or value == "":
+            continue
+        operator = info.get("operator", "igual")
+        if operator == "in":
+            value = sorted(v.strip() for v in str(value).split(","))
+        normalized_filters.append([col_name, operator, value])
+
+    return {
+        "columns": list(columns),
+        "date": normalized_date,
+        "asOf": as_of,
+        "filters": normalized_filters,
+        "options": {k: v for k, v in sorted(options.items()) if v},
+    }
+
+
+def cubo_cache_key(db: Session, kind: str, columns: list, date_filter: dict = None, column_filters: dict = None, **options):
+    """Chave do resultado; as versões vêm do banco para enxergar escritas de outros processos."""
+    payload = {
+        "kind": kind,
+        "query": normalize_cubo_query(columns, date_filter, column_filters, **options),
+        "versions": read_table_versions(db, CUBO_SOURCE_TABLES),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
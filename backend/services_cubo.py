@@ -0,0 +1,547 @@
+import os
+import json
+import time
+import base64
+import uuid
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+CUBO_PREVIEW_TIMEOUT_MS = int(os.getenv("CUBO_PREVIEW_TIMEOUT_MS", "5000"))
+CUBO_PREVIEW_MAX_LIMIT = 500
+CUBO_COUNT_ESTIMATE_CAP = int(os.getenv("CUBO_COUNT_ESTIMATE_CAP", "10000"))
+
+# Limites das consultas ad-hoc do cubo (exportação completa e agregação)
+CUBO_QUERY_TIMEOUT_MS = int(os.getenv("CUBO_QUERY_TIMEOUT_MS", "300000"))
+CUBO_MAX_COST = float(os.getenv("CUBO_MAX_COST", "5000000"))  # custo total do EXPLAIN (Postgres)
+CUBO_MAX_ESTIMATED_ROWS = int(os.getenv("CUBO_MAX_ESTIMATED_ROWS", "2000000"))  # linhas previstas pelo EXPLAIN
+CUBO_MAX_ROWS = int(os.getenv("CUBO_MAX_ROWS", "1000000"))  # limite rígido de linhas exportadas
+CUBO_MAX_CONCURRENT_PER_USER = int(os.getenv("CUBO_MAX_CONCURRENT_PER_USER", "2"))
+
+# Mapeamento dos campos do cubo: Nome legível -> (expressão SQL, tabela de origem)
+# Tabelas: sf (statusFuncionarios), e (empresas), c (contratos), d (documentos)
+# Os identificadores camelCase vão entre aspas para funcionar também no Postgres.
+CUBO_FIELDS = {
+    # --- Funcionário / Integração ---
+    "Funcionário": ('sf."funcionarioNome"', "sf"),
+    "Status Integração": ('sf."statusIntegracao"', "sf"),
+    "Data Integração": ('sf."dataIntegracao"', "sf"),
+    "Unidade Integração": ('sf."unidadeIntegracao"', "sf"),
+    "Unidade Atividade": ('sf."unidadeAtividade"', "sf"),
+    "Função": ('sf.funcao', "sf"),
+    "Cargo": ('sf.cargo', "sf"),
+    "Setor": ('sf.setor', "sf"),
+    "Status Contratual": ('sf."statusContratual"', "sf"),
+    "Data ASO": ('sf."dataAso"', "sf"),
+    "Validade ASO": ('sf."dataValidadeAso"', "sf"),
+    "Validade Integração": ('sf."dataValidadeIntegracao"', "sf"),
+    "Dias Restantes ASO": ('sf."prazoAsoDias"', "sf"),
+    "Dias Restantes Integração": ('sf."prazoIntegracaoDias"', "sf"),
+
+    # --- Empresa ---
+    "Empresa": ('COALESCE(sf."empresaNome", e.nome)', "e"),
+    "CNPJ Empresa": ('e.cnpj', "e"),
+    "Departamento": ('e.departamento', "e"),
+    "Status Empresa": ('e.status', "e"),
+
+    # --- Contrato ---
+    "Contrato": ('COALESCE(sf."contratoNome", c.nome)', "c"),
+    "Início Contrato": ('c."dtInicio"', "c"),
+    "Fim Contrato": ('c."dtFim"', "c"),
+    "Status Contrato": ('c.status', "c"),
+    "Categoria Contrato": ('c."categoriaNome"', "c"),
+
+    # --- Documentação ---
+    "Título do Documento": ('d.titulo', "d"),
+    "Categoria do Documento": ('d."categoriaNome"', "d"),
+    "Competência": ('d.competencia', "d"),
+    "Status do Documento": ('d.status', "d"),
+    "Email Responsável": ('d.email', "d"),
+    "Data Documento": ('d.data', "d"),
+    "Data Criação Doc": ('d."createdAt"', "d"),
+}
+
+CUBO_DEFAULT_COLUMNS = ["Funcionário", "Empresa"]
+CUBO_DATE_KEYWORDS = ["Data", "Validade", "Início", "Fim", "Criação"]
+
+# Último status de cada funcionário (usa o índice statusFuncionarios(funcionarioId, id))
+LATEST_STATUS_FROM = """"statusFuncionarios" sf
+            JOIN (
+                SELECT "funcionarioId", MAX(id) AS max_id
+                FROM "statusFuncionarios"
+                GROUP BY "funcionarioId"
+            ) ls ON ls.max_id = sf.id"""
+
+HISTORY_STATUS_FROM = '"statusFuncionarios" sf'
+
+# Status vigente de cada funcionário em :as_of (último registro com data <= as_of);
+# usa o índice statusFuncionarios(funcionarioId, data, id)
+AS_OF_STATUS_FROM = """"statusFuncionarios" sf
+            JOIN (
+                SELECT "funcionarioId", MAX(id) AS max_id
+                FROM "statusFuncionarios"
+                WHERE data <= :as_of
+                GROUP BY "funcionarioId"
+            ) ls ON ls.max_id = sf.id"""
+
+TABLE_JOINS = {
+    "e": 'LEFT JOIN empresas e ON e.id = sf."empresaId"',
+    "c": 'LEFT JOIN contratos c ON c.id = sf."contratoId"',
+}
+
+# O antigo "LEFT JOIN documentos d ON (sf.funcionarioId = d.funcionarioId OR
+# (d.funcionarioId IS NULL AND sf.contratoId = d.contratoId))" vira três ramos
+# disjuntos, cada um resolvível por índice:
+#   1. documentos do próprio funcionário
+#   2. documentos do contrato (sem funcionário vinculado)
+#   3. status sem nenhum documento (colunas de documento nulas)
+DOC_JOIN_FUNCIONARIO = 'JOIN documentos d ON d."funcionarioId" = sf."funcionarioId"'
+DOC_JOIN_CONTRATO = 'JOIN documentos d ON d."funcionarioId" IS NULL AND d."contratoId" = sf."contratoId"'
+DOC_NOT_EXISTS = """NOT EXISTS (SELECT 1 FROM documentos d WHERE d."funcionarioId" = sf."funcionarioId")
+              AND NOT EXISTS (SELECT 1 FROM documentos d WHERE d."funcionarioId" IS NULL AND d."contratoId" = sf."contratoId")"""
+
+
+# Colunas auxiliares incluídas nas linhas do cubo (ordenação e medidas por funcionário)
+HIDDEN_COLUMNS = {
+    "_sf_id": "sf.id",
+    "_funcionario_id": 'sf."funcionarioId"',
+}
+
+# Medidas do modo agregado: op -> expressão SQL sobre a coluna de origem
+MEASURE_SQL = {
+    "count": lambda col: "COUNT(*)",
+    "count_distinct_funcionario": lambda col: 'COUNT(DISTINCT cubo."_funcionario_id")',
+    "min": lambda col: f"MIN({col})",
+    "max": lambda col: f"MAX({col})",
+    # Calculado em Python a partir da menor data (independe do dialeto SQL)
+    "dias_ate_vencimento": lambda col: f"MIN({col})",
+}
+
+MEASURE_LABELS = {
+    "count": "Quantidade",
+    "count_distinct_funcionario": "Funcionários Distintos",
+    "min": "Mínimo de {field}",
+    "max": "Máximo de {field}",
+    "dias_ate_vencimento": "Dias até Vencimento ({field})",
+}
+
+MEASURES_WITH_FIELD = {"min", "max", "dias_ate_vencimento"}
+
+
+def parse_as_of(value: str):
+    """Data (AAAA-MM-DD, vale o fim do dia) ou data e hora ISO; ValueError se inválida."""
+    value = str(value).strip()
+    try:
+        if len(value) == 10:
+            return datetime.strptime(value, "%Y-%m-%d").replace(hour=23, minute=59, second=59)
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"Data de referência inválida: {value}")
+
+
+def is_date_field(col_name: str):
+    return any(key in col_name for key in CUBO_DATE_KEYWORDS)
+
+
+def compile_measures(measures: list):
+    """Valida as medidas pedidas ({"op", "field", "label"}) e devolve a forma normalizada."""
+    compiled = []
+    for measure in measures or [{"op": "count"}]:
+        if not isinstance(measure, dict):
+            raise ValueError(f"Medida inválida: {measure!r}")
+        op = measure.get("op")
+        field = measure.get("field")
+        if op not in MEASURE_SQL:
+            raise ValueError(f"Medida inválida: {op}")
+        if op in MEASURES_WITH_FIELD:
+            if not isinstance(field, str) or field not in CUBO_FIELDS:
+                raise ValueError(f"A medida {op} exige um campo válido do cubo")
+            if not is_date_field(field):
+                raise ValueError(f"A medida {op} só se aplica a campos de data")
+        else:
+            field = None
+        # O rótulo é só cabeçalho: no SQL a medida usa um alias gerado (m0, m1, ...)
+        label = str(measure.get("label") or MEASURE_LABELS[op].format(field=field))
+        compiled.append({"op": op, "field": field, "label": label})
+    return compiled
+
+
+class CuboQueryPlanner:
+    """
+    Monta a consulta do cubo customizado fazendo apenas os joins exigidos pelas
+    colunas e filtros selecionados. Por padrão considera somente o status mais
+    recente de cada funcionário; include_history=True usa o histórico completo.
+    date_filter["as_of"] fixa a data de referência: o status vigente naquele momento
+    (ou, com include_history, o histórico registrado até ele).
+    """
+
+    def __init__(self, columns: list, date_filter: dict = None, column_filters: dict = None, include_history: bool = False):
+        self.include_history = include_history
+        self.as_of = None
+        self.headers = [c for c in columns if c in CUBO_FIELDS] or list(CUBO_DEFAULT_COLUMNS)
+        self.params = {}
+        # Cada cláusula guarda a tabela de origem para sabermos o que precisa de join
+        self.where = []
+        self._build_filters(date_filter, column_filters)
+
+        self.tables = {CUBO_FIELDS[c][1] for c in self.headers}
+        self.tables.update(table for _, table in self.where)
+
+    def _build_filters(self, date_filter: dict, column_filters: dict):
+        if date_filter and date_filter.get("as_of"):
+            try:
+                self.as_of = parse_as_of(date_filter["as_of"])
+            except ValueError as e:
+                raise CuboQueryError(str(e))
+            self.params["as_of"] = self.as_of.strftime("%Y-%m-%d %H:%M:%S")
+            if self.include_history:
+                self.where.append(("sf.data <= :as_of", "sf"))
+
+        if date_filter and "field" in date_filter and date_filter["field"] in CUBO_FIELDS:
+            filter_col, table = CUBO_FIELDS[date_filter["field"]]
+            if date_filter.get("start") and date_filter.get("end"):
+                self.where.append((f"{filter_col} BETWEEN :start AND :end", table))
+                self.params["start"] = date_filter["start"]
+                self.params["end"] = date_filter["end"] + " 23:59:59"
+            elif date_filter.get("start"):
+                self.where.append((f"{filter_col} >= :start", table))
+                self.params["start"] = date_filter["start"]
+            elif date_filter.get("end"):
+                self.where.append((f"{filter_col} <= :end", table))
+                self.params["end"] = date_filter["end"] + " 23:59:59"
+
+        # Per-Column Filters
+        if column_filters:
+            for i, (col_name, filter_info) in enumerate(column_filters.items()):
+                if col_name not in CUBO_FIELDS:
+                    continue
+                if not isinstance(filter_info, dict):
+                    raise CuboQueryError(f"Filtro inválido para {col_name}")
+                sql_col, table = CUBO_FIELDS[col_name]
+                operator = filter_info.get("operator", "igual")
+                value = filter_info.get("value")
+
+                if value is None or value == "":
+                    continue
+
+                param_name = f"col_filter_{i}"
+                if operator == "igual":
+                    self.where.append((f"{sql_col} = :{param_name}", table))
+                    self.params[param_name] = value
+                elif operator == "contem":
+                    self.where.append((f"{sql_col} LIKE :{param_name}", table))
+                    self.params[param_name] = f"%{value}%"
+                elif operator == "in":
+                    # Process comma-separated values
+                    val_list = [v.strip() for v in str(value).split(",")]
+                    in_params = []
+                    for j, val in enumerate(val_list):
+                        p_name = f"{param_name}_{j}"
+                        in_params.append(f":{p_name}")
+                        self.params[p_name] = val
+                    self.where.append((f"{sql_col} IN ({', '.join(in_params)})", table))
+
+    def _from_clause(self, doc_join: str = None):
+        if self.include_history:
+            parts = [HISTORY_STATUS_FROM]
+        else:
+            parts = [AS_OF_STATUS_FROM if self.as_of else LATEST_STATUS_FROM]
+        for alias in ("e", "c"):
+            if alias in self.tables:
+                parts.append(TABLE_JOINS[alias])
+        if doc_join:
+            parts.append(doc_join)
+        return "\n            ".join(parts)
+
+    def _branch(self, doc_join: str = None, extra_where: str = None, null_documents: bool = False, hidden: tuple = ("_sf_id",)):
+        select_parts = [f'{HIDDEN_COLUMNS[name]} AS "{name}"' for name in hidden]
+        for col in self.headers:
+            expr, table = CUBO_FIELDS[col]
+            if null_documents and table == "d":
+                expr = "NULL"
+            select_parts.append(f'{expr} AS "{col}"')
+
+        clauses = [clause for clause, _ in self.where]
+        if extra_where:
+            clauses.append(extra_where)
+
+        sql = f"""
+            SELECT {", ".join(select_parts)}
+            FROM {self._from_clause(doc_join)}"""
+        if clauses:
+            sql += "\n            WHERE " + " AND ".join(clauses)
+        return sql
+
+    def _rows_source(self, hidden: tuple):
+        """Subconsulta com as linhas do cubo (sem ordenação), já com a reescrita do join de documentos."""
+        if "d" not in self.tables:
+            return self._branch(hidden=hidden)
+
+        branches = [
+            self._branch(DOC_JOIN_FUNCIONARIO, hidden=hidden),
+            self._branch(DOC_JOIN_CONTRATO, hidden=hidden),
+        ]
+        # Um filtro em coluna de documento descarta as linhas sem documento,
+        # então o ramo "sem documentos" só é necessário sem esses filtros.
+        if not any(table == "d" for _, table in self.where):
+            branches.append(self._branch(extra_where=DOC_NOT_EXISTS, null_documents=True, hidden=hidden))
+        return " UNION ALL ".join(branches)
+
+    def build_sql(self):
+        """Retorna o SQL (string) e os parâmetros da consulta planejada."""
+        if "d" not in self.tables:
+            sql = self._branch(hidden=()) + "\n            ORDER BY sf.id DESC"
+            return sql, dict(self.params)
+
+        outer_columns = ", ".join(f'cubo."{col}"' for col in self.headers)
+        sql = f"""
+            SELECT {outer_columns}
+            FROM ({self._rows_source(("_sf_id",))}
+            ) cubo
+            ORDER BY cubo."_sf_id" DESC"""
+        return sql, dict(self.params)
+
+    def build(self):
+        """Retorna (consulta text(), parâmetros, cabeçalhos) prontos para execução."""
+        sql, params = self.build_sql()
+        return text(sql), params, list(self.headers)
+
+    # --- Agregação / pivot ---
+
+    @classmethod
+    def for_aggregate(cls, group_by: list, measures: list, date_filter: dict = None, column_filters: dict = None, include_history: bool = False):
+        """Planner cujas colunas são as dimensões mais os campos usados pelas medidas."""
+        dimensions = [c for c in (group_by or []) if c in CUBO_FIELDS]
+        compiled = compile_measures(measures)
+        columns = list(dimensions)
+        for measure in compiled:
+            if measure["field"] and measure["field"] not in columns:
+                columns.append(measure["field"])
+        # Sem dimensões nem campos, mantém uma coluna barata para o planner não cair no padrão
+        planner = cls(columns or ["Funcionário"], date_filter, column_filters, include_history=include_history)
+        planner.dimensions = dimensions
+        planner.measures = compiled
+        return planner
+
+    def build_aggregate_sql(self):
+        dims = [f'cubo."{col}"' for col in self.dimensions]
+        select_parts = [f'{dim} AS "{col}"' for dim, col in zip(dims, self.dimensions)]
+        for i, measure in enumerate(self.measures):
+            source = f'cubo."{measure["field"]}"' if measure["field"] else None
+            select_parts.append(f'{MEASURE_SQL[measure["op"]](source)} AS m{i}')
+
+        sql = f"""
+            SELECT {", ".join(select_parts)}
+            FROM ({self._rows_source(("_funcionario_id",))}
+            ) cubo"""
+        if dims:
+            sql += f"\n            GROUP BY {', '.join(dims)}\n            ORDER BY {', '.join(dims)}"
+        return sql, dict(self.params)
+
+    def build_aggregate(self):
+        """Retorna (consulta text(), parâmetros, cabeçalhos) da consulta agregada."""
+        sql, params = self.build_aggregate_sql()
+        headers = list(self.dimensions) + [m["label"] for m in self.measures]
+        return text(sql), params, headers
+
+
+class CuboQueryError(Exception):
+    """Erro de uso do cubo; a mensagem é exibida ao usuário."""
+    status_code = 400
+
+
+class CuboQueryTimeout(CuboQueryError):
+    status_code = 408
+
+
+class CuboQueryTooLarge(CuboQueryError):
+    status_code = 422
+
+
+class CuboConcurrencyLimit(CuboQueryError):
+    status_code = 429
+
+
+NARROW_FILTERS_HINT = "Refine os filtros (período, empresa, contrato ou status) e tente novamente."
+
+
+def _is_timeout_error(error: OperationalError):
+    message = str(error.orig).lower()
+    return "statement timeout" in message or "canceling statement" in message or "interrupted" in message
+
+
+@contextmanager
+def statement_timeout(db, timeout_ms: int):
+    """
+    Limita o tempo das consultas executadas dentro do bloco.
+    Postgres: SET LOCAL statement_timeout. SQLite: progress handler que interrompe a consulta.
+    Estouro do limite vira CuboQueryTimeout.
+    """
+    if not timeout_ms:
+        yield
+        return
+
+    dialect = db.bind.dialect.name
+    raw = None
+    if dialect == "postgresql":
+        db.execute(text(f"SET LOCAL statement_timeout = {int(timeout_ms)}"))
+    elif dialect == "sqlite":
+        raw = db.connection().connection.driver_connection
+        deadline = time.monotonic() + timeout_ms / 1000
+        raw.set_progress_handler(lambda: 1 if time.monotonic() > deadline else 0, 10000)
+
+    try:
+        yield
+    except OperationalError as e:
+        if not _is_timeout_error(e):
+            raise
+        db.rollback()
+        raise CuboQueryTimeout("A consulta excedeu o tempo limite. Refine os filtros e tente novamente.") from e
+    else:
+        if dialect == "postgresql":
+            db.execute(text("SET LOCAL statement_timeout TO DEFAULT"))
+    finally:
+        if raw is not None:
+            raw.set_progress_handler(None, 0)
+
+
+def estimate_row_count(db, sql: str, params: dict):
+    """
+    Estimativa barata do número de linhas.
+    Postgres: linhas previstas pelo EXPLAIN. Outros bancos: COUNT limitado a CUBO_COUNT_ESTIMATE_CAP.
+    Retorna (quantidade, exata).
+    """
+    if db.bind.dialect.name == "postgresql":
+        plan = db.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"), params).scalar()
+        return int(plan[0]["Plan"]["Plan Rows"]), False
+
+    capped = db.execute(
+        text(f"SELECT COUNT(*) FROM ({sql} LIMIT {CUBO_COUNT_ESTIMATE_CAP + 1}) estimativa"), params
+    ).scalar()
+    if capped > CUBO_COUNT_ESTIMATE_CAP:
+        return CUBO_COUNT_ESTIMATE_CAP, False
+    return capped, True
+
+
+def encode_cursor(offset: int):
+    return base64.urlsafe_b64encode(json.dumps({"offset": offset}).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str):
+    if not cursor:
+        return 0
+    try:
+        offset = int(json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))["offset"])
+    except (ValueError, KeyError, TypeError):
+        raise CuboQueryError("Cursor de paginação inválido")
+    if offset < 0:
+        raise CuboQueryError("Cursor de paginação inválido")
+    return offset
+
+
+def check_query_cost(db, sql: str, params: dict):
+    """
+    Recusa consultas pesadas antes de executá-las, pelo plano do Postgres
+    (EXPLAIN sem ANALYZE, não executa a consulta). Em outros bancos não faz nada;
+    o limite de linhas e o timeout continuam valendo durante a execução.
+    Retorna {"custo", "linhas"} estimados ou None.
+    """
+    if db.bind.dialect.name != "postgresql":
+        return None
+
+    plan = db.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"), params).scalar()[0]["Plan"]
+    cost, rows = float(plan["Total Cost"]), int(plan["Plan Rows"])
+    if CUBO_MAX_COST and cost > CUBO_MAX_COST:
+        raise CuboQueryTooLarge(f"A consulta é pesada demais (custo estimado {cost:.0f}, limite {CUBO_MAX_COST:.0f}). {NARROW_FILTERS_HINT}")
+    if CUBO_MAX_ESTIMATED_ROWS and rows > CUBO_MAX_ESTIMATED_ROWS:
+        raise CuboQueryTooLarge(f"A consulta retornaria cerca de {rows} linhas (limite {CUBO_MAX_ESTIMATED_ROWS}). {NARROW_FILTERS_HINT}")
+    return {"custo": cost, "linhas": rows}
+
+
+def limit_rows(sql: str):
+    """Acrescenta LIMIT CUBO_MAX_ROWS + 1: a linha extra indica que o limite foi ultrapassado."""
+    if not CUBO_MAX_ROWS:
+        return sql
+    return f"{sql}\n            LIMIT {CUBO_MAX_ROWS + 1}"
+
+
+def cap_batches(batches):
+    """
+    Repassa os lotes até CUBO_MAX_ROWS linhas (o último é cortado no limite) e então
+    interrompe com CuboQueryTooLarge. Nas exportações em stream o erro vira a marca de
+    exportação incompleta no fim do arquivo (services_export.iter_export).
+    """
+    count = 0
+    for batch in batches:
+        if CUBO_MAX_ROWS and count + len(batch) > CUBO_MAX_ROWS:
+            if count < CUBO_MAX_ROWS:
+                yield batch[:CUBO_MAX_ROWS - count]
+            raise CuboQueryTooLarge(f"O resultado passa de {CUBO_MAX_ROWS} linhas. {NARROW_FILTERS_HINT}")
+        count += len(batch)
+        yield batch
+
+
+class CuboExecutionLimiter:
+    """
+    Limita as execuções simultâneas do cubo por usuário (dentro do processo).
+    Cada execução recebe um token; tokens mais antigos que max_age_seconds são
+    descartados, para que um stream abandonado não bloqueie o usuário para sempre.
+    """
+
+    def __init__(self, max_per_user: int, max_age_seconds: float):
+        self.max_per_user = max_per_user
+        self.max_age_seconds = max_age_seconds
+        self._running = {}  # user_key -> {token: início}
+        self._lock = threading.Lock()
+
+    def acquire(self, user_key: str):
+        now = time.monotonic()
+        with self._lock:
+            running = self._running.setdefault(user_key, {})
+            for token, started in list(running.items()):
+                if now - started > self.max_age_seconds:
+                    del running[token]
+            if self.max_per_user and len(running) >= self.max_per_user:
+                raise CuboConcurrencyLimit(
+                    f"Você já tem {len(running)} consultas do cubo em execução. Aguarde a conclusão para iniciar outra."
+                )
+            token = uuid.uuid4().hex
+            running[token] = now
+            return token
+
+    def release(self, user_key: str, token: str):
+        with self._lock:
+            running = self._running.get(user_key)
+            if running is not None:
+                running.pop(token, None)
+                if not running:
+                    del self._running[user_key]
+
+    @contextmanager
+    def slot(self, user_key: str):
+        token = self.acquire(user_key)
+        try:
+            yield
+        finally:
+            self.release(user_key, token)
+
+    def iter_with_slot(self, user_key: str, iterator):
+        """Reserva a vaga agora (erro antes da resposta) e a libera quando o iterador terminar."""
+        token = self.acquire(user_key)
+
+        def guarded():
+            try:
+                yield from iterator
+            finally:
+                self.release(user_key, token)
+
+        return guarded()
+
+
+cubo_limiter = CuboExecutionLimiter(CUBO_MAX_CONCURRENT_PER_USER, max_age_seconds=CUBO_QUERY_TIMEOUT_MS / 1000 * 2)
+
+
+def cubo_user_key(current_user: dict):
+    return f"{current_user['type']}:{current_user['data'].id}"
@@ -0,0 +1,370 @@
+import os
+import time
+import threading
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import event, select, update, delete, func, inspect, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+import models
+from services_cache import table_versions
+
+# Estatísticas do dashboard mantidas como contadores na tabela dashboardContadores.
+# Cada flush que altera empresas, funcionários, documentos, anexos ou status aplica o delta
+# na mesma transação; a leitura do dashboard é uma consulta de poucas linhas.
+# Os upserts de envio (services_uploads) informam o delta com record_upsert_deltas. Outras escritas
+# que não passam pelo flush (UPDATE/DELETE/INSERT em massa) apagam os contadores afetados,
+# que são recalculados em uma única consulta na próxima leitura e reconciliados periodicamente.
+DASHBOARD_CACHE_SECONDS = float(os.getenv("DASHBOARD_CACHE_SECONDS", "10"))
+DASHBOARD_RECONCILE_SECONDS = float(os.getenv("DASHBOARD_RECONCILE_SECONDS", "300"))
+
+EMPRESAS_ATIVAS = "empresasAtivas"
+TOTAL_FUNCIONARIOS = "totalFuncionarios"
+DOCS_PENDENTES = "docsPendentes"
+VENCIDOS = "vencidos"
+APROVADOS_MES = "aprovadosMes"
+
+# Opção de execução das instruções que já informam o próprio delta (não invalidam os contadores)
+UPSERT_COUNTED = "dashboard_contabilizado"
+
+DASHBOARD_SOURCE_TABLES = ("empresas", "funcionarios", "documentos", "anexosFuncionarios", "statusFuncionarios")
+
+# Contadores afetados por tabela (para invalidar em escritas em massa)
+_TABLE_COUNTERS = {
+    "empresas": (EMPRESAS_ATIVAS,),
+    "funcionarios": (TOTAL_FUNCIONARIOS,),
+    "documentos": (DOCS_PENDENTES, APROVADOS_MES),
+    "anexosFuncionarios": (DOCS_PENDENTES,),
+    "statusFuncionarios": (VENCIDOS,),
+}
+
+
+def month_start(now: datetime = None):
+    return (now or datetime.now()).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def month_key(now: datetime = None):
+    return f"{APROVADOS_MES}:{(now or datetime.now()).strftime('%Y-%m')}"
+
+
+def compute_dashboard_counts(db: Session, now: datetime = None):
+    """Calcula todos os contadores em uma única consulta (subconsultas escalares)."""
+    latest_status_ids = select(
+        models.StatusFuncionario.funcionarioId,
+        func.max(models.StatusFuncionario.id).label("latest_id")
+    ).group_by(models.StatusFuncionario.funcionarioId).subquery()
+
+    def count(entity, *where):
+        return select(func.count()).select_from(entity).where(*where).scalar_subquery()
+
+    latest_status = models.StatusFuncionario.__table__.join(
+        latest_status_ids, models.StatusFuncionario.id == latest_status_ids.c.latest_id
+    )
+    row = db.execute(select(
+        count(models.Empresa, models.Empresa.status == "ATIVA").label(EMPRESAS_ATIVAS),
+        count(models.Funcionario).label(TOTAL_FUNCIONARIOS),
+        count(models.Documento, models.Documento.status == "AGUARDANDO").label("documentosPendentes"),
+        count(models.AnexoFuncionario, models.AnexoFuncionario.status == "AGUARDANDO").label("anexosPendentes"),
+        count(latest_status, models.StatusFuncionario.statusIntegracao == "VENCIDO").label(VENCIDOS),
+        count(models.Documento, models.Documento.status == "APROVADO", models.Documento.updatedAt >= month_start(now)).label(APROVADOS_MES),
+    )).one()
+
+    return {
+        EMPRESAS_ATIVAS: row.empresasAtivas,
+        TOTAL_FUNCIONARIOS: row.totalFuncionarios,
+        DOCS_PENDENTES: row.documentosPendentes + row.anexosPendentes,
+        VENCIDOS: row.vencidos,
+        month_key(now): row.aprovadosMes,
+    }
+
+
+def approvals_per_day(db: Session, inicio: datetime, fim: datetime, status: str = "APROVADO"):
+    """
+    Aprovações por dia e perfil em [inicio, fim): faixa no índice aprovacoes(status, data).
+    documentos/documentosFuncionario separam a origem (documento do contrato ou do funcionário).
+    """
+    dia = func.date(models.Aprovacao.data).label("dia")
+    statement = select(
+        dia,
+        models.Aprovacao.perfilId,
+        models.Aprovacao.perfilNome,
+        func.count().label("total"),
+        func.count(models.Aprovacao.documentoId).label("documentos"),
+        func.count(models.Aprovacao.anexoFuncionarioId).label("documentosFuncionario"),
+    ).where(
+        models.Aprovacao.status == status,
+        models.Aprovacao.data >= inicio,
+        models.Aprovacao.data < fim,
+    ).group_by(dia, models.Aprovacao.perfilId, models.Aprovacao.perfilNome).order_by(dia, models.Aprovacao.perfilNome)
+    return [
+        {**row._asdict(), "dia": str(row.dia)}
+        for row in db.execute(statement)
+    ]
+
+
+class DashboardStats:
+    """
+    Leitura das estatísticas: cache curto em memória (invalidado por escritas deste processo),
+    depois os contadores mantidos e, se algum estiver ausente, o cálculo completo em uma consulta.
+    """
+
+    def __init__(self):
+        self._cached = None
+        self._lock = threading.Lock()
+        self._last_reconcile = 0.0
+
+    def get(self, db: Session):
+        now = datetime.now()
+        cache_key = (table_versions.get(DASHBOARD_SOURCE_TABLES), month_key(now))
+        with self._lock:
+            cached = self._cached
+        if cached and cached[0] == cache_key and time.monotonic() - cached[1] < DASHBOARD_CACHE_SECONDS:
+            return dict(cached[2])
+
+        keys = (EMPRESAS_ATIVAS, TOTAL_FUNCIONARIOS, DOCS_PENDENTES, VENCIDOS, month_key(now))
+        counters = dict(db.query(models.DashboardContador.chave, models.DashboardContador.valor).filter(
+            models.DashboardContador.chave.in_(keys)
+        ).all())
+        if len(counters) < len(keys):
+            counters = self.reconcile(db, now)
+
+        stats = {
+            "empresasAtivas": counters[EMPRESAS_ATIVAS],
+            "docsPendentes": counters[DOCS_PENDENTES],
+            "totalFuncionarios": counters[TOTAL_FUNCIONARIOS],
+            "aprovadosMes": counters[month_key(now)],
+            "vencidos": counters[VENCIDOS],
+        }
+        with self._lock:
+            self._cached = (cache_key, time.monotonic(), stats)
+        return dict(stats)
+
+    def reconcile(self, db: Session, now: datetime = None):
+        """
+        Recalcula e grava todos os contadores (corrige desvios de escritas fora do ORM).
+        No Postgres a contagem só começa com a tabela de contadores bloqueada para escrita:
+        transações que já aplicaram deltas terminam antes (a contagem as inclui) e as seguintes
+        esperam o commit para aplicar os seus sobre o valor novo, então nenhum delta se perde.
+        """
+        if db.get_bind().dialect.name == "postgresql":
+            # SHARE ROW EXCLUSIVE conflita com o UPDATE/DELETE dos deltas, não com leituras
+            db.execute(text(f'LOCK TABLE "{models.DashboardContador.__tablename__}" IN SHARE ROW EXCLUSIVE MODE'))
+        counts = compute_dashboard_counts(db, now)
+        try:
+            existing = {row.chave for row in db.query(models.DashboardContador.chave).filter(
+                models.DashboardContador.chave.in_(list(counts))
+            )}
+            for chave, valor in counts.items():
+                if chave in existing:
+                    db.query(models.DashboardContador).filter(models.DashboardContador.chave == chave).update(
+                        {"valor": valor}, synchronize_session=False
+                    )
+                else:
+                    db.add(models.DashboardContador(chave=chave, valor=valor))
+            # Meses anteriores não são mais lidos
+            db.query(models.DashboardContador).filter(
+                models.DashboardContador.chave.like(f"{APROVADOS_MES}:%"),
+                models.DashboardContador.chave != month_key(now)
+            ).delete(synchronize_session=False)
+            db.commit()
+        except IntegrityError:
+            # Outro processo gravou os contadores ao mesmo tempo
+            db.rollback()
+        self._last_reconcile = time.monotonic()
+        return counts
+
+    def reconcile_if_due(self, db: Session):
+        if time.monotonic() - self._last_reconcile >= DASHBOARD_RECONCILE_SECONDS:
+            self.reconcile(db)
+            return True
+        return False
+
+
+dashboard_stats = DashboardStats()
+
+
+# --- Manutenção dos contadores nas escritas do ORM ---
+
+def _naive(value):
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone().replace(tzinfo=None)
+    return value
+
+
+def _old_value(session, obj, attr: str):
+    """Valor do atributo antes do flush (do histórico do ORM ou, se não carregado, do banco)."""
+    history = inspect(obj).attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    if not history.added:
+        return getattr(obj, attr)
+    # Alterado sem ter sido carregado (ex.: objeto expirado pelo commit): o banco ainda tem o valor antigo
+    column = obj.__table__.columns[attr]
+    with session.no_autoflush:
+        return session.execute(select(column).where(obj.__table__.c.id == obj.id)).scalar()
+
+
+def _new_value(obj, attr: str):
+    value = getattr(obj, attr)
+    if value is None:
+        column = obj.__table__.columns[attr]
+        if column.default is not None and column.default.is_scalar:
+            return column.default.arg
+    return value
+
+
+def _pending_counters(session):
+    return session.info.setdefault("dashboard_deltas", defaultdict(int))
+
+
+def _stale_counters(session):
+    return session.info.setdefault("dashboard_invalidos", set())
+
+
+def _collect_status_deltas(session, new_statuses: list, deltas: dict):
+    # vencidos = funcionários cujo status mais recente é VENCIDO; compara com o status anterior
+    latest_new = {}
+    for status in new_statuses:
+        if status.funcionarioId is None:
+            continue
+        latest_new[status.funcionarioId] = status.statusIntegracao
+    if not latest_new:
+        return
+
+    previous = {}
+    ids = list(latest_new)
+    latest_ids = select(func.max(models.StatusFuncionario.id)).where(
+        models.StatusFuncionario.funcionarioId.in_(ids)
+    ).group_by(models.StatusFuncionario.funcionarioId)
+    with session.no_autoflush:
+        for row in session.execute(select(
+            models.StatusFuncionario.funcionarioId, models.StatusFuncionario.statusIntegracao
+        ).where(models.StatusFuncionario.id.in_(latest_ids))):
+            previous[row.funcionarioId] = row.statusIntegracao
+
+    for funcionario_id, novo in latest_new.items():
+        deltas[VENCIDOS] += (novo == "VENCIDO") - (previous.get(funcionario_id) == "VENCIDO")
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_dashboard_deltas(session, flush_context, instances):
+    deltas = _pending_counters(session)
+    stale = _stale_counters(session)
+    current_month = month_start()
+    aprovados = month_key()
+    new_statuses = []
+
+    for obj in session.new:
+        if isinstance(obj, models.Empresa):
+            deltas[EMPRESAS_ATIVAS] += _new_value(obj, "status") == "ATIVA"
+        elif isinstance(obj, models.Funcionario):
+            deltas[TOTAL_FUNCIONARIOS] += 1
+        elif isinstance(obj, (models.Documento, models.AnexoFuncionario)):
+            deltas[DOCS_PENDENTES] += _new_value(obj, "status") == "AGUARDANDO"
+            if isinstance(obj, models.Documento):
+                deltas[aprovados] += _new_value(obj, "status") == "APROVADO"
+        elif isinstance(obj, models.StatusFuncionario):
+            new_statuses.append(obj)
+
+    for obj in session.deleted:
+        if isinstance(obj, models.Empresa):
+            deltas[EMPRESAS_ATIVAS] -= _old_value(session, obj, "status") == "ATIVA"
+        elif isinstance(obj, models.Funcionario):
+            deltas[TOTAL_FUNCIONARIOS] -= 1
+        elif isinstance(obj, (models.Documento, models.AnexoFuncionario)):
+            status = _old_value(session, obj, "status")
+            deltas[DOCS_PENDENTES] -= status == "AGUARDANDO"
+            if isinstance(obj, models.Documento):
+                updated = _naive(_old_value(session, obj, "updatedAt"))
+                deltas[aprovados] -= status == "APROVADO" and updated is not None and updated >= current_month
+        elif isinstance(obj, models.StatusFuncionario):
+            stale.add(VENCIDOS)
+
+    for obj in session.dirty:
+        if not isinstance(obj, (models.Empresa, models.Documento, models.AnexoFuncionario)):
+            continue
+        if not session.is_modified(obj, include_collections=False):
+            continue
+        old_status = _old_value(session, obj, "status")
+        new_status = obj.status
+        if isinstance(obj, models.Empresa):
+            deltas[EMPRESAS_ATIVAS] += (new_status == "ATIVA") - (old_status == "ATIVA")
+            continue
+        deltas[DOCS_PENDENTES] += (new_status == "AGUARDANDO") - (old_status == "AGUARDANDO")
+        if isinstance(obj, models.Documento):
+            # Qualquer alteração move updatedAt para agora: conta se ficou APROVADO e
+            # deixa de contar o que já contava (aprovado com updatedAt neste mês)
+            updated = _naive(_old_value(session, obj, "updatedAt"))
+            counted_before = old_status == "APROVADO" and updated is not None and updated >= current_month
+            deltas[aprovados] += (new_status == "APROVADO") - counted_before
+
+    if new_statuses:
+        _collect_status_deltas(session, new_statuses, deltas)
+
+
+def record_upsert_deltas(session, table: str, updated: bool, old_status, new_status, old_updated_at=None):
+    """
+    Delta de um upsert de documentos/anexosFuncionarios a partir do RETURNING.
+    updated com old_status None: a linha foi inserida por outra transação depois do snapshot
+    da instrução; toda inserção entra como AGUARDANDO.
+    """
+    deltas = _pending_counters(session)
+    if updated and old_status is None:
+        old_status = "AGUARDANDO"
+    deltas[DOCS_PENDENTES] += (new_status == "AGUARDANDO") - (updated and old_status == "AGUARDANDO")
+    if table == "documentos":
+        # O upsert move updatedAt para agora: mesma regra do flush
+        updated_at = _naive(old_updated_at)
+        counted_before = updated and old_status == "APROVADO" and updated_at is not None and updated_at >= month_start()
+        deltas[month_key()] += (new_status == "APROVADO") - counted_before
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _invalidate_on_bulk_statements(orm_execute_state):
+    # query(...).update() / .delete() e inserts em massa não passam pelo flush:
+    # os contadores da tabela são recalculados (os upserts de envio informam o delta)
+    if orm_execute_state.execution_options.get(UPSERT_COUNTED):
+        return
+    if (orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete) and orm_execute_state.bind_mapper is not None:
+        counters = _TABLE_COUNTERS.get(orm_execute_state.bind_mapper.local_table.name)
+        if counters:
+            _stale_counters(orm_execute_state.session).update(counters)
+
+
+def _apply_pending(session):
+    deltas = session.info.pop("dashboard_deltas", None)
+    stale = session.info.pop("dashboard_invalidos", None)
+    if not stale and not any((deltas or {}).values()):
+        return
+    connection = session.connection()
+    table = models.DashboardContador.__table__
+
+    if stale:
+        condition = table.c.chave.in_([chave for chave in stale if chave != APROVADOS_MES])
+        if APROVADOS_MES in stale:
+            condition = condition | table.c.chave.like(f"{APROVADOS_MES}:%")
+        connection.execute(delete(table).where(condition))
+
+    # Ordem fixa das chaves evita deadlock entre transações concorrentes; contador ausente não é alterado
+    for chave, delta in sorted((deltas or {}).items()):
+        if delta:
+            connection.execute(update(table).where(table.c.chave == chave).values(valor=table.c.valor + delta))
+
+
+@event.listens_for(Session, "after_flush")
+def _apply_dashboard_deltas(session, flush_context):
+    _apply_pending(session)
+
+
+@event.listens_for(Session, "before_commit")
+def _apply_dashboard_invalidations(session):
+    # UPDATE/DELETE em massa sem flush depois
+    _apply_pending(session)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_dashboard_deltas(session):
+    session.info.pop("dashboard_deltas", None)
+    session.info.pop("dashboard_invalidos", None)
@@ -0,0 +1,282 @@
+import os
+import time
+import asyncio
+import heapq
+import queue
+import threading
+from collections import defaultdict
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+import models
+
+# Barramento de eventos de domínio. Handlers registram eventos na sessão com emit();
+# eles só são despachados depois do commit (rollback descarta).
+# Assinantes síncronos rodam logo após o commit, na thread da requisição;
+# assinantes em segundo plano rodam nas threads do barramento, com novas tentativas.
+# A fila é do processo e fica em memória: eventos pendentes se perdem se o processo morrer,
+# então handlers em segundo plano devem ser idempotentes e reconferir o estado no banco.
+EVENT_WORKERS = int(os.getenv("EVENT_WORKERS", "1"))
+EVENT_QUEUE_SIZE = int(os.getenv("EVENT_QUEUE_SIZE", "10000"))
+EVENT_HANDLER_RETRIES = int(os.getenv("EVENT_HANDLER_RETRIES", "3"))
+EVENT_RETRY_BACKOFF_SECONDS = float(os.getenv("EVENT_RETRY_BACKOFF_SECONDS", "2"))
+
+
+class DomainEvent:
+    """Evento com campos fixos (fields); campos não informados ficam None."""
+    fields = ()
+
+    def __init__(self, **dados):
+        unknown = set(dados) - set(self.fields)
+        if unknown:
+            raise TypeError(f"{type(self).__name__}: campos desconhecidos {sorted(unknown)}")
+        for field in self.fields:
+            setattr(self, field, dados.get(field))
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.fields}
+
+    def __repr__(self):
+        dados = ", ".join(f"{field}={getattr(self, field)!r}" for field in self.fields)
+        return f"{type(self).__name__}({dados})"
+
+
+class DocumentUploaded(DomainEvent):
+    fields = ("documentoId", "empresaId", "contratoId", "categoriaId", "status", "reenviado")
+
+
+class DocumentStatusChanged(DomainEvent):
+    fields = ("documentoId", "empresaId", "contratoId", "categoriaId", "status", "perfilId")
+
+
+class EmployeeDocumentUploaded(DomainEvent):
+    fields = ("anexoId", "funcionarioId", "empresaId", "contratoId", "tipoDocumento", "status")
+
+
+class EmployeeDocumentStatusChanged(DomainEvent):
+    fields = ("anexoId", "funcionarioId", "empresaId", "contratoId", "tipoDocumento", "status")
+
+
+class StatusFuncionarioAppended(DomainEvent):
+    """Emitido automaticamente para toda linha nova em statusFuncionarios (ver _emit_status_appended)."""
+    fields = ("statusId", "funcionarioId", "empresaId", "contratoId", "statusIntegracao", "statusContratual", "tipoRegistro", "dataIntegracao")
+
+
+class EmpresaInactivated(DomainEvent):
+    fields = ("empresaId",)
+
+
+class Subscription:
+    def __init__(self, event_type, handler, background: bool, retries: int):
+        self.event_type = event_type
+        self.handler = handler
+        self.background = background
+        self.retries = retries
+        self.name = f"{handler.__module__}.{handler.__qualname__}"
+
+
+class EventBus:
+    """
+    subscribe(tipo, handler) registra handler(db, evento); db é uma sessão nova, fechada ao final
+    (a sessão que fez o commit não pode mais ser usada durante o despacho).
+    Sem as threads do barramento iniciadas (scripts, worker.py), os handlers em segundo plano
+    rodam logo após o commit, como os síncronos.
+    """
+
+    def __init__(self, queue_size: int):
+        self._subscriptions = defaultdict(list)
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._retries = []
+        self._retry_seq = 0
+        self._lock = threading.Lock()
+        self._started = False
+        self.emitted = 0
+        self.dispatched = 0
+        self.failed = 0
+        self.retried = 0
+        self.dropped = 0
+
+    def subscribe(self, event_type, handler, background: bool = False, retries: int = EVENT_HANDLER_RETRIES):
+        self._subscriptions[event_type].append(Subscription(event_type, handler, background, retries))
+
+    def on(self, event_type, background: bool = False, retries: int = EVENT_HANDLER_RETRIES):
+        """Decorador para subscribe()."""
+        def decorator(handler):
+            self.subscribe(event_type, handler, background, retries)
+            return handler
+        return decorator
+
+    def emit(self, db: Session, evento: DomainEvent):
+        """Registra o evento na transação da sessão; despachado só se o commit acontecer."""
+        db.info.setdefault("eventos_dominio", []).append(evento)
+
+    def dispatch(self, eventos: list):
+        with self._lock:
+            self.emitted += len(eventos)
+        for evento in eventos:
+            for subscription in self._subscriptions.get(type(evento), ()):
+                if subscription.background and self._started:
+                    try:
+                        self._queue.put_nowait((subscription, evento, 1))
+                    except queue.Full:
+                        # Barramento muito atrasado: não joga o trabalho de volta na requisição
+                        print(f"Fila de eventos cheia; {subscription.name} descartado para {evento!r}")
+                        with self._lock:
+                            self.dropped += 1
+                    continue
+                self._run(subscription, evento, 1)
+
+    def _run(self, subscription: Subscription, evento: DomainEvent, attempt: int):
+        db = models.SessionLocal()
+        try:
+            subscription.handler(db, evento)
+            with self._lock:
+                self.dispatched += 1
+        except Exception as e:
+            db.rollback()
+            with self._lock:
+                self.failed += 1
+            if subscription.background and attempt < subscription.retries:
+                delay = EVENT_RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1)
+                print(f"Error in event handler {subscription.name} ({evento!r}), tentativa {attempt}: {e}; nova tentativa em {delay:.0f}s")
+                self._schedule_retry(subscription, evento, attempt + 1, delay)
+            else:
+                print(f"Error in event handler {subscription.name} ({evento!r}): {e}")
+                with self._lock:
+                    self.dropped += 1
+        finally:
+            db.close()
+
+    def _schedule_retry(self, subscription: Subscription, evento: DomainEvent, attempt: int, delay: float):
+        if not self._started:
+            # Sem threads do barramento não há quem reexecute depois: tenta de novo agora
+            self._run(subscription, evento, attempt)
+            return
+        with self._lock:
+            self._retry_seq += 1
+            heapq.heappush(self._retries, (time.monotonic() + delay, self._retry_seq, subscription, evento, attempt))
+            self.retried += 1
+
+    def _due_retries(self):
+        now = time.monotonic()
+        due = []
+        with self._lock:
+            while self._retries and self._retries[0][0] <= now:
+                _, _, subscription, evento, attempt = heapq.heappop(self._retries)
+                due.append((subscription, evento, attempt))
+        return due
+
+    def run_worker(self, stop_event: threading.Event):
+        while not stop_event.is_set():
+            for item in self._due_retries():
+                self._run(*item)
+            try:
+                item = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            self._run(*item)
+
+        # Encerramento: eventos novos passam a rodar no commit; processa o que já estava na fila
+        # (novas tentativas agendadas são descartadas)
+        self._started = False
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._run(*item)
+
+    def start(self, count: int, stop_event: threading.Event):
+        self._started = count > 0
+        threads = []
+        for i in range(count):
+            thread = threading.Thread(target=self.run_worker, args=(stop_event,), name=f"eventos-worker-{i}", daemon=True)
+            thread.start()
+            threads.append(thread)
+        return threads
+
+    def stats(self):
+        with self._lock:
+            return {
+                "assinaturas": {
+                    tipo.__name__: [subscription.name for subscription in subscriptions]
+                    for tipo, subscriptions in self._subscriptions.items()
+                },
+                "threads": self._started,
+                "naFila": self._queue.qsize(),
+                "aguardandoNovaTentativa": len(self._retries),
+                "emitidos": self.emitted,
+                "executados": self.dispatched,
+                "falhas": self.failed,
+                "novasTentativas": self.retried,
+                "descartados": self.dropped,
+            }
+
+
+event_bus = EventBus(EVENT_QUEUE_SIZE)
+
+
+def start_event_workers(count: int, stop_event: threading.Event):
+    return event_bus.start(count, stop_event)
+
+
+_loop_tasks = set()
+
+
+def _report_loop_task(task: asyncio.Task):
+    _loop_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Error in event coroutine {task.get_name()}: {task.exception()}")
+
+
+def run_coroutine(coro):
+    """
+    Executa uma corrotina a partir de um handler. Fora de um event loop (threads do barramento,
+    worker.py, rotas síncronas) espera e devolve o resultado. Na thread do event loop da API
+    não pode bloquear: agenda a corrotina no próprio loop e devolve o asyncio.Task
+    (falhas são registradas quando a tarefa termina).
+    """
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    task = loop.create_task(coro)
+    _loop_tasks.add(task)  # o loop guarda só referência fraca às tarefas
+    task.add_done_callback(_report_loop_task)
+    return task
+
+
+@event.listens_for(Session, "after_flush")
+def _emit_status_appended(session, flush_context):
+    # Toda linha nova de status vira evento, qualquer que seja o handler que a gravou
+    novos = [obj for obj in session.new if isinstance(obj, models.StatusFuncionario)]
+    if not novos:
+        return
+    sem_empresa = {obj.funcionarioId for obj in novos if obj.empresaId is None and obj.funcionarioId is not None}
+    empresas = {}
+    if sem_empresa:
+        empresas = dict(session.execute(
+            select(models.Funcionario.id, models.Funcionario.empresaId).where(models.Funcionario.id.in_(sem_empresa))
+        ).all())
+    for obj in novos:
+        event_bus.emit(session, StatusFuncionarioAppended(
+            statusId=obj.id,
+            funcionarioId=obj.funcionarioId,
+            empresaId=obj.empresaId if obj.empresaId is not None else empresas.get(obj.funcionarioId),
+            contratoId=obj.contratoId,
+            statusIntegracao=obj.statusIntegracao,
+            statusContratual=obj.statusContratual,
+            tipoRegistro=obj.tipo,
+            dataIntegracao=obj.dataIntegracao,
+        ))
+
+
+@event.listens_for(Session, "after_commit")
+def _dispatch_committed_events(session):
+    eventos = session.info.pop("eventos_dominio", None)
+    if eventos:
+        event_bus.dispatch(eventos)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back_events(session):
+    session.info.pop("eventos_dominio", None)
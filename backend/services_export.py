@@ -0,0 +1,244 @@
+import os
+import io
+import csv
+import json
+import tempfile
+from datetime import datetime, date
+from decimal import Decimal
+from models import SessionLocal
+from services_cubo import CuboQueryError
+
+# Exportações de dados brutos (CSV, NDJSON, Parquet) lidas do banco em lotes
+# com cursor do lado do servidor: a memória fica constante independente do volume.
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "5000"))
+EXPORT_SPOOL_MAX_BYTES = 8 * 1024 * 1024
+
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def check_export_format(fmt: str):
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Formato de exportação inválido: {fmt}. Use um de: {', '.join(EXPORT_FORMATS)}")
+    return fmt
+
+
+def query_batches(db, statement, params: dict = None, batch_size: int = EXPORT_BATCH_SIZE):
+    """Executa `statement` com stream_results e gera lotes de linhas (tuplas)."""
+    result = db.execute(statement.execution_options(stream_results=True, yield_per=batch_size), params or {})
+    try:
+        for partition in result.partitions(batch_size):
+            yield partition
+    finally:
+        result.close()
+
+
+def _json_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, bytes):
+        return None
+    return value
+
+
+def _iter_csv(headers: list, batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow(headers)
+    for batch in batches:
+        writer.writerows([_json_value(v) for v in row] for row in batch)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def _iter_ndjson(headers: list, batches):
+    for batch in batches:
+        lines = [
+            json.dumps(dict(zip(headers, (_json_value(v) for v in row))), ensure_ascii=False)
+            for row in batch
+        ]
+        if lines:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+# Erro depois que o stream começou (status 200 já enviado): o arquivo termina com uma
+# marca explícita de exportação incompleta em vez de simplesmente ficar truncado
+def _csv_error_marker(message: str):
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerow(["#ERRO", f"Exportação incompleta: {message}"])
+    return buffer.getvalue().encode("utf-8")
+
+
+def _ndjson_error_marker(message: str):
+    return (json.dumps({"erro": f"Exportação incompleta: {message}", "incompleta": True}, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+EXPORT_ERROR_MARKERS = {
+    "csv": _csv_error_marker,
+    "ndjson": _ndjson_error_marker,
+}
+
+
+def _arrow_type(values):
+    import pyarrow as pa
+
+    for value in values:
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            return pa.bool_()
+        if isinstance(value, int):
+            return pa.int64()
+        if isinstance(value, (float, Decimal)):
+            return pa.float64()
+        if isinstance(value, datetime):
+            return pa.timestamp("us")
+        if isinstance(value, date):
+            return pa.date32()
+        return pa.string()
+    return pa.string()
+
+
+def _coerce(value, arrow_type):
+    """Converte o valor para o tipo da coluna sem perda; TypeError/ValueError se não couber."""
+    import pyarrow as pa
+
+    if value is None:
+        return None
+    if pa.types.is_string(arrow_type):
+        return str(_json_value(value))
+    if pa.types.is_timestamp(arrow_type):
+        if isinstance(value, datetime):
+            return value
+        if isinstance(value, date):
+            return datetime(value.year, value.month, value.day)
+        if isinstance(value, str):
+            return datetime.fromisoformat(value)
+    elif pa.types.is_date(arrow_type):
+        if isinstance(value, datetime) and value.time() == datetime.min.time():
+            return value.date()
+        if isinstance(value, date) and not isinstance(value, datetime):
+            return value
+        if isinstance(value, str):
+            return date.fromisoformat(value)
+    elif pa.types.is_floating(arrow_type):
+        if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+            return float(value)
+    elif pa.types.is_integer(arrow_type):
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value
+        if isinstance(value, (float, Decimal)) and value == int(value):
+            return int(value)
+    elif isinstance(value, bool):
+        return value
+    raise TypeError(f"{type(value).__name__} não é {arrow_type}")
+
+
+def _arrow_array(values, field):
+    import pyarrow as pa
+
+    coerced = []
+    for value in values:
+        try:
+            coerced.append(_coerce(value, field.type))
+        except (TypeError, ValueError, OverflowError):
+            # O tipo da coluna é inferido no primeiro lote e o arquivo já está sendo gravado:
+            # não dá para alargar o esquema, e trocar o valor por NULL perderia dados
+            raise ValueError(
+                f"Exportação Parquet: valor {value!r} na coluna {field.name!r} não é compatível com "
+                f"o tipo {field.type} inferido no primeiro lote"
+            )
+    return pa.array(coerced, type=field.type)
+
+
+def write_parquet(output, headers: list, batches):
+    """
+    Grava os lotes em Parquet, um row group por lote. Os tipos das colunas são
+    inferidos no primeiro lote; colunas sem valores nele viram texto. Valor posterior
+    que não cabe no tipo inferido interrompe a exportação com ValueError (nunca vira NULL).
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Exportação Parquet requer o pacote pyarrow")
+
+    writer = None
+    schema = None
+    count = 0
+    try:
+        for batch in batches:
+            if not batch:
+                continue
+            columns = list(zip(*batch))
+            if schema is None:
+                schema = pa.schema([pa.field(name, _arrow_type(col)) for name, col in zip(headers, columns)])
+                writer = pq.ParquetWriter(output, schema, compression="snappy")
+            arrays = [_arrow_array(list(col), field) for col, field in zip(columns, schema)]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            count += len(batch)
+        if writer is None:
+            schema = pa.schema([pa.field(name, pa.string()) for name in headers])
+            writer = pq.ParquetWriter(output, schema, compression="snappy")
+            writer.write_table(schema.empty_table())
+    finally:
+        if writer is not None:
+            writer.close()
+    return count
+
+
+def _iter_parquet(headers: list, batches, chunk_size: int = 64 * 1024):
+    # O rodapé do Parquet só existe no fim: grava em arquivo temporário e transmite depois
+    with tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_MAX_BYTES) as output:
+        write_parquet(output, headers, batches)
+        output.seek(0)
+        while True:
+            chunk = output.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+EXPORT_WRITERS = {
+    "csv": _iter_csv,
+    "ndjson": _iter_ndjson,
+    "parquet": _iter_parquet,
+}
+
+
+def iter_export(fmt: str, source):
+    """
+    Gera os bytes da exportação. `source(db)` devolve (cabeçalhos, lotes de linhas).
+    A leitura usa uma sessão própria, aberta só durante o streaming: a sessão da
+    requisição já pode ter sido fechada quando o StreamingResponse começa a enviar.
+    Erros antes do primeiro bloco sobem normalmente; depois dele, CSV e NDJSON terminam
+    com a marca de exportação incompleta (EXPORT_ERROR_MARKERS).
+    """
+    check_export_format(fmt)
+    db = SessionLocal()
+    started = False
+    try:
+        headers, batches = source(db)
+        for chunk in EXPORT_WRITERS[fmt](list(headers), batches):
+            yield chunk
+            started = True
+    except Exception as e:
+        marker = EXPORT_ERROR_MARKERS.get(fmt)
+        if not started or marker is None:
+            raise
+        print(f"Exportação {fmt} interrompida: {e}")
+        yield marker(str(e) if isinstance(e, CuboQueryError) else "erro interno ao gerar o arquivo")
+    finally:
+        db.close()
+
+
+def export_filename(base: str, fmt: str):
+    return f"{base}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}"
@@ -0,0 +1,227 @@
+import os
+import json
+import time
+import asyncio
+import threading
+from collections import deque
+from sqlalchemy.orm import Session
+from services_cache import table_versions
+from services_events import (
+    event_bus, DocumentUploaded, DocumentStatusChanged, EmployeeDocumentUploaded,
+    EmployeeDocumentStatusChanged, StatusFuncionarioAppended
+)
+
+# Feed de alterações (Server-Sent Events) para o frontend trocar o polling por refetch sob demanda.
+# Assina o barramento de eventos de domínio (services_events), que só despacha depois do commit.
+# Cada conexão recebe apenas o que o principal pode ver.
+# O feed é do processo: com vários workers do uvicorn, cada um entrega os eventos das suas escritas.
+FEED_MAX_CONNECTIONS = int(os.getenv("FEED_MAX_CONNECTIONS", "500"))
+FEED_QUEUE_SIZE = int(os.getenv("FEED_QUEUE_SIZE", "100"))
+FEED_BUFFER_SIZE = int(os.getenv("FEED_BUFFER_SIZE", "1000"))
+FEED_HEARTBEAT_SECONDS = float(os.getenv("FEED_HEARTBEAT_SECONDS", "15"))
+FEED_RETRY_MS = int(os.getenv("FEED_RETRY_MS", "5000"))
+
+# Tabelas que mudam o que um usuário interno pode ver (categorias autorizadas pelos cubos)
+FEED_PERMISSION_TABLES = ("users", "profiles", "cubos")
+
+DOCUMENTO_ENVIADO = "documento.enviado"
+DOCUMENTO_STATUS = "documento.status"
+ANEXO_FUNCIONARIO_ENVIADO = "anexoFuncionario.enviado"
+ANEXO_FUNCIONARIO_STATUS = "anexoFuncionario.status"
+FUNCIONARIO_STATUS = "funcionario.status"
+
+DOCUMENTO_EVENTS = (DOCUMENTO_ENVIADO, DOCUMENTO_STATUS)
+
+
+class FeedFull(Exception):
+    """Limite de conexões abertas no feed atingido."""
+    status_code = 503
+
+
+class FeedSubscriber:
+    """
+    Uma conexão SSE: fila no event loop da conexão e o filtro de visibilidade do principal.
+    empresa_id restringe aos eventos da empresa; categorias (None = todas) restringe documentos;
+    ver_funcionarios libera os eventos de funcionários e seus anexos.
+    """
+
+    def __init__(self, loop, empresa_id: int = None, categorias=None, ver_funcionarios: bool = True):
+        self.loop = loop
+        self.empresa_id = empresa_id
+        self.categorias = set(categorias) if categorias is not None else None
+        self.ver_funcionarios = ver_funcionarios
+        self.queue = asyncio.Queue(maxsize=FEED_QUEUE_SIZE)
+        self.overflow = False
+
+    def can_see(self, evento: dict):
+        if self.empresa_id is not None:
+            return evento.get("empresaId") == self.empresa_id
+        if evento["tipo"] in DOCUMENTO_EVENTS:
+            return self.categorias is None or evento.get("categoriaId") in self.categorias
+        return self.ver_funcionarios
+
+    def push(self, evento: dict):
+        # Roda no event loop da conexão
+        if self.overflow:
+            return
+        try:
+            self.queue.put_nowait(evento)
+        except asyncio.QueueFull:
+            # Cliente lento: descarta a fila e pede um refetch completo
+            self.overflow = True
+
+
+class ChangeFeed:
+    """
+    Distribui os eventos confirmados para as conexões abertas.
+    Mantém os últimos FEED_BUFFER_SIZE eventos para o cliente retomar do Last-Event-ID
+    depois de uma reconexão; se o id já saiu do buffer, o cliente recebe "reset".
+    """
+
+    def __init__(self, max_connections: int, buffer_size: int):
+        self.max_connections = max_connections
+        self._subscribers = set()
+        self._buffer = deque(maxlen=buffer_size)
+        self._seq = 0
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def publish(self, eventos: list):
+        with self._lock:
+            for evento in eventos:
+                self._seq += 1
+                evento["id"] = self._seq
+                evento["ts"] = time.time()
+                self._buffer.append(evento)
+            self.published += len(eventos)
+            subscribers = list(self._subscribers)
+
+        for subscriber in subscribers:
+            visible = [evento for evento in eventos if subscriber.can_see(evento)]
+            if not visible:
+                continue
+            try:
+                for evento in visible:
+                    subscriber.loop.call_soon_threadsafe(subscriber.push, evento)
+            except RuntimeError:
+                # Event loop já encerrado
+                self.unsubscribe(subscriber)
+
+    def subscribe(self, subscriber: FeedSubscriber):
+        with self._lock:
+            if len(self._subscribers) >= self.max_connections:
+                raise FeedFull("Limite de conexões de notificações atingido. Tente novamente em instantes.")
+            self._subscribers.add(subscriber)
+
+    def unsubscribe(self, subscriber: FeedSubscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def replay(self, subscriber: FeedSubscriber, last_event_id: int):
+        """
+        Eventos visíveis depois de last_event_id; None se parte deles já saiu do buffer
+        ou se o id é de antes de um reinício do processo.
+        """
+        with self._lock:
+            if last_event_id > self._seq:
+                return None
+            if last_event_id == self._seq:
+                return []
+            if not self._buffer or self._buffer[0]["id"] > last_event_id + 1:
+                return None
+            return [evento for evento in self._buffer if evento["id"] > last_event_id and subscriber.can_see(evento)]
+
+    def last_id(self):
+        with self._lock:
+            return self._seq
+
+    def stats(self):
+        with self._lock:
+            return {
+                "conexoes": len(self._subscribers),
+                "maxConexoes": self.max_connections,
+                "publicados": self.published,
+                "ultimoId": self._seq,
+            }
+
+
+change_feed = ChangeFeed(FEED_MAX_CONNECTIONS, FEED_BUFFER_SIZE)
+
+
+def format_sse(evento: dict = None, tipo: str = None, comment: str = None):
+    if comment is not None:
+        return f": {comment}\n\n"
+    if evento is None:
+        return f"event: {tipo}\ndata: {{}}\n\n"
+    return f"id: {evento['id']}\nevent: {evento['tipo']}\ndata: {json.dumps(evento, default=str)}\n\n"
+
+
+async def iter_feed(request, subscriber: FeedSubscriber, last_event_id: int = None, refresh=None):
+    """
+    Corpo do stream SSE de uma conexão já inscrita no change_feed.
+    refresh(subscriber) é chamado quando usuários, perfis ou cubos mudam, para refazer o filtro;
+    se levantar exceção (token expirado, usuário removido), a conexão é encerrada.
+    """
+    sent_id = last_event_id or 0
+    try:
+        yield f"retry: {FEED_RETRY_MS}\n\n"
+        if last_event_id is not None:
+            eventos = change_feed.replay(subscriber, last_event_id)
+            if eventos is None:
+                sent_id = 0
+                yield format_sse(tipo="reset")
+            else:
+                for evento in eventos:
+                    sent_id = evento["id"]
+                    yield format_sse(evento)
+
+        versions = table_versions.get(FEED_PERMISSION_TABLES)
+        while not await request.is_disconnected():
+            try:
+                evento = await asyncio.wait_for(subscriber.queue.get(), FEED_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                evento = None
+
+            if subscriber.overflow:
+                while not subscriber.queue.empty():
+                    subscriber.queue.get_nowait()
+                subscriber.overflow = False
+                sent_id = change_feed.last_id()
+                yield format_sse(tipo="reset")
+                continue
+            if evento is None:
+                yield format_sse(comment="ping")
+                continue
+
+            current_versions = table_versions.get(FEED_PERMISSION_TABLES)
+            if refresh is not None and current_versions != versions:
+                versions = current_versions
+                try:
+                    await refresh(subscriber)
+                except Exception:
+                    break
+            # Eventos já entregues pelo replay também podem ter entrado na fila
+            if evento["id"] <= sent_id or not subscriber.can_see(evento):
+                continue
+            sent_id = evento["id"]
+            yield format_sse(evento)
+    finally:
+        change_feed.unsubscribe(subscriber)
+
+
+# Eventos de domínio publicados no feed (assinantes síncronos: rodam logo após o commit)
+_FEED_EVENT_TYPES = {
+    DocumentUploaded: DOCUMENTO_ENVIADO,
+    DocumentStatusChanged: DOCUMENTO_STATUS,
+    EmployeeDocumentUploaded: ANEXO_FUNCIONARIO_ENVIADO,
+    EmployeeDocumentStatusChanged: ANEXO_FUNCIONARIO_STATUS,
+    StatusFuncionarioAppended: FUNCIONARIO_STATUS,
+}
+
+
+def publish_domain_event(db: Session, evento):
+    change_feed.publish([{"tipo": _FEED_EVENT_TYPES[type(evento)], **evento.to_dict()}])
+
+
+for _event_type in _FEED_EVENT_TYPES:
+    event_bus.subscribe(_event_type, publish_domain_event)
@@ -0,0 +1,163 @@
+from datetime import datetime
+from sqlalchemy import select, func, or_
+from sqlalchemy.orm import Session
+import models
+
+
+def latest_status(db: Session, funcionario_id: int):
+    return db.query(models.StatusFuncionario).filter(
+        models.StatusFuncionario.funcionarioId == funcionario_id
+    ).order_by(models.StatusFuncionario.id.desc()).first()
+
+
+def status_as_of(db: Session, momento: datetime, funcionario_ids: list = None, contrato_id: int = None,
+                 empresa_id: int = None, integracao_valida: bool = None, aso_valido: bool = None,
+                 after_funcionario_id: int = None, limit: int = None):
+    """
+    Status vigente de cada funcionário em `momento`: o último registro com data <= momento
+    (índice statusFuncionarios(funcionarioId, data, id)). contrato_id filtra pelo contrato do
+    status vigente; empresa_id pela empresa do funcionário. Validades comparadas com o dia de `momento`.
+    Registros já arquivados pela retenção não entram: datas anteriores ao corte podem ficar incompletas.
+    """
+    sf = models.StatusFuncionario
+    effective = select(sf.funcionarioId, func.max(sf.id).label("max_id")).where(sf.data <= momento)
+    if funcionario_ids is not None:
+        effective = effective.where(sf.funcionarioId.in_(funcionario_ids))
+    if contrato_id is not None:
+        # Só quem teve algum status no contrato pode estar nele na data
+        effective = effective.where(sf.funcionarioId.in_(select(sf.funcionarioId).where(sf.contratoId == contrato_id)))
+    if empresa_id is not None:
+        effective = effective.where(sf.funcionarioId.in_(select(models.Funcionario.id).where(models.Funcionario.empresaId == empresa_id)))
+    if after_funcionario_id is not None:
+        effective = effective.where(sf.funcionarioId > after_funcionario_id)
+    effective = effective.group_by(sf.funcionarioId).subquery()
+
+    query = db.query(sf).join(effective, sf.id == effective.c.max_id)
+    if contrato_id is not None:
+        query = query.filter(sf.contratoId == contrato_id)
+
+    day_start = momento.replace(hour=0, minute=0, second=0, microsecond=0)
+    if integracao_valida is not None:
+        valid = sf.dataValidadeIntegracao >= day_start
+        query = query.filter(valid if integracao_valida else or_(sf.dataValidadeIntegracao == None, ~valid))
+    if aso_valido is not None:
+        valid = sf.dataValidadeAso >= day_start
+        query = query.filter(valid if aso_valido else or_(sf.dataValidadeAso == None, ~valid))
+
+    query = query.order_by(sf.funcionarioId)
+    if limit is not None:
+        query = query.limit(limit)
+
+    rows = []
+    for status in query.all():
+        row = {column.key: getattr(status, column.key) for column in sf.__table__.columns}
+        row["integracaoValida"] = status.dataValidadeIntegracao is not None and status.dataValidadeIntegracao >= day_start
+        row["asoValido"] = status.dataValidadeAso is not None and status.dataValidadeAso >= day_start
+        rows.append(row)
+    return rows
+
+
+def documentary_status(db: Session, funcionario: models.Funcionario):
+    """Documentos exigidos (gerais e do contrato) pendentes ou reprovados do funcionário."""
+    exigidos = db.query(models.DocumentoExigidoFuncionario).filter(
+        or_(
+            models.DocumentoExigidoFuncionario.contratoId == None,
+            models.DocumentoExigidoFuncionario.contratoId == funcionario.contratoId
+        )
+    ).all()
+
+    anexos = db.query(models.AnexoFuncionario).filter(models.AnexoFuncionario.funcionarioId == funcionario.id).all()
+
+    status_map = {a.tipo: a.status for a in anexos}
+    pendentes = []
+    reprovados = []
+
+    for req in exigidos:
+        status = status_map.get(req.nome)
+        if not status:
+            pendentes.append(req.nome)
+        elif status == "REPROVADO":
+            reprovados.append(req.nome)
+        elif status == "AGUARDANDO":
+            pendentes.append(req.nome)
+
+    is_ready = len(pendentes) == 0 and len(reprovados) == 0
+
+    return {
+        "is_ready": is_ready,
+        "pendentes": pendentes,
+        "reprovados": reprovados,
+        "total_exigidos": len(exigidos),
+        "total_enviados": len(anexos)
+    }
+
+
+# --- Mudanças de status em cascata ---
+# Rodam na sessão da requisição, antes do commit: a cascata entra na mesma transação
+# da mudança que a causou (não passa pelo barramento de eventos, que fica em memória).
+
+def approve_when_documents_complete(db: Session, funcionario_id: int):
+    """Aprovado com documentação pendente passa a APROVADO quando todos os documentos ficam em ordem."""
+    funcionario = db.query(models.Funcionario).filter(models.Funcionario.id == funcionario_id).first()
+    if not funcionario or not documentary_status(db, funcionario)["is_ready"]:
+        return
+
+    current_st = latest_status(db, funcionario.id)
+    if current_st and current_st.statusIntegracao == "APROVADO (COM DOCUMENTAÇÃO PENDENTE)":
+        db.add(models.StatusFuncionario(
+            funcionarioId=funcionario.id,
+            funcionarioNome=current_st.funcionarioNome,
+            statusIntegracao="APROVADO",
+            data=datetime.now(),
+            tipo="Aprovação Automática (Documentação Completa)",
+            contratoId=current_st.contratoId,
+            empresaId=current_st.empresaId
+        ))
+
+
+def inactivate_empresa_employees(db: Session, empresa_id: int):
+    """Empresa inativada: novo status INATIVO para cada funcionário ainda ativo (cópia do status atual)."""
+    latest_ids = db.query(
+        models.StatusFuncionario.funcionarioId,
+        func.max(models.StatusFuncionario.id).label("latest_id")
+    ).group_by(models.StatusFuncionario.funcionarioId).subquery()
+
+    latest_statuses = db.query(models.StatusFuncionario).join(
+        latest_ids, models.StatusFuncionario.id == latest_ids.c.latest_id
+    ).join(
+        models.Funcionario, models.Funcionario.id == models.StatusFuncionario.funcionarioId
+    ).filter(
+        models.Funcionario.empresaId == empresa_id,
+        or_(models.StatusFuncionario.statusContratual == None, models.StatusFuncionario.statusContratual != "INATIVO")
+    ).all()
+
+    for latest in latest_statuses:
+        db.add(models.StatusFuncionario(
+            statusContratual="INATIVO",
+            statusIntegracao=latest.statusIntegracao,
+            funcionarioId=latest.funcionarioId,
+            funcionarioNome=latest.funcionarioNome,
+            funcaoId=latest.funcaoId,
+            funcao=latest.funcao,
+            cargoId=latest.cargoId,
+            cargo=latest.cargo,
+            setorId=latest.setorId,
+            setor=latest.setor,
+            unidadeIntegracaoId=latest.unidadeIntegracaoId,
+            unidadeIntegracao=latest.unidadeIntegracao,
+            unidadeAtividadeId=latest.unidadeAtividadeId,
+            unidadeAtividade=latest.unidadeAtividade,
+            empresaId=latest.empresaId,
+            empresaNome=latest.empresaNome,
+            dataIntegracao=latest.dataIntegracao,
+            dataAso=latest.dataAso,
+            dataValidadeAso=latest.dataValidadeAso,
+            dataValidadeIntegracao=latest.dataValidadeIntegracao,
+            prazoAsoDias=latest.prazoAsoDias,
+            prazoIntegracaoDias=latest.prazoIntegracaoDias,
+            contratoId=latest.contratoId,
+            contratoNome=latest.contratoNome,
+            versao=latest.versao,
+            data=datetime.now(),
+            tipo="modificacao_automatica_empresa"
+        ))
@@ -0,0 +1,304 @@
+import os
+import re
+import zipfile
+import tempfile
+from datetime import datetime
+from sqlalchemy import select, func
+from sqlalchemy.orm import Session
+import models
+from services_pdf import PDFBranding, PDFReport
+from services_pool import cpu_pool
+
+# Histórico de documentação de integração (PDF por funcionário), individual ou em lote.
+# Os dados são carregados em poucas consultas em lote e a renderização (CPU) vai para o pool de processos.
+HISTORICO_TITLE = 'Histórico de Documentação de Integração'
+HISTORICO_BULK_MAX = int(os.getenv("HISTORICO_BULK_MAX", "2000"))
+HISTORICO_RENDER_CHUNK = 16  # históricos por tarefa do pool no lote ZIP
+HISTORICO_SPOOL_MAX_BYTES = 32 * 1024 * 1024
+HISTORICO_IN_CHUNK = 500  # ids por consulta IN (limite de parâmetros do SQLite)
+
+HISTORICO_BULK_FORMATS = {
+    "zip": "application/zip",
+    "pdf": "application/pdf",
+}
+
+
+class HistoricoFuncionario:
+    """Dados de um histórico já carregados, só com valores simples (podem ir para outro processo)."""
+
+    def __init__(self, id: int, nome: str, empresa: str = None, contrato: str = None, status: dict = None, anexos: list = None):
+        self.id = id
+        self.nome = nome
+        self.empresa = empresa
+        self.contrato = contrato
+        self.status = status
+        self.anexos = anexos or []
+
+
+def _chunks(values: list, size: int = HISTORICO_IN_CHUNK):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def load_employee_histories(db: Session, funcionario_ids: list = None, empresa_id: int = None, contrato_id: int = None):
+    """
+    Carrega os históricos dos funcionários filtrados, ordenados por nome.
+    Funcionário, último status, empresa e contrato vêm de uma consulta com joins; anexos (só metadados,
+    sem o binário) e aprovações vêm em consultas IN por lote e são agrupados em memória.
+    """
+    latest_status_ids = select(
+        models.StatusFuncionario.funcionarioId,
+        func.max(models.StatusFuncionario.id).label("latest_id")
+    ).group_by(models.StatusFuncionario.funcionarioId).subquery()
+
+    status = models.StatusFuncionario
+    statement = select(
+        models.Funcionario.id,
+        models.Funcionario.nome,
+        models.Empresa.nome.label("empresaNome"),
+        models.Contrato.nome.label("contratoNome"),
+        status.id.label("statusId"),
+        status.statusIntegracao, status.funcao, status.cargo,
+        status.dataAso, status.dataValidadeAso, status.dataIntegracao, status.dataValidadeIntegracao,
+    ).outerjoin(
+        models.Empresa, models.Funcionario.empresaId == models.Empresa.id
+    ).outerjoin(
+        models.Contrato, models.Funcionario.contratoId == models.Contrato.id
+    ).outerjoin(
+        latest_status_ids, models.Funcionario.id == latest_status_ids.c.funcionarioId
+    ).outerjoin(
+        status, latest_status_ids.c.latest_id == status.id
+    ).order_by(models.Funcionario.nome, models.Funcionario.id)
+
+    if funcionario_ids is not None:
+        statement = statement.where(models.Funcionario.id.in_(funcionario_ids))
+    if empresa_id:
+        statement = statement.where(models.Funcionario.empresaId == empresa_id)
+    if contrato_id:
+        statement = statement.where(models.Funcionario.contratoId == contrato_id)
+
+    historicos = {}
+    for row in db.execute(statement):
+        historicos[row.id] = HistoricoFuncionario(
+            row.id,
+            row.nome,
+            empresa=row.empresaNome,
+            contrato=row.contratoNome,
+            status={
+                "statusIntegracao": row.statusIntegracao,
+                "funcao": row.funcao,
+                "cargo": row.cargo,
+                "dataAso": row.dataAso,
+                "dataValidadeAso": row.dataValidadeAso,
+                "dataIntegracao": row.dataIntegracao,
+                "dataValidadeIntegracao": row.dataValidadeIntegracao,
+            } if row.statusId else None,
+        )
+
+    anexos = {}
+    for ids in _chunks(list(historicos)):
+        for anexo in db.query(
+            models.AnexoFuncionario.id, models.AnexoFuncionario.funcionarioId, models.AnexoFuncionario.tipo,
+            models.AnexoFuncionario.status, models.AnexoFuncionario.uploadDate
+        ).filter(models.AnexoFuncionario.funcionarioId.in_(ids)).order_by(models.AnexoFuncionario.id):
+            anexos[anexo.id] = {
+                "tipo": anexo.tipo,
+                "status": anexo.status,
+                "uploadDate": anexo.uploadDate,
+                "aprovacoes": [],
+            }
+            historicos[anexo.funcionarioId].anexos.append(anexos[anexo.id])
+
+    for ids in _chunks(list(anexos)):
+        for aprovacao in db.query(
+            models.Aprovacao.anexoFuncionarioId, models.Aprovacao.data, models.Aprovacao.perfilNome,
+            models.Aprovacao.status, models.Aprovacao.obs
+        ).filter(models.Aprovacao.anexoFuncionarioId.in_(ids)).order_by(models.Aprovacao.id):
+            anexos[aprovacao.anexoFuncionarioId]["aprovacoes"].append({
+                "data": aprovacao.data,
+                "perfilNome": aprovacao.perfilNome,
+                "status": aprovacao.status,
+                "obs": aprovacao.obs,
+            })
+
+    return list(historicos.values())
+
+
+# --- Renderização (sem acesso ao banco; roda no processo da API ou no pool) ---
+
+def _format_date(value):
+    return value.strftime("%d/%m/%Y") if value else "-"
+
+
+def _approval_table_header(pdf: PDFReport):
+    pdf.set_font('helvetica', 'B', 8)
+    pdf.cell(40, 5, "Data/Hora", border=1, fill=True)
+    pdf.cell(40, 5, "Responsável", border=1, fill=True)
+    pdf.cell(30, 5, "Ação", border=1, fill=True)
+    pdf.cell(80, 5, "Observação", border=1, ln=True, fill=True)
+
+
+def draw_employee_history(pdf: PDFReport, historico: HistoricoFuncionario):
+    """Desenha o histórico de um funcionário a partir da posição atual do documento."""
+    status = historico.status
+
+    pdf.set_font('helvetica', 'B', 12)
+    pdf.set_fill_color(240, 240, 240)
+    pdf.cell(0, 8, 'Dados do Colaborador', ln=True, fill=True)
+
+    pdf.set_font('helvetica', '', 10)
+    pdf.ln(2)
+
+    def draw_info_row(label1, value1, label2=None, value2=None):
+        pdf.set_font('helvetica', 'B', 10)
+        pdf.cell(35, 6, label1, border=0)
+        pdf.set_font('helvetica', '', 10)
+        pdf.cell(60, 6, value1, border=0)
+
+        if label2:
+            pdf.set_font('helvetica', 'B', 10)
+            pdf.cell(35, 6, label2, border=0)
+            pdf.set_font('helvetica', '', 10)
+            pdf.cell(60, 6, value2, border=0)
+        pdf.ln(6)
+
+    draw_info_row("Nome:", historico.nome[:40], "Status:", (status["statusIntegracao"] if status else None) or "PENDENTE")
+    draw_info_row("Empresa:", historico.empresa[:30] if historico.empresa else "-", "Contrato:", historico.contrato[:30] if historico.contrato else "-")
+
+    if status:
+        draw_info_row("Função:", status["funcao"] or "-", "Cargo:", status["cargo"] or "-")
+        draw_info_row("Data ASO:", _format_date(status["dataAso"]), "Validade ASO:", _format_date(status["dataValidadeAso"]))
+        draw_info_row("Integração:", _format_date(status["dataIntegracao"]), "Validade Int.:", _format_date(status["dataValidadeIntegracao"]))
+
+    pdf.ln(8)
+
+    # Documentation History
+    pdf.set_font('helvetica', 'B', 12)
+    pdf.cell(0, 8, 'Histórico de Validação de Documentos', ln=True, fill=True)
+    pdf.ln(2)
+
+    if not historico.anexos:
+        pdf.set_font('helvetica', 'I', 10)
+        pdf.cell(0, 10, "Nenhum documento enviado até o momento.", ln=True, align='C')
+        return
+
+    for anexo in historico.anexos:
+        # Check page break
+        if pdf.get_y() > 250:
+            pdf.add_page()
+
+        # Document Header
+        pdf.set_font('helvetica', 'B', 11)
+        pdf.cell(0, 8, f"Documento: {anexo['tipo']}", ln=True, border='B')
+
+        # Current Status
+        pdf.set_font('helvetica', '', 9)
+        pdf.cell(30, 6, "Status Atual:", border=0)
+        pdf.set_font('helvetica', 'B', 9)
+        pdf.cell(50, 6, anexo["status"] or "-", border=0)
+        pdf.set_font('helvetica', '', 9)
+        pdf.cell(30, 6, "Enviado em:", border=0)
+        pdf.cell(50, 6, anexo["uploadDate"].strftime("%d/%m/%Y %H:%M") if anexo["uploadDate"] else "-", border=0, ln=True)
+
+        if anexo["aprovacoes"]:
+            pdf.ln(2)
+            _approval_table_header(pdf)
+
+            pdf.set_font('helvetica', '', 8)
+            for h in anexo["aprovacoes"]:
+                # Check page break inside table
+                if pdf.get_y() > 260:
+                    pdf.add_page()
+                    _approval_table_header(pdf)
+                    pdf.set_font('helvetica', '', 8)
+
+                pdf.cell(40, 5, h["data"].strftime("%d/%m/%Y %H:%M") if h["data"] else "-", border=1)
+                pdf.cell(40, 5, h["perfilNome"][:20], border=1)
+                pdf.cell(30, 5, h["status"], border=1)
+                pdf.cell(80, 5, (h["obs"] or "-")[:60], border=1, ln=True)
+        else:
+            pdf.ln(1)
+            pdf.set_font('helvetica', 'I', 8)
+            pdf.cell(0, 5, "Sem histórico de aprovações registrado.", ln=True)
+
+        pdf.ln(4)
+
+
+def render_employee_history(branding: PDFBranding, historico: HistoricoFuncionario):
+    """PDF individual do histórico (bytes)."""
+    pdf = PDFReport(branding, HISTORICO_TITLE)
+    pdf.add_page()
+    draw_employee_history(pdf, historico)
+    return bytes(pdf.output())
+
+
+def render_employee_histories(branding: PDFBranding, historicos: list):
+    """PDFs individuais de uma parte do lote (uma tarefa do pool por parte, não por funcionário)."""
+    return [render_employee_history(branding, historico) for historico in historicos]
+
+
+def render_merged_histories(branding: PDFBranding, historicos: list, subtitle: str = None):
+    """Um único PDF com todos os históricos, um funcionário por página inicial, com marcadores (outline)."""
+    pdf = PDFReport(branding, HISTORICO_TITLE, subtitle)
+    for historico in historicos:
+        pdf.add_page()
+        pdf.start_section(historico.nome)
+        draw_employee_history(pdf, historico)
+    return bytes(pdf.output())
+
+
+def history_filename(historico: HistoricoFuncionario):
+    nome = re.sub(r"[^\w-]+", "_", historico.nome).strip("_")
+    return f"historico_integracao_{nome}_{historico.id}.pdf"
+
+
+def check_bulk_format(fmt: str):
+    if fmt not in HISTORICO_BULK_FORMATS:
+        raise ValueError(f"Formato inválido: {fmt}. Use {' ou '.join(HISTORICO_BULK_FORMATS)}")
+
+
+def write_bulk_histories(output, fmt: str, branding: PDFBranding, historicos: list, subtitle: str = None):
+    """
+    Grava o lote em `output`: ZIP com um PDF por funcionário (partes renderizadas em paralelo
+    no pool) ou um PDF único com marcadores (um documento só, renderizado em um processo do pool).
+    """
+    check_bulk_format(fmt)
+    if fmt == "pdf":
+        output.write(cpu_pool.run(render_merged_histories, branding, historicos, subtitle, wait=True))
+        return
+
+    chunksize = max(1, min(HISTORICO_RENDER_CHUNK, len(historicos) // (cpu_pool.max_workers * 4)))
+    chunks = [historicos[start:start + chunksize] for start in range(0, len(historicos), chunksize)]
+    with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as archive:
+        for chunk, rendered in zip(chunks, cpu_pool.map(render_employee_histories, chunks, branding)):
+            for historico, content in zip(chunk, rendered):
+                archive.writestr(history_filename(historico), content)
+
+
+def iter_bulk_histories(fmt: str, branding: PDFBranding, historicos: list, subtitle: str = None, chunk_size: int = 64 * 1024):
+    """Gera os bytes do lote para StreamingResponse (renderiza em arquivo temporário e transmite)."""
+    with tempfile.SpooledTemporaryFile(max_size=HISTORICO_SPOOL_MAX_BYTES) as output:
+        write_bulk_histories(output, fmt, branding, historicos, subtitle)
+        output.seek(0)
+        while True:
+            chunk = output.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def bulk_subtitle(historicos: list, empresa_id: int = None, contrato_id: int = None):
+    parts = []
+    if historicos and empresa_id:
+        parts.append(f"Empresa: {historicos[0].empresa or empresa_id}")
+    if historicos and contrato_id:
+        parts.append(f"Contrato: {historicos[0].contrato or contrato_id}")
+    return " - ".join(parts) or None
+
+
+def bulk_filename(fmt: str, empresa_id: int = None, contrato_id: int = None):
+    scope = "_".join(part for part in (
+        f"empresa_{empresa_id}" if empresa_id else None,
+        f"contrato_{contrato_id}" if contrato_id else None,
+    ) if part)
+    return f"historicos_integracao_{scope}_{datetime.now().strftime('%Y%m%d')}.{fmt}"
@@ -0,0 +1,295 @@
+import io
+import os
+import json
+import time
+import uuid
+import socket
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy.orm import Session
+import models
+from models import SessionLocal
+from services import ReportingService
+from services_snapshots import CuboSnapshotScheduler
+from services_historico import HISTORICO_BULK_FORMATS, load_employee_histories, write_bulk_histories, bulk_subtitle, bulk_filename
+from services_pdf import branding_cache
+from services_cache import cached_report
+from services_dashboard import dashboard_stats
+from services_retention import run_retention_if_due
+
+# Fila de relatórios em segundo plano, persistida na tabela relatorioJobs.
+# Não depende de broker externo: os workers (threads da API ou worker.py) fazem polling na tabela.
+JOB_TTL_HOURS = int(os.getenv("REPORT_JOB_TTL_HOURS", "24"))
+JOB_TIMEOUT_MINUTES = int(os.getenv("REPORT_JOB_TIMEOUT_MINUTES", "30"))
+JOB_MAX_ATTEMPTS = int(os.getenv("REPORT_JOB_MAX_ATTEMPTS", "2"))
+JOB_POLL_SECONDS = float(os.getenv("REPORT_JOB_POLL_SECONDS", "2"))
+JOB_PROGRESS_INTERVAL_SECONDS = 1.0
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+class JobProgress:
+    """Grava o progresso do job em uma sessão própria, no máximo uma vez por intervalo."""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self._last = 0.0
+
+    def update(self, progresso: int, mensagem: str = None, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._last < JOB_PROGRESS_INTERVAL_SECONDS:
+            return
+        self._last = now
+        db = SessionLocal()
+        try:
+            db.query(models.RelatorioJob).filter(models.RelatorioJob.id == self.job_id).update(
+                {"progresso": progresso, "mensagem": mensagem}, synchronize_session=False
+            )
+            db.commit()
+        finally:
+            db.close()
+
+
+class RowProgress:
+    """Callback de linhas processadas; serializável, para a planilha montada no pool de processos."""
+
+    def __init__(self, progress: JobProgress):
+        self.progress = progress
+
+    def __call__(self, linhas: int):
+        self.progress.update(50, f"{linhas} linhas processadas")
+
+
+# --- Renderizadores por tipo: (db, parametros, progresso) -> (conteúdo, filename, media type) ---
+
+def _render_cubo_custom(db: Session, params: dict, progress: JobProgress):
+    service = ReportingService(db)
+    if params.get("group_by") or params.get("measures"):
+        excel_file = service.generate_custom_cube_aggregate_excel(
+            params.get("group_by"), params.get("measures"), params.get("date_filter"),
+            params.get("filters"), params.get("include_history", False)
+        )
+        filename = f"planilha_cubo_agregado_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+        try:
+            return excel_file.read(), filename, XLSX_MEDIA_TYPE
+        finally:
+            excel_file.close()
+
+    excel_file = service.generate_custom_cube_excel(
+        params.get("columns") or [],
+        params.get("date_filter"),
+        params.get("filters"),
+        params.get("include_history", False),
+        progress=RowProgress(progress),
+    )
+    try:
+        content = excel_file.read()
+    finally:
+        excel_file.close()
+    filename = f"planilha_cubo_custom_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    return content, filename, XLSX_MEDIA_TYPE
+
+
+def _render_integracoes_agendadas(db: Session, params: dict, progress: JobProgress):
+    service = ReportingService(db)
+    args = (params["data_inicio"], params["data_fim"], params.get("unidade_id"), params.get("empresa_id"))
+    content = cached_report(service.scheduled_integration_cache_key(*args), lambda: service.generate_scheduled_integration_report(*args))
+    if not content:
+        raise LookupError("Nenhum registro encontrado para o período/filtros selecionados.")
+    filename = f"relatorio_integracoes_{params['data_inicio']}_a_{params['data_fim']}.pdf"
+    return content, filename, "application/pdf"
+
+
+def _render_historico_pdf(db: Session, params: dict, progress: JobProgress):
+    funcionario = db.query(models.Funcionario).filter(models.Funcionario.id == params["funcionario_id"]).first()
+    if not funcionario:
+        raise LookupError("Funcionário não encontrado")
+    service = ReportingService(db)
+    content = cached_report(service.employee_history_cache_key(funcionario.id), lambda: service.generate_employee_history_pdf(funcionario.id))
+    if not content:
+        raise LookupError("Erro ao gerar relatório")
+    filename = f"historico_integracao_{funcionario.nome.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}.pdf"
+    return content, filename, "application/pdf"
+
+
+def _render_historico_pdf_lote(db: Session, params: dict, progress: JobProgress):
+    fmt = params.get("format") or "zip"
+    historicos = load_employee_histories(db, empresa_id=params.get("empresa_id"), contrato_id=params.get("contrato_id"))
+    if not historicos:
+        raise LookupError("Nenhum funcionário encontrado para os filtros informados")
+    progress.update(30, f"Gerando {len(historicos)} históricos", force=True)
+    output = io.BytesIO()
+    write_bulk_histories(
+        output, fmt, branding_cache.get(db), historicos,
+        bulk_subtitle(historicos, params.get("empresa_id"), params.get("contrato_id"))
+    )
+    filename = bulk_filename(fmt, params.get("empresa_id"), params.get("contrato_id"))
+    return output.getvalue(), filename, HISTORICO_BULK_FORMATS[fmt]
+
+
+JOB_RENDERERS = {
+    "cubo-custom": _render_cubo_custom,
+    "integracoes-agendadas": _render_integracoes_agendadas,
+    "historico-pdf": _render_historico_pdf,
+    "historico-pdf-lote": _render_historico_pdf_lote,
+}
+
+
+class ReportJobService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def submit(self, tipo: str, parametros: dict, current_user: dict):
+        if tipo not in JOB_RENDERERS:
+            raise ValueError(f"Tipo de relatório desconhecido: {tipo}")
+        job = models.RelatorioJob(
+            id=uuid.uuid4().hex,
+            tipo=tipo,
+            parametros=json.dumps(parametros, default=str),
+            status="PENDENTE",
+            progresso=0,
+            userId=current_user["data"].id if current_user["type"] == "user" else None,
+            empresaId=current_user["data"].id if current_user["type"] == "empresa" else None,
+        )
+        self.db.add(job)
+        self.db.commit()
+        self.db.refresh(job)
+        return job
+
+    def get_for_user(self, job_id: str, current_user: dict):
+        query = self.db.query(models.RelatorioJob).filter(models.RelatorioJob.id == job_id)
+        return self._owned(query, current_user).first()
+
+    def list_for_user(self, current_user: dict, limit: int = 20):
+        query = self.db.query(models.RelatorioJob).order_by(models.RelatorioJob.createdAt.desc())
+        return self._owned(query, current_user).limit(limit).all()
+
+    def _owned(self, query, current_user: dict):
+        if current_user["type"] == "empresa":
+            return query.filter(models.RelatorioJob.empresaId == current_user["data"].id)
+        if current_user["permissions"].get("isAdmin"):
+            return query
+        return query.filter(models.RelatorioJob.userId == current_user["data"].id)
+
+    def claim_next(self, worker_id: str):
+        """Reserva o próximo job PENDENTE. O UPDATE condicional evita que dois workers peguem o mesmo job."""
+        query = self.db.query(models.RelatorioJob.id).filter(
+            models.RelatorioJob.status == "PENDENTE"
+        ).order_by(models.RelatorioJob.createdAt)
+        if self.db.bind.dialect.name == "postgresql":
+            query = query.with_for_update(skip_locked=True)
+        candidate = query.first()
+        if not candidate:
+            self.db.rollback()
+            return None
+
+        claimed = self.db.query(models.RelatorioJob).filter(
+            models.RelatorioJob.id == candidate.id,
+            models.RelatorioJob.status == "PENDENTE"
+        ).update({
+            "status": "PROCESSANDO",
+            "workerId": worker_id,
+            "startedAt": datetime.now(),
+            "tentativas": models.RelatorioJob.tentativas + 1,
+            "progresso": 0,
+            "mensagem": None,
+        }, synchronize_session=False)
+        self.db.commit()
+        if not claimed:
+            return None
+        return self.db.query(models.RelatorioJob).filter(models.RelatorioJob.id == candidate.id).first()
+
+    def run(self, job: models.RelatorioJob):
+        progress = JobProgress(job.id)
+        progress.update(5, "Gerando relatório", force=True)
+        render_db = SessionLocal()
+        try:
+            content, filename, media_type = JOB_RENDERERS[job.tipo](render_db, json.loads(job.parametros), progress)
+        except Exception as e:
+            render_db.rollback()
+            self._finish(job.id, status="ERRO", mensagem=str(e) or e.__class__.__name__)
+            print(f"Erro no job de relatório {job.id} ({job.tipo}): {e}")
+            return False
+        finally:
+            render_db.close()
+
+        self._finish(job.id, status="CONCLUIDO", mensagem=None, resultado=content,
+                     filename=filename, mediaType=media_type, tamanho=len(content))
+        return True
+
+    def _finish(self, job_id: str, **values):
+        now = datetime.now()
+        values.update({"progresso": 100, "finishedAt": now, "expiresAt": now + timedelta(hours=JOB_TTL_HOURS)})
+        self.db.query(models.RelatorioJob).filter(models.RelatorioJob.id == job_id).update(values, synchronize_session=False)
+        self.db.commit()
+
+    def requeue_stale(self):
+        """Jobs PROCESSANDO há mais que o timeout (worker caiu) voltam para a fila ou falham."""
+        limit = datetime.now() - timedelta(minutes=JOB_TIMEOUT_MINUTES)
+        stale = models.RelatorioJob.status == "PROCESSANDO", models.RelatorioJob.startedAt < limit
+        self.db.query(models.RelatorioJob).filter(
+            *stale, models.RelatorioJob.tentativas < JOB_MAX_ATTEMPTS
+        ).update({"status": "PENDENTE", "workerId": None}, synchronize_session=False)
+        self.db.query(models.RelatorioJob).filter(*stale).update({
+            "status": "ERRO",
+            "mensagem": "Tempo limite de processamento excedido",
+            "finishedAt": datetime.now(),
+            "expiresAt": datetime.now() + timedelta(hours=JOB_TTL_HOURS),
+        }, synchronize_session=False)
+        self.db.commit()
+
+    def purge_expired(self):
+        removed = self.db.query(models.RelatorioJob).filter(
+            models.RelatorioJob.expiresAt != None,
+            models.RelatorioJob.expiresAt < datetime.now()
+        ).delete(synchronize_session=False)
+        self.db.commit()
+        return removed
+
+
+def run_worker(stop_event: threading.Event = None, worker_id: str = None, maintenance_interval: float = 60.0):
+    """
+    Loop do worker: reserva e executa jobs até stop_event ser sinalizado; na manutenção executa
+    os snapshots agendados, reconcilia os contadores do dashboard e arquiva o histórico antigo.
+    """
+    stop_event = stop_event or threading.Event()
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+    last_maintenance = 0.0
+
+    while not stop_event.is_set():
+        db = SessionLocal()
+        try:
+            service = ReportJobService(db)
+            if time.monotonic() - last_maintenance > maintenance_interval:
+                service.requeue_stale()
+                removed = service.purge_expired()
+                if removed:
+                    print(f"Jobs de relatório expirados removidos: {removed}")
+                materialized = CuboSnapshotScheduler(db).run_due()
+                if materialized:
+                    print(f"Snapshots do cubo materializados: {materialized}")
+                dashboard_stats.reconcile_if_due(db)
+                archived = run_retention_if_due(db)
+                if archived and any(archived.values()):
+                    print(f"Histórico arquivado: {archived}")
+                last_maintenance = time.monotonic()
+
+            job = service.claim_next(worker_id)
+            if job:
+                service.run(job)
+                continue
+        except Exception as e:
+            db.rollback()
+            print(f"Erro no worker de relatórios: {e}")
+        finally:
+            db.close()
+        stop_event.wait(JOB_POLL_SECONDS)
+
+
+def start_worker_threads(count: int, stop_event: threading.Event):
+    threads = []
+    for i in range(count):
+        thread = threading.Thread(target=run_worker, kwargs={"stop_event": stop_event}, name=f"relatorio-worker-{i}", daemon=True)
+        thread.start()
+        threads.append(thread)
+    return threads
@@ -0,0 +1,129 @@
+import io
+import time
+import base64
+import threading
+from datetime import datetime
+from fpdf import FPDF
+from PIL import Image
+from sqlalchemy.orm import Session
+import models
+from services_cache import table_versions
+
+# Identidade visual dos PDFs (nome da empresa e logo da Configuração), decodificada uma vez
+# por versão da configuração e reaproveitada por todos os relatórios.
+BRANDING_RECHECK_SECONDS = 60
+DEFAULT_COMPANY_NAME = "Gestão de Contratos"
+
+
+class PDFBranding:
+    def __init__(self, version, nome_empresa: str, logo=None):
+        self.version = version
+        self.nome_empresa = nome_empresa
+        # Imagem PIL já decodificada (base64 + formato do arquivo), compartilhada pelos relatórios
+        self.logo = logo
+
+
+class BrandingCache:
+    """
+    Mantém o PDFBranding da versão atual da Configuração (id + updatedAt).
+    Escritas na tabela neste processo invalidam na hora; escritas de outros processos
+    são percebidas na próxima verificação (a cada BRANDING_RECHECK_SECONDS).
+    """
+
+    def __init__(self):
+        self._branding = None
+        self._table_version = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def get(self, db: Session):
+        with self._lock:
+            table_version = table_versions.get(("configuracoes",))
+            if (
+                self._branding is not None
+                and self._table_version == table_version
+                and time.monotonic() - self._checked_at < BRANDING_RECHECK_SECONDS
+            ):
+                return self._branding
+
+            # Escrita conhecida neste processo recarrega sempre (updatedAt tem resolução de segundos);
+            # na verificação periódica só recarrega se id/updatedAt mudaram
+            row = db.query(models.Configuracao.id, models.Configuracao.updatedAt).order_by(models.Configuracao.id).first()
+            version = (row.id, row.updatedAt) if row else None
+            if self._branding is None or self._table_version != table_version or self._branding.version != version:
+                self._branding = self._load(db, version)
+                self.loads += 1
+            self._table_version = table_version
+            self._checked_at = time.monotonic()
+            return self._branding
+
+    def clear(self):
+        with self._lock:
+            self._branding = None
+
+    @staticmethod
+    def _load(db: Session, version):
+        if version is None:
+            return PDFBranding(None, DEFAULT_COMPANY_NAME)
+
+        config = db.query(models.Configuracao.nomeEmpresa, models.Configuracao.logoImage).filter(
+            models.Configuracao.id == version[0]
+        ).first()
+        branding = PDFBranding(version, config.nomeEmpresa or DEFAULT_COMPANY_NAME)
+        if config.logoImage:
+            try:
+                header_logo = config.logoImage
+                if "," in header_logo:
+                    header_logo = header_logo.split(",")[1]
+                logo = Image.open(io.BytesIO(base64.b64decode(header_logo)))
+                logo.load()
+                branding.logo = logo
+            except Exception as e:
+                print(f"Error loading logo in PDF: {e}")
+        return branding
+
+
+branding_cache = BrandingCache()
+
+
+class PDFReport(FPDF):
+    """
+    Relatório com cabeçalho (logo e título na primeira página) e rodapé padrão
+    (data de geração e número da página). O logo vem do branding em cache.
+    """
+
+    def __init__(self, branding: PDFBranding, title: str, subtitle: str = None, footer: bool = True, **kwargs):
+        super().__init__(**kwargs)
+        self.branding = branding
+        self.report_title = title
+        self.report_subtitle = subtitle
+        self.show_footer = footer
+        self.generated_at = datetime.now().strftime("%d/%m/%Y %H:%M")
+
+    def header(self):
+        if self.page != 1:
+            return
+        if self.branding.logo is not None:
+            self.image(self.branding.logo, x=10, y=8, h=15)
+        self.set_y(25)
+        self.set_font('helvetica', 'B', 16)
+        self.cell(0, 8, self.report_title, ln=True, align='C')
+        if self.report_subtitle:
+            self.set_font('helvetica', '', 11)
+            self.cell(0, 6, self.report_subtitle, ln=True, align='C')
+        self.ln(5)
+
+    def footer(self):
+        if not self.show_footer:
+            return
+        self.set_y(-15)
+        self.set_font('helvetica', 'I', 8)
+        self.cell(0, 10, f'Relatório gerado em {self.generated_at} - Página {self.page_no()}/{{nb}}', 0, 0, 'C')
+
+
+def new_report(db: Session, title: str, subtitle: str = None, footer: bool = True):
+    """PDFReport com a primeira página aberta e o branding atual."""
+    pdf = PDFReport(branding_cache.get(db), title, subtitle, footer)
+    pdf.add_page()
+    return pdf
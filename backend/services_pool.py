@@ -0,0 +1,174 @@
+import os
+import time
+import asyncio
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# Pool de processos para trabalho de CPU (renderização de PDF, montagem de XLSX).
+# Tira o trabalho pesado do GIL do processo da API: a thread da requisição só espera o resultado.
+CPU_POOL_ENABLED = os.getenv("CPU_POOL_ENABLED", "1") == "1"
+CPU_POOL_WORKERS = int(os.getenv("CPU_POOL_WORKERS", str(min(4, os.cpu_count() or 1))))
+CPU_POOL_MAX_QUEUE = int(os.getenv("CPU_POOL_MAX_QUEUE", "16"))
+# spawn: o processo filho não herda threads, locks nem conexões do processo da API
+CPU_POOL_START_METHOD = os.getenv("CPU_POOL_START_METHOD", "spawn")
+
+_in_pool_worker = False
+
+
+class CPUPoolBusy(Exception):
+    """Todas as vagas do pool (execução + fila) ocupadas; a requisição deve ser repetida depois."""
+    status_code = 503
+
+
+def _init_pool_worker(start_method: str):
+    global _in_pool_worker
+    _in_pool_worker = True
+    if start_method == "fork":
+        # Conexões herdadas do processo pai não podem ser usadas pelo filho
+        import models
+        models.engine.dispose(close=False)
+
+
+class CPUPool:
+    """
+    ProcessPoolExecutor com concorrência e fila limitadas e métricas de uso.
+    Até max_workers tarefas executando e max_queue esperando; além disso submit()
+    levanta CPUPoolBusy (ou espera uma vaga, com wait=True).
+    Desabilitado (ou chamado de dentro de um processo do pool), executa na própria thread.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int, start_method: str = "spawn", enabled: bool = True):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self.start_method = start_method
+        self.enabled = enabled and max_workers > 0
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_queue)
+        self._executor = None
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.restarts = 0
+        self._total_seconds = 0.0
+        self._max_seconds = 0.0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context(self.start_method),
+                    initializer=_init_pool_worker,
+                    initargs=(self.start_method,),
+                )
+            return self._executor
+
+    def submit(self, fn, *args, wait: bool = False, **kwargs):
+        if not self.enabled or _in_pool_worker:
+            return _run_inline(fn, *args, **kwargs)
+
+        if not self._slots.acquire(blocking=wait):
+            with self._lock:
+                self.rejected += 1
+            raise CPUPoolBusy("Servidor ocupado gerando outros relatórios. Tente novamente em instantes.")
+
+        with self._lock:
+            self._inflight += 1
+            self.submitted += 1
+        started = time.monotonic()
+        executor = None
+        try:
+            executor = self._get_executor()
+            future = executor.submit(fn, *args, **kwargs)
+        except Exception as e:
+            self._finish(executor, started, e)
+            raise
+        future.add_done_callback(lambda f: self._finish(executor, started, f.exception()))
+        return future
+
+    def _finish(self, executor, started: float, error):
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self._inflight -= 1
+            self._total_seconds += elapsed
+            self._max_seconds = max(self._max_seconds, elapsed)
+            if error is None:
+                self.completed += 1
+            else:
+                self.failed += 1
+            # Um processo filho morreu (ex.: falta de memória): o executor fica inutilizável
+            if isinstance(error, BrokenProcessPool) and executor is not None and self._executor is executor:
+                self._executor = None
+                self.restarts += 1
+        self._slots.release()
+
+    def run(self, fn, *args, wait: bool = False, **kwargs):
+        """Executa no pool e espera o resultado (para código síncrono; a thread fica livre do GIL)."""
+        return self.submit(fn, *args, wait=wait, **kwargs).result()
+
+    async def run_async(self, fn, *args, wait: bool = False, **kwargs):
+        return await asyncio.wrap_future(self.submit(fn, *args, wait=wait, **kwargs))
+
+    def map(self, fn, items, *args):
+        """
+        fn(*args, item) para cada item, com os resultados na ordem dos itens.
+        Mantém no máximo max_workers tarefas em andamento e espera vaga em vez de rejeitar.
+        """
+        pending = deque()
+        for item in items:
+            if len(pending) >= self.max_workers:
+                yield pending.popleft().result()
+            pending.append(self.submit(fn, *args, item, wait=True))
+        while pending:
+            yield pending.popleft().result()
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        with self._lock:
+            running = min(self._inflight, self.max_workers)
+            finished = self.completed + self.failed
+            return {
+                "nome": self.name,
+                "habilitado": self.enabled,
+                "processos": self.max_workers,
+                "maxFila": self.max_queue,
+                "executando": running,
+                "naFila": self._inflight - running,
+                "utilizacao": round(running / self.max_workers, 4),
+                "submetidas": self.submitted,
+                "concluidas": self.completed,
+                "falhas": self.failed,
+                "rejeitadas": self.rejected,
+                "reinicios": self.restarts,
+                "tempoMedioSegundos": round(self._total_seconds / finished, 4) if finished else 0.0,
+                "tempoMaximoSegundos": round(self._max_seconds, 4),
+            }
+
+
+def _run_inline(fn, *args, **kwargs):
+    future = Future()
+    try:
+        future.set_result(fn(*args, **kwargs))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+cpu_pool = CPUPool(
+    "cpu",
+    max_workers=CPU_POOL_WORKERS,
+    max_queue=CPU_POOL_MAX_QUEUE,
+    start_method=CPU_POOL_START_METHOD,
+    enabled=CPU_POOL_ENABLED,
+)
@@ -0,0 +1,81 @@
+import json
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+import models
+
+# Documentos exigidos por categoria e membros das regras de aprovação (Cubo) como tabelas
+# relacionais: categoriaDocumentos, cuboCategorias e cuboPerfis. As colunas antigas
+# (Categoria.documentosPedidos, Cubo.categoriaIds/perfilIds) continuam gravadas para manter as
+# respostas da API; as tabelas são regravadas a cada escrita e usadas nas consultas.
+
+
+def split_documentos_pedidos(value):
+    """"Doc 1|Doc 2" ou "Doc 1, Doc 2" -> ["Doc 1", "Doc 2"] (sem itens vazios)."""
+    if not value:
+        return []
+    separator = "|" if "|" in value else ","
+    return [nome.strip() for nome in value.split(separator) if nome.strip()]
+
+
+def parse_id_list(value):
+    """Lista de ids de uma lista ou do JSON guardado no Cubo; ignora valores inválidos."""
+    if isinstance(value, str):
+        try:
+            value = json.loads(value) if value else []
+        except json.JSONDecodeError:
+            return []
+    ids = []
+    for item in value or []:
+        try:
+            item = int(item)
+        except (TypeError, ValueError):
+            continue
+        if item not in ids:
+            ids.append(item)
+    return ids
+
+
+def sync_categoria_documentos(db: Session, categoria):
+    db.query(models.CategoriaDocumento).filter(models.CategoriaDocumento.categoriaId == categoria.id).delete(synchronize_session=False)
+    db.add_all([
+        models.CategoriaDocumento(categoriaId=categoria.id, nome=nome, ordem=ordem)
+        for ordem, nome in enumerate(split_documentos_pedidos(categoria.documentosPedidos))
+    ])
+
+
+def delete_categoria_relations(db: Session, categoria_id: int):
+    db.query(models.CategoriaDocumento).filter(models.CategoriaDocumento.categoriaId == categoria_id).delete(synchronize_session=False)
+    db.query(models.CuboCategoria).filter(models.CuboCategoria.categoriaId == categoria_id).delete(synchronize_session=False)
+
+
+def sync_cubo_membros(db: Session, cubo):
+    delete_cubo_relations(db, cubo.id)
+    db.add_all([models.CuboCategoria(cuboId=cubo.id, categoriaId=categoria_id) for categoria_id in parse_id_list(cubo.categoriaIds)])
+    db.add_all([models.CuboPerfil(cuboId=cubo.id, perfilId=perfil_id) for perfil_id in parse_id_list(cubo.perfilIds)])
+
+
+def delete_cubo_relations(db: Session, cubo_id: int):
+    db.query(models.CuboCategoria).filter(models.CuboCategoria.cuboId == cubo_id).delete(synchronize_session=False)
+    db.query(models.CuboPerfil).filter(models.CuboPerfil.cuboId == cubo_id).delete(synchronize_session=False)
+
+
+def authorized_categoria_ids(db: Session, perfil_id: int):
+    """Categorias de todas as regras de aprovação que incluem o perfil."""
+    statement = (
+        select(models.CuboCategoria.categoriaId)
+        .join(models.CuboPerfil, models.CuboPerfil.cuboId == models.CuboCategoria.cuboId)
+        .where(models.CuboPerfil.perfilId == perfil_id)
+        .distinct()
+    )
+    return list(db.execute(statement).scalars())
+
+
+def documentos_exigidos_contrato(db: Session, contrato_id: int):
+    """Nomes dos documentos exigidos pela categoria do contrato, na ordem cadastrada."""
+    statement = (
+        select(models.CategoriaDocumento.nome)
+        .join(models.Contrato, models.Contrato.categoriaId == models.CategoriaDocumento.categoriaId)
+        .where(models.Contrato.id == contrato_id)
+        .order_by(models.CategoriaDocumento.ordem)
+    )
+    return list(db.execute(statement).scalars())
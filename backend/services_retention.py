@@ -0,0 +1,373 @@
+import os
+import gzip
+import json
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete, func, text, DateTime
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+import models
+
+# Retenção das tabelas de histórico (só recebem inserts): linhas mais antigas que a política
+# saem da tabela e vão, comprimidas, para arquivoHistorico, agrupadas por chave de leitura
+# (funcionário, documento, anexo ou mês). Os endpoints de histórico leem o arquivo sob demanda.
+# No Postgres as tabelas podem ser particionadas por mês (scripts/arquivar_historico.py --particionar);
+# a manutenção cria as partições dos próximos meses e remove as partições antigas já esvaziadas.
+# Retenção desativada por padrão (0): linhas arquivadas saem das listagens padrão de histórico,
+# do PDF e das consultas por data (status_as_of), então cada tabela precisa ser ligada de propósito.
+RETENCAO_LOGS_DIAS = int(os.getenv("RETENCAO_LOGS_DIAS", "0"))
+RETENCAO_APROVACOES_DIAS = int(os.getenv("RETENCAO_APROVACOES_DIAS", "0"))
+RETENCAO_STATUS_DIAS = int(os.getenv("RETENCAO_STATUS_DIAS", "0"))
+ARQUIVAMENTO_LOTE = int(os.getenv("ARQUIVAMENTO_LOTE", "5000"))
+ARQUIVAMENTO_INTERVALO_HORAS = float(os.getenv("ARQUIVAMENTO_INTERVALO_HORAS", "24"))
+PARTICOES_MESES_FUTUROS = int(os.getenv("PARTICOES_MESES_FUTUROS", "3"))
+
+
+class RetentionPolicy:
+    """
+    days = 0 desativa a política. keep_latest_by preserva a linha mais recente de cada valor
+    da coluna (o status atual do funcionário nunca é arquivado).
+    """
+
+    def __init__(self, model, date_column: str, days: int, archive_key, keep_latest_by: str = None):
+        self.model = model
+        self.table = model.__tablename__
+        self.date_column = date_column
+        self.days = days
+        self.archive_key = archive_key
+        self.keep_latest_by = keep_latest_by
+
+    def cutoff(self, now: datetime = None):
+        return (now or datetime.now()) - timedelta(days=self.days)
+
+
+def _aprovacao_key(row: dict):
+    if row.get("documentoId") is not None:
+        return f"documento:{row['documentoId']}"
+    return f"anexoFuncionario:{row.get('anexoFuncionarioId')}"
+
+
+RETENTION_POLICIES = {
+    "logs": RetentionPolicy(
+        models.Log, "date", RETENCAO_LOGS_DIAS,
+        lambda row: f"mes:{row['date'].strftime('%Y-%m')}" if row.get("date") else "mes:sem-data"
+    ),
+    "aprovacoes": RetentionPolicy(models.Aprovacao, "createdAt", RETENCAO_APROVACOES_DIAS, _aprovacao_key),
+    "statusFuncionarios": RetentionPolicy(
+        models.StatusFuncionario, "createdAt", RETENCAO_STATUS_DIAS,
+        lambda row: f"funcionario:{row['funcionarioId']}", keep_latest_by="funcionarioId"
+    ),
+}
+
+
+def _encode_rows(rows: list):
+    payload = json.dumps(rows, default=lambda value: value.isoformat() if isinstance(value, datetime) else str(value))
+    return gzip.compress(payload.encode("utf-8"))
+
+
+def _decode_rows(model, dados: bytes):
+    rows = json.loads(gzip.decompress(dados).decode("utf-8"))
+    date_columns = [column.key for column in model.__table__.columns if isinstance(column.type, DateTime)]
+    for row in rows:
+        for key in date_columns:
+            if row.get(key):
+                try:
+                    row[key] = datetime.fromisoformat(row[key])
+                except ValueError:
+                    pass  # arquivado antes da coluna virar DateTime (ex.: aprovacoes.data em texto)
+        row["arquivado"] = True
+    return rows
+
+
+def _old_rows_query(policy: RetentionPolicy, cutoff: datetime, limit: int):
+    model = policy.model
+    date_column = getattr(model, policy.date_column)
+    query = select(model.id).where(date_column < cutoff)
+    if policy.keep_latest_by:
+        group_column = getattr(model, policy.keep_latest_by)
+        query = query.where(model.id.not_in(select(func.max(model.id)).group_by(group_column)))
+    return query.order_by(model.id).limit(limit)
+
+
+def archive_batch(db: Session, policy: RetentionPolicy, cutoff: datetime, batch_size: int = ARQUIVAMENTO_LOTE):
+    """
+    Move um lote de linhas antigas para arquivoHistorico na mesma transação.
+    DELETE ... RETURNING: dois processos arquivando ao mesmo tempo nunca arquivam a mesma linha.
+    """
+    model = policy.model
+    ids = _old_rows_query(policy, cutoff, batch_size).scalar_subquery()
+    columns = list(model.__table__.columns)
+    deleted = db.execute(
+        delete(model).where(model.id.in_(ids)).returning(*columns),
+        execution_options={"synchronize_session": False}
+    ).all()
+    if not deleted:
+        db.rollback()
+        return 0
+
+    groups = defaultdict(list)
+    for row in deleted:
+        data = {column.key: value for column, value in zip(columns, row)}
+        date_value = data.get(policy.date_column)
+        periodo = date_value.strftime("%Y-%m") if date_value else "sem-data"
+        groups[(policy.archive_key(data), periodo)].append(data)
+
+    for (chave, periodo), rows in groups.items():
+        db.add(models.ArquivoHistorico(
+            tabela=policy.table,
+            chave=chave,
+            periodo=periodo,
+            quantidade=len(rows),
+            primeiroId=min(row["id"] for row in rows),
+            ultimoId=max(row["id"] for row in rows),
+            dados=_encode_rows(rows),
+        ))
+    db.commit()
+    return len(deleted)
+
+
+def count_archivable(db: Session, policy: RetentionPolicy, now: datetime = None):
+    ids = _old_rows_query(policy, policy.cutoff(now), None).subquery()
+    return db.execute(select(func.count()).select_from(ids)).scalar()
+
+
+def load_archived_rows(db: Session, tabela: str, chave: str):
+    """Linhas arquivadas de uma chave (ex.: funcionario:12), como dicts com "arquivado": True."""
+    policy = RETENTION_POLICIES[tabela]
+    blobs = db.query(models.ArquivoHistorico.dados).filter(
+        models.ArquivoHistorico.tabela == tabela,
+        models.ArquivoHistorico.chave == chave
+    ).order_by(models.ArquivoHistorico.primeiroId).all()
+    rows = []
+    for (dados,) in blobs:
+        rows.extend(_decode_rows(policy.model, dados))
+    return rows
+
+
+def load_archived_page(db: Session, tabela: str, chave: str, limit: int, before_id: int = None, predicate=None):
+    """
+    Até `limit` linhas arquivadas da chave com id < before_id (e que passam em predicate),
+    em ordem decrescente de id. Descomprime só os blocos necessários: para quando já tem
+    `limit` linhas e nenhum bloco restante pode ter id maior que a última delas.
+    """
+    policy = RETENTION_POLICIES[tabela]
+    query = db.query(models.ArquivoHistorico.id, models.ArquivoHistorico.ultimoId).filter(
+        models.ArquivoHistorico.tabela == tabela,
+        models.ArquivoHistorico.chave == chave
+    )
+    if before_id is not None:
+        query = query.filter(models.ArquivoHistorico.primeiroId < before_id)
+    rows = []
+    for blob_id, ultimo_id in query.order_by(models.ArquivoHistorico.ultimoId.desc()).all():
+        if len(rows) >= limit and ultimo_id < rows[limit - 1]["id"]:
+            break
+        dados = db.query(models.ArquivoHistorico.dados).filter(models.ArquivoHistorico.id == blob_id).scalar()
+        rows.extend(
+            row for row in _decode_rows(policy.model, dados)
+            if (before_id is None or row["id"] < before_id) and (predicate is None or predicate(row))
+        )
+        rows.sort(key=lambda row: row["id"], reverse=True)
+    return rows[:limit]
+
+
+def merge_archived(live_rows: list, archived_rows: list, order_by: str):
+    """Linhas atuais (ORM) + arquivadas (dicts), mais recentes primeiro pela coluna order_by."""
+    def sort_key(row):
+        value = row.get(order_by) if isinstance(row, dict) else getattr(row, order_by)
+        return (value is not None, value or datetime.min)
+    return sorted(list(live_rows) + list(archived_rows), key=sort_key, reverse=True)
+
+
+# --- Particionamento mensal (Postgres) ---
+
+def is_postgres(db: Session):
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def _month_start(value: datetime):
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(value: datetime):
+    return _month_start(value.replace(day=28) + timedelta(days=4))
+
+
+def partition_name(table: str, month: datetime):
+    return f"{table}_{month.strftime('%Y%m')}"
+
+
+def is_partitioned(db: Session, table: str):
+    return bool(db.execute(text(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.relname = :table AND pg_table_is_visible(c.oid)"
+    ), {"table": table}).scalar())
+
+
+def list_partitions(db: Session, table: str):
+    return [row[0] for row in db.execute(text(
+        "SELECT child.relname FROM pg_inherits i "
+        "JOIN pg_class parent ON parent.oid = i.inhparent JOIN pg_class child ON child.oid = i.inhrelid "
+        "WHERE parent.relname = :table AND pg_table_is_visible(parent.oid)"
+    ), {"table": table})]
+
+
+def create_month_partition(db: Session, table: str, month: datetime):
+    month = _month_start(month)
+    db.execute(text(
+        f'CREATE TABLE IF NOT EXISTS "{partition_name(table, month)}" PARTITION OF "{table}" '
+        f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{_next_month(month):%Y-%m-%d}')"
+    ))
+
+
+def ensure_partitions(db: Session, now: datetime = None, months_ahead: int = PARTICOES_MESES_FUTUROS):
+    """Cria as partições do mês atual e dos próximos meses nas tabelas já particionadas."""
+    if not is_postgres(db):
+        return 0
+    created = 0
+    for table in RETENTION_POLICIES:
+        if not is_partitioned(db, table):
+            continue
+        existing = set(list_partitions(db, table))
+        month = _month_start(now or datetime.now())
+        for _ in range(months_ahead + 1):
+            if partition_name(table, month) not in existing:
+                try:
+                    create_month_partition(db, table, month)
+                    db.commit()
+                    created += 1
+                except SQLAlchemyError as e:
+                    # Ex.: linhas do mês já caíram na partição padrão, ou outro processo criou antes
+                    db.rollback()
+                    print(f"Erro ao criar partição {partition_name(table, month)}: {e}")
+            month = _next_month(month)
+    return created
+
+
+def drop_archived_partitions(db: Session, policy: RetentionPolicy, cutoff: datetime):
+    """Remove partições mensais inteiramente anteriores ao corte e já vazias (arquivadas)."""
+    if not is_postgres(db) or not is_partitioned(db, policy.table):
+        return 0
+    dropped = 0
+    prefix = f"{policy.table}_"
+    for name in list_partitions(db, policy.table):
+        suffix = name[len(prefix):]
+        if not name.startswith(prefix) or len(suffix) != 6 or not suffix.isdigit():
+            continue
+        month = datetime.strptime(suffix, "%Y%m")
+        if _next_month(month) > cutoff:
+            continue
+        if db.execute(text(f'SELECT 1 FROM "{name}" LIMIT 1')).scalar():
+            # Ainda tem linhas preservadas (ex.: status atual de um funcionário)
+            continue
+        db.execute(text(f'ALTER TABLE "{policy.table}" DETACH PARTITION "{name}"'))
+        db.execute(text(f'DROP TABLE "{name}"'))
+        db.commit()
+        dropped += 1
+    return dropped
+
+
+def _foreign_keys(db: Session, table: str, referencing: bool = False):
+    """
+    Chaves estrangeiras da tabela como [(nome, tabela, definição)]; referencing=True lista
+    as de outras tabelas que apontam para ela.
+    """
+    column = "confrelid" if referencing else "conrelid"
+    return [tuple(row) for row in db.execute(text(
+        "SELECT con.conname, rel.relname, pg_get_constraintdef(con.oid) FROM pg_constraint con "
+        "JOIN pg_class rel ON rel.oid = con.conrelid "
+        f"WHERE con.contype = 'f' AND con.{column} = CAST(:table AS regclass)"
+    ), {"table": f'"{table}"'})]
+
+
+def partition_table(db: Session, table: str, now: datetime = None, months_ahead: int = PARTICOES_MESES_FUTUROS):
+    """
+    Converte a tabela em particionada por mês na coluna de data da política (Postgres).
+    Copia os dados para a nova tabela numa única transação, com bloqueio exclusivo:
+    rodar em janela de manutenção. A chave primária passa a ser (id, data); as chaves
+    estrangeiras da tabela são recriadas. ValueError se outra tabela referencia esta
+    (a referência só ao id deixaria de ser possível).
+    """
+    policy = RETENTION_POLICIES[table]
+    column = policy.date_column
+    if is_partitioned(db, table):
+        return False
+    referencing = _foreign_keys(db, table, referencing=True)
+    if referencing:
+        nomes = ", ".join(f"{tabela}.{nome}" for nome, tabela, _ in referencing)
+        raise ValueError(f"{table} é referenciada por chaves estrangeiras ({nomes}); não pode ser particionada")
+    foreign_keys = _foreign_keys(db, table)
+    legacy = f"{table}_legado"
+    sequence = db.execute(text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": f'"{table}"'}).scalar()
+
+    db.execute(text(f'LOCK TABLE "{table}" IN ACCESS EXCLUSIVE MODE'))
+    db.execute(text(f'UPDATE "{table}" SET "{column}" = now() WHERE "{column}" IS NULL'))
+    db.execute(text(f'ALTER TABLE "{table}" RENAME TO "{legacy}"'))
+    db.execute(text(
+        f'CREATE TABLE "{table}" (LIKE "{legacy}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+        f'PARTITION BY RANGE ("{column}")'
+    ))
+    db.execute(text(f'ALTER TABLE "{table}" ALTER COLUMN "{column}" SET NOT NULL'))
+    db.execute(text(f'ALTER TABLE "{table}" ADD PRIMARY KEY ("id", "{column}")'))
+
+    oldest = db.execute(text(f'SELECT min("{column}") FROM "{legacy}"')).scalar()
+    month = _month_start(oldest.replace(tzinfo=None) if oldest else (now or datetime.now()))
+    last = _month_start(now or datetime.now())
+    for _ in range(months_ahead):
+        last = _next_month(last)
+    while month <= last:
+        create_month_partition(db, table, month)
+        month = _next_month(month)
+    db.execute(text(f'CREATE TABLE "{table}_padrao" PARTITION OF "{table}" DEFAULT'))
+
+    db.execute(text(f'INSERT INTO "{table}" SELECT * FROM "{legacy}"'))
+    if sequence:
+        db.execute(text(f'ALTER SEQUENCE {sequence} OWNED BY "{table}"."id"'))
+    db.execute(text(f'DROP TABLE "{legacy}"'))
+    # LIKE não copia chaves estrangeiras: recriadas com o nome e a definição originais (ON DELETE etc.)
+    for name, _, definition in foreign_keys:
+        db.execute(text(f'ALTER TABLE "{table}" ADD CONSTRAINT "{name}" {definition}'))
+    # Índices do modelo (não únicos) recriados na tabela particionada
+    for index in policy.model.__table__.indexes:
+        if not index.unique:
+            columns = ", ".join(f'"{c.name}"' for c in index.columns)
+            db.execute(text(f'CREATE INDEX IF NOT EXISTS "{index.name}" ON "{table}" ({columns})'))
+    db.commit()
+    return True
+
+
+class RetentionService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def run(self, tabelas=None, now: datetime = None, max_batches: int = None):
+        """Arquiva tudo o que passou da retenção; devolve {tabela: linhas arquivadas}."""
+        result = {}
+        for table, policy in RETENTION_POLICIES.items():
+            if tabelas and table not in tabelas or policy.days <= 0:
+                continue
+            cutoff = policy.cutoff(now)
+            total = 0
+            batches = 0
+            while max_batches is None or batches < max_batches:
+                archived = archive_batch(self.db, policy, cutoff)
+                if not archived:
+                    break
+                total += archived
+                batches += 1
+            drop_archived_partitions(self.db, policy, cutoff)
+            result[table] = total
+        return result
+
+
+_last_retention_run = None
+
+
+def run_retention_if_due(db: Session):
+    """Manutenção do worker: partições futuras sempre; arquivamento a cada ARQUIVAMENTO_INTERVALO_HORAS."""
+    global _last_retention_run
+    ensure_partitions(db)
+    if _last_retention_run is not None and time.monotonic() - _last_retention_run < ARQUIVAMENTO_INTERVALO_HORAS * 3600:
+        return None
+    _last_retention_run = time.monotonic()
+    return RetentionService(db).run()
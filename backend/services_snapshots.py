@@ -0,0 +1,189 @@
+import io
+import json
+import re
+import tempfile
+from datetime import datetime, date, timedelta
+from sqlalchemy.orm import Session
+import models
+from services import ReportingService, write_rows_excel, CUBO_SPOOL_MAX_BYTES
+from services_cubo import CUBO_DATE_KEYWORDS
+from services_export import write_parquet
+
+FREQUENCIAS = ("DIARIA", "SEMANAL")
+
+# Períodos relativos aceitos pelos agendamentos; "ultimos_N_dias" aceita qualquer N
+PERIODOS_RELATIVOS = ("hoje", "ontem", "ultimos_N_dias", "mes_atual", "mes_anterior", "ano_atual")
+_ULTIMOS_DIAS = re.compile(r"^ultimos_(\d{1,4})_dias$")
+_HORARIO = re.compile(r"^([01]\d|2[0-3]):([0-5]\d)$")
+
+
+def resolve_relative_range(periodo: str, today: date = None):
+    """Converte um período relativo em (início, fim) no formato YYYY-MM-DD; ValueError se desconhecido."""
+    today = today or date.today()
+    match = _ULTIMOS_DIAS.match(periodo or "")
+    if match:
+        return (today - timedelta(days=int(match.group(1)) - 1)).isoformat(), today.isoformat()
+    if periodo == "hoje":
+        return today.isoformat(), today.isoformat()
+    if periodo == "ontem":
+        yesterday = today - timedelta(days=1)
+        return yesterday.isoformat(), yesterday.isoformat()
+    if periodo == "mes_atual":
+        return today.replace(day=1).isoformat(), today.isoformat()
+    if periodo == "mes_anterior":
+        last_day = today.replace(day=1) - timedelta(days=1)
+        return last_day.replace(day=1).isoformat(), last_day.isoformat()
+    if periodo == "ano_atual":
+        return today.replace(month=1, day=1).isoformat(), today.isoformat()
+    raise ValueError(f"Período relativo inválido: {periodo}. Use um de: {', '.join(PERIODOS_RELATIVOS)}")
+
+
+def validate_schedule(frequencia: str, horario: str, dia_semana: int = None, periodo_relativo: str = None):
+    if frequencia not in FREQUENCIAS:
+        raise ValueError(f"Frequência inválida: {frequencia}. Use DIARIA ou SEMANAL")
+    if not _HORARIO.match(horario or ""):
+        raise ValueError("Horário inválido. Use HH:MM")
+    if frequencia == "SEMANAL" and (dia_semana is None or not 0 <= dia_semana <= 6):
+        raise ValueError("Agendamento semanal exige diaSemana entre 0 (segunda) e 6 (domingo)")
+    if periodo_relativo:
+        resolve_relative_range(periodo_relativo)
+
+
+def next_run(frequencia: str, horario: str, dia_semana: int = None, after: datetime = None):
+    """Próximo horário de execução estritamente depois de `after`."""
+    after = after or datetime.now()
+    hour, minute = (int(part) for part in horario.split(":"))
+    candidate = after.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if frequencia == "SEMANAL":
+        candidate += timedelta(days=(dia_semana - candidate.weekday()) % 7)
+        if candidate <= after:
+            candidate += timedelta(days=7)
+    elif candidate <= after:
+        candidate += timedelta(days=1)
+    return candidate
+
+
+class CuboSnapshotScheduler:
+    """
+    Executa os snapshots agendados e guarda o último resultado materializado
+    (XLSX e Parquet) na tabela cuboSnapshotAgendamentos.
+    Chamado periodicamente pelo loop dos workers de relatório.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def run_due(self, now: datetime = None):
+        """Executa os agendamentos vencidos; retorna quantos foram processados."""
+        now = now or datetime.now()
+        due_ids = [row.id for row in self.db.query(models.CuboSnapshotAgendamento.id).filter(
+            models.CuboSnapshotAgendamento.ativo == True,
+            models.CuboSnapshotAgendamento.proximaExecucao <= now
+        ).order_by(models.CuboSnapshotAgendamento.proximaExecucao).all()]
+
+        processed = 0
+        for agendamento_id in due_ids:
+            agendamento = self._claim(agendamento_id, now)
+            if agendamento:
+                self.materialize(agendamento)
+                processed += 1
+        return processed
+
+    def _claim(self, agendamento_id: int, now: datetime):
+        """Reserva o agendamento já avançando proximaExecucao; outro worker não o pega de novo."""
+        agendamento = self.db.query(models.CuboSnapshotAgendamento).filter(
+            models.CuboSnapshotAgendamento.id == agendamento_id
+        ).first()
+        if not agendamento:
+            return None
+        claimed = self.db.query(models.CuboSnapshotAgendamento).filter(
+            models.CuboSnapshotAgendamento.id == agendamento_id,
+            models.CuboSnapshotAgendamento.proximaExecucao == agendamento.proximaExecucao
+        ).update({
+            "proximaExecucao": next_run(agendamento.frequencia, agendamento.horario, agendamento.diaSemana, now),
+            "status": "PROCESSANDO",
+            "ultimaExecucao": now,
+        }, synchronize_session=False)
+        self.db.commit()
+        if not claimed:
+            return None
+        self.db.refresh(agendamento)
+        return agendamento
+
+    def _date_filter(self, snapshot: models.CuboSnapshot, agendamento: models.CuboSnapshotAgendamento):
+        if not snapshot.dateFilterField:
+            return None, None, None
+        if agendamento.periodoRelativo:
+            start, end = resolve_relative_range(agendamento.periodoRelativo)
+        else:
+            start, end = snapshot.dateRangeStart, snapshot.dateRangeEnd
+        return {"field": snapshot.dateFilterField, "start": start, "end": end}, start, end
+
+    def materialize(self, agendamento: models.CuboSnapshotAgendamento):
+        snapshot = self.db.query(models.CuboSnapshot).filter(models.CuboSnapshot.id == agendamento.snapshotId).first()
+        if not snapshot:
+            agendamento.ativo = False
+            agendamento.status = "ERRO"
+            agendamento.mensagem = "Snapshot não encontrado"
+            self.db.commit()
+            return False
+
+        try:
+            date_filter, start, end = self._date_filter(snapshot, agendamento)
+            columns = json.loads(snapshot.columns) if snapshot.columns else []
+            filters = json.loads(snapshot.filters) if snapshot.filters else None
+
+            # Uma única leitura do banco: o Parquet é gravado primeiro e o XLSX sai dele
+            headers, batches = ReportingService(self.db).iter_custom_cube_batches(columns, date_filter, filters)
+            with tempfile.SpooledTemporaryFile(max_size=CUBO_SPOOL_MAX_BYTES) as colunar:
+                linhas = write_parquet(colunar, headers, batches)
+                colunar.seek(0)
+                resultado_colunar = colunar.read()
+            resultado_xlsx = self._xlsx_from_parquet(headers, resultado_colunar)
+        except Exception as e:
+            self.db.rollback()
+            agendamento.status = "ERRO"
+            agendamento.mensagem = str(e) or e.__class__.__name__
+            self.db.commit()
+            print(f"Erro ao materializar snapshot {snapshot.id}: {e}")
+            return False
+
+        agendamento.status = "CONCLUIDO"
+        agendamento.mensagem = None
+        agendamento.materializadoEm = datetime.now()
+        agendamento.dataInicioResolvida = start
+        agendamento.dataFimResolvida = end
+        agendamento.linhas = linhas
+        agendamento.resultadoColunar = resultado_colunar
+        agendamento.resultadoXlsx = resultado_xlsx
+        self.db.commit()
+        return True
+
+    def _xlsx_from_parquet(self, headers: list, content: bytes):
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(io.BytesIO(content))
+        batches = (
+            list(zip(*(column.to_pylist() for column in batch.columns)))
+            for batch in parquet_file.iter_batches()
+        )
+        date_idx = [i for i, col in enumerate(headers) if any(key in col for key in CUBO_DATE_KEYWORDS)]
+        with tempfile.SpooledTemporaryFile(max_size=CUBO_SPOOL_MAX_BYTES) as output:
+            write_rows_excel(output, headers, batches, date_idx)
+            output.seek(0)
+            return output.read()
+
+
+def read_materialized_rows(content: bytes, limit: int = None):
+    """Lê o cache colunar (Parquet) do snapshot e devolve (cabeçalhos, linhas como dicts)."""
+    import pyarrow.parquet as pq
+
+    table = pq.read_table(io.BytesIO(content))
+    if limit is not None:
+        table = table.slice(0, limit)
+    rows = table.to_pylist()
+    for row in rows:
+        for key, value in row.items():
+            if isinstance(value, (datetime, date)):
+                row[key] = value.isoformat()
+    return table.column_names, rows
@@ -0,0 +1,139 @@
+from datetime import datetime
+from sqlalchemy import func, select, literal, literal_column, and_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+import models
+from services_audit import record_statement_audit
+from services_dashboard import record_upsert_deltas, UPSERT_COUNTED
+
+# Envio e reenvio de documentos como UPSERT (INSERT ... ON CONFLICT DO UPDATE ... RETURNING)
+# sobre as chaves naturais únicas (migração 0003). Duplo clique ou dois envios simultâneos
+# caem na mesma linha em vez de criar duplicatas.
+# As instruções não passam pelo flush do ORM: table_versions trata os INSERTs como escritas
+# em massa (do_orm_execute), a auditoria é registrada aqui e os contadores do dashboard
+# recebem o delta calculado a partir do status anterior e do novo devolvidos pelo RETURNING.
+
+DOCUMENTO_KEY = ("titulo", "contratoId", "competencia", "empresaId")
+ANEXO_FUNCIONARIO_KEY = ("funcionarioId", "tipo")
+
+# Colunas devolvidas pelo RETURNING (sem o conteúdo do arquivo)
+ANEXO_FUNCIONARIO_COLUMNS = [c for c in models.AnexoFuncionario.__table__.columns if c.key != "data"]
+
+
+def dialect_insert(db: Session, model):
+    """insert() com suporte a on_conflict_do_update no dialeto do banco (Postgres ou SQLite)."""
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+
+def _previous_columns(db: Session, model, key: dict, columns: tuple):
+    """
+    Colunas da linha como estavam antes do upsert, para o RETURNING (None se a linha não existia).
+    Postgres: subconsulta na mesma tabela, que enxerga o snapshot do início da instrução.
+    SQLite (desenvolvimento, um escritor por vez): o RETURNING já enxerga a linha nova,
+    então os valores são lidos antes e entram como literais.
+    """
+    table = model.__table__
+    if db.get_bind().dialect.name == "postgresql":
+        anterior = table.alias("anterior")
+        # Referência textual à linha do upsert (o SQLAlchemy não correlaciona subconsultas com um INSERT)
+        target_id = literal_column(f'"{table.name}".id')
+        return [
+            select(anterior.c[column]).where(anterior.c.id == target_id).scalar_subquery().label(f"{column}Anterior")
+            for column in columns
+        ]
+    row = db.execute(
+        select(*(table.c[column] for column in columns)).where(and_(*(table.c[k] == v for k, v in key.items())))
+    ).first()
+    return [
+        literal(row[i] if row else None, type_=table.c[column].type).label(f"{column}Anterior")
+        for i, column in enumerate(columns)
+    ]
+
+
+def _pop_previous(row: dict, columns: tuple):
+    return {column: row.pop(f"{column}Anterior") for column in columns}
+
+
+def upsert_documento(db: Session, values: dict):
+    """
+    Cria o documento ou, se a chave (título, contrato, competência, empresa) já existe, marca como
+    CORRIGIDO (reenvio). Devolve as colunas do documento; status == "CORRIGIDO" indica reenvio.
+    """
+    stmt = dialect_insert(db, models.Documento).values(status="AGUARDANDO", uploaded=True, **values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(DOCUMENTO_KEY),
+        set_={
+            "data": stmt.excluded.data,
+            "status": "CORRIGIDO",
+            "uploaded": True,
+            "updatedAt": func.now(),
+        },
+    ).returning(
+        *models.Documento.__table__.columns,
+        *_previous_columns(db, models.Documento, {k: values.get(k) for k in DOCUMENTO_KEY}, ("status", "updatedAt"))
+    )
+    documento = dict(db.execute(stmt, execution_options={UPSERT_COUNTED: True}).one()._mapping)
+    anterior = _pop_previous(documento, ("status", "updatedAt"))
+    reenviado = documento["status"] == "CORRIGIDO"
+    record_upsert_deltas(db, "documentos", reenviado, anterior["status"], documento["status"], anterior["updatedAt"])
+    record_statement_audit(db, "documentos", "UPDATE" if reenviado else "CREATE", documento["id"],
+                           documento["titulo"], "reenvio" if reenviado else None)
+    return documento
+
+
+def upsert_anexo(db: Session, documento_id: int, filename: str, content: bytes, file_hash: str):
+    """Arquivo do documento (um por documento): substitui o anterior no reenvio."""
+    stmt = dialect_insert(db, models.Anexo).values(
+        documentoId=documento_id, filename=filename, data=content, hash=file_hash
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["documentoId"],
+        set_={"filename": stmt.excluded.filename, "data": stmt.excluded.data, "hash": stmt.excluded.hash},
+    ).returning(models.Anexo.id)
+    return db.execute(stmt).scalar_one()
+
+
+def upsert_anexo_funcionario(db: Session, funcionario_id: int, tipo: str, filename: str, content: bytes,
+                             file_hash: str, observacao: str = None):
+    """Documento do funcionário por tipo; no reenvio fica CORRIGIDO e mantém a observação se não vier outra."""
+    table = models.AnexoFuncionario.__table__
+    stmt = dialect_insert(db, models.AnexoFuncionario).values(
+        funcionarioId=funcionario_id, tipo=tipo, filename=filename, status="AGUARDANDO",
+        data=content, hash=file_hash, observacao=observacao
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(ANEXO_FUNCIONARIO_KEY),
+        set_={
+            "filename": stmt.excluded.filename,
+            "status": "CORRIGIDO",
+            "data": stmt.excluded.data,
+            "hash": stmt.excluded.hash,
+            "observacao": func.coalesce(stmt.excluded.observacao, table.c.observacao),
+        },
+    ).returning(
+        *ANEXO_FUNCIONARIO_COLUMNS,
+        *_previous_columns(db, models.AnexoFuncionario, {"funcionarioId": funcionario_id, "tipo": tipo}, ("status",))
+    )
+    anexo = dict(db.execute(stmt, execution_options={UPSERT_COUNTED: True}).one()._mapping)
+    anterior = _pop_previous(anexo, ("status",))
+    reenviado = anexo["status"] == "CORRIGIDO"
+    record_upsert_deltas(db, "anexosFuncionarios", reenviado, anterior["status"], anexo["status"])
+    record_statement_audit(db, "anexosFuncionarios", "UPDATE" if reenviado else "CREATE", anexo["id"],
+                           tipo, "reenvio" if reenviado else None)
+    return anexo
+
+
+def record_upload_history(db: Session, perfil_nome: str, status: str, obs: str,
+                          documento_id: int = None, anexo_funcionario_id: int = None):
+    """Linha do histórico de aprovações do envio (gravada no mesmo commit do upsert)."""
+    db.add(models.Aprovacao(
+        perfilId=0,
+        perfilNome=perfil_nome,
+        documentoId=documento_id,
+        anexoFuncionarioId=anexo_funcionario_id,
+        obs=obs,
+        data=datetime.now().astimezone(),
+        status=status
+    ))
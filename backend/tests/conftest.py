@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Os módulos do backend são importados pelo nome (como em main.py e nos scripts)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("JWT_SECRET", "test")
@@ -0,0 +1,55 @@
+from datetime import datetime
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import auth
+import main
+import models
+
+
+@pytest.fixture
+def session_factory():
+    # Uma conexão só: as rotas síncronas rodam em outras threads
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    models.Base.metadata.create_all(engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def get_db():
+        db = factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    main.app.dependency_overrides[main.get_db] = get_db
+    main.app.dependency_overrides[auth.get_db] = get_db
+    yield factory
+    main.app.dependency_overrides.clear()
+    engine.dispose()
+
+
+def test_list_documentos_serializes_document_date(session_factory):
+    db = session_factory()
+    empresa = models.Empresa(nome="Prestadora", cnpj="1", departamento="d", chave="k")
+    db.add(empresa)
+    db.commit()
+    db.add(models.Documento(
+        titulo="Folha", data=datetime(2025, 3, 1, 10, 20).astimezone(), contratoId=1, contratoNome="C",
+        empresaId=empresa.id, empresaNome="Prestadora", categoriaId=1, categoriaNome="Cat",
+        email="e@e", competencia="03/2025"
+    ))
+    db.commit()
+    token = auth.create_access_token({"sub": "prestadora", "empresa_id": empresa.id})
+    db.close()
+
+    response = TestClient(main.app).get("/documentos", headers={"Authorization": f"Bearer {token}"})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["total"] == 1
+    assert body["data"][0]["titulo"] == "Folha"
+    assert datetime.fromisoformat(body["data"][0]["data"]).replace(tzinfo=None) == datetime(2025, 3, 1, 10, 20)
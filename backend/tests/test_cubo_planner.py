@@ -0,0 +1,85 @@
+import pytest
+from sqlalchemy import create_engine
+
+import models
+from services_cache import normalize_cubo_query
+from services_cubo import CuboQueryError, CuboQueryPlanner, compile_measures
+
+INJECTED_LABEL = 'x", (SELECT group_concat(email) FROM users) AS "y'
+
+
+@pytest.fixture
+def connection():
+    engine = create_engine("sqlite://")
+    models.Base.metadata.create_all(engine)
+    with engine.connect() as conn:
+        yield conn
+
+
+def test_measure_label_is_not_part_of_sql():
+    planner = CuboQueryPlanner.for_aggregate(["Empresa"], [{"op": "count", "label": INJECTED_LABEL}])
+    sql, _ = planner.build_aggregate_sql()
+    assert "group_concat" not in sql
+    assert "users" not in sql
+    assert 'COUNT(*) AS m0' in sql
+
+
+def test_measure_label_is_kept_in_headers():
+    planner = CuboQueryPlanner.for_aggregate(
+        ["Empresa"], [{"op": "count", "label": INJECTED_LABEL}, {"op": "max", "field": "Validade ASO"}]
+    )
+    _, _, headers = planner.build_aggregate()
+    assert headers == ["Empresa", INJECTED_LABEL, "Máximo de Validade ASO"]
+
+
+@pytest.mark.parametrize("label", [INJECTED_LABEL, ":email", "a\" OR 1=1 --", "'; DROP TABLE users; --"])
+def test_aggregate_with_malicious_label_runs_as_plain_count(connection, label):
+    connection.exec_driver_sql("INSERT INTO users (\"openId\", email, role) VALUES ('u', 'secret@x', 'user')")
+    planner = CuboQueryPlanner.for_aggregate([], [{"op": "count", "label": label}])
+    query, params, headers = planner.build_aggregate()
+    rows = connection.execute(query, params).all()
+    assert headers == [label]
+    assert rows == [(0,)]
+    assert connection.exec_driver_sql("SELECT COUNT(*) FROM users").scalar() == 1
+
+
+@pytest.mark.parametrize("measure", ["count", 1, None, ["count"]])
+def test_non_dict_measure_is_rejected(measure):
+    with pytest.raises(ValueError):
+        compile_measures([measure])
+
+
+def test_measure_field_must_be_a_cubo_field():
+    with pytest.raises(ValueError):
+        compile_measures([{"op": "min", "field": 'sf.id) FROM users --'}])
+    with pytest.raises(ValueError):
+        compile_measures([{"op": "min", "field": ["Validade ASO"]}])
+
+
+def test_unknown_columns_and_filters_are_ignored():
+    planner = CuboQueryPlanner(
+        ['sf.id" FROM users --', "Empresa"],
+        column_filters={'x" OR 1=1 --': {"operator": "igual", "value": "a"}},
+    )
+    sql, params = planner.build_sql()
+    assert "users" not in sql and "OR 1=1" not in sql
+    assert planner.headers == ["Empresa"]
+    assert params == {}
+
+
+def test_filter_values_are_bound_parameters():
+    planner = CuboQueryPlanner(["Empresa"], column_filters={"Empresa": {"operator": "igual", "value": "' OR 1=1 --"}})
+    sql, params = planner.build_sql()
+    assert "OR 1=1" not in sql
+    assert params == {"col_filter_0": "' OR 1=1 --"}
+
+
+def test_non_dict_filter_is_rejected():
+    with pytest.raises(CuboQueryError):
+        CuboQueryPlanner(["Empresa"], column_filters={"Empresa": "x"})
+
+
+def test_non_dict_filter_is_rejected_before_the_cache_key():
+    # A chave do cache do XLSX é calculada antes do planner validar a consulta
+    with pytest.raises(CuboQueryError, match="Filtro inválido para Empresa"):
+        normalize_cubo_query(["Empresa"], column_filters={"Empresa": "x"})
@@ -0,0 +1,45 @@
+import io
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+from services_export import write_parquet
+
+HEADERS = ["id", "valor", "data", "nome"]
+FIRST_BATCH = [(1, 1.5, datetime(2024, 1, 1, 8, 30), "a")]
+
+
+def read_rows(output):
+    output.seek(0)
+    return pq.read_table(output).to_pylist()
+
+
+def test_compatible_values_in_later_batches_are_kept():
+    output = io.BytesIO()
+    later = [(2.0, 3, date(2024, 1, 2), 10), (Decimal(3), Decimal("2.5"), "2024-01-03T09:00", None), (None, None, None, None)]
+    assert write_parquet(output, HEADERS, iter([FIRST_BATCH, later])) == 4
+    rows = read_rows(output)
+    assert rows[1] == {"id": 2, "valor": 3.0, "data": datetime(2024, 1, 2), "nome": "10"}
+    assert rows[2] == {"id": 3, "valor": 2.5, "data": datetime(2024, 1, 3, 9), "nome": None}
+    assert rows[3] == {"id": None, "valor": None, "data": None, "nome": None}
+
+
+@pytest.mark.parametrize("row, column", [
+    ((2.5, None, None, None), "id"),
+    ((None, "x", None, None), "valor"),
+    ((None, None, "ontem", None), "data"),
+    ((True, None, None, None), "id"),
+])
+def test_incompatible_value_fails_instead_of_writing_null(row, column):
+    with pytest.raises(ValueError, match=f"coluna '{column}'"):
+        write_parquet(io.BytesIO(), HEADERS, iter([FIRST_BATCH, [row]]))
+
+
+def test_empty_export_writes_string_schema():
+    output = io.BytesIO()
+    assert write_parquet(output, HEADERS, iter([])) == 0
+    output.seek(0)
+    assert pq.read_table(output).schema.names == HEADERS
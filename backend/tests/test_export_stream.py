@@ -0,0 +1,62 @@
+import json
+
+import pytest
+
+import services_cubo
+from services_cubo import CuboQueryTooLarge, cap_batches
+from services_export import iter_export
+
+HEADERS = ["id", "nome"]
+
+
+def batches(total, size=2):
+    rows = [(i, f"n{i}") for i in range(total)]
+    return (rows[start:start + size] for start in range(0, total, size))
+
+
+@pytest.fixture
+def max_rows(monkeypatch):
+    monkeypatch.setattr(services_cubo, "CUBO_MAX_ROWS", 5)
+
+
+def test_cap_batches_yields_up_to_the_limit_then_raises(max_rows):
+    seen = []
+    with pytest.raises(CuboQueryTooLarge):
+        for batch in cap_batches(batches(9)):
+            seen.extend(batch)
+    assert [row[0] for row in seen] == [0, 1, 2, 3, 4]
+
+
+def test_cap_batches_allows_exactly_the_limit(max_rows):
+    assert sum(len(batch) for batch in cap_batches(batches(5))) == 5
+
+
+def test_csv_over_the_limit_ends_with_error_marker(max_rows):
+    body = b"".join(iter_export("csv", lambda db: (HEADERS, cap_batches(batches(9))))).decode("utf-8")
+    lines = body.splitlines()
+    assert lines[0] == "id,nome"
+    assert len(lines) == 7
+    assert lines[-1].startswith("#ERRO,")
+    assert "passa de 5 linhas" in lines[-1]
+
+
+def test_ndjson_over_the_limit_ends_with_error_marker(max_rows):
+    body = b"".join(iter_export("ndjson", lambda db: (HEADERS, cap_batches(batches(9))))).decode("utf-8")
+    lines = [json.loads(line) for line in body.splitlines()]
+    assert len(lines) == 6
+    assert lines[-1]["incompleta"] is True
+    assert "passa de 5 linhas" in lines[-1]["erro"]
+
+
+def test_error_before_first_chunk_is_raised():
+    def source(db):
+        raise CuboQueryTooLarge("grande demais")
+
+    with pytest.raises(CuboQueryTooLarge):
+        next(iter_export("csv", source))
+
+
+def test_parquet_over_the_limit_raises_before_any_bytes(max_rows):
+    pytest.importorskip("pyarrow")
+    with pytest.raises(CuboQueryTooLarge):
+        next(iter_export("parquet", lambda db: (HEADERS, cap_batches(batches(9)))))
@@ -0,0 +1,59 @@
+import io
+import base64
+import pickle
+
+import pytest
+from PIL import Image
+
+import models
+from services_pdf import BrandingCache, PDFReport
+
+
+@pytest.fixture
+def db():
+    session = models.SessionLocal()
+    models.Base.metadata.create_all(session.get_bind())
+    yield session
+    session.rollback()
+    session.query(models.Configuracao).delete()
+    session.commit()
+    session.close()
+
+
+def logo_data_url():
+    buffer = io.BytesIO()
+    Image.new("RGB", (60, 30), (200, 0, 0)).save(buffer, "PNG")
+    return "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+def render(branding):
+    pdf = PDFReport(branding, "Relatório")
+    pdf.add_page()
+    pdf.add_page()
+    return bytes(pdf.output())
+
+
+def test_logo_is_rendered_once_per_document(db):
+    db.add(models.Configuracao(nomeEmpresa="ACME", logoImage=logo_data_url()))
+    db.commit()
+    branding = BrandingCache().get(db)
+    assert branding.logo is not None
+
+    # O mesmo branding (imagem decodificada uma vez) serve a vários documentos
+    for _ in range(2):
+        assert render(branding).count(b"/Subtype /Image") == 1
+
+
+def test_branding_with_logo_survives_pickling_for_the_cpu_pool(db):
+    db.add(models.Configuracao(nomeEmpresa="ACME", logoImage=logo_data_url()))
+    db.commit()
+    branding = pickle.loads(pickle.dumps(BrandingCache().get(db)))
+    assert render(branding).count(b"/Subtype /Image") == 1
+
+
+def test_invalid_logo_is_ignored(db):
+    db.add(models.Configuracao(nomeEmpresa="ACME", logoImage="data:image/png;base64,bm90IGFuIGltYWdl"))
+    db.commit()
+    branding = BrandingCache().get(db)
+    assert branding.logo is None
+    assert render(branding).count(b"/Subtype /Image") == 0
@@ -0,0 +1,52 @@
+"""
+Worker de relatórios em segundo plano.
+
+Uso:
+    python worker.py                # um processo
+    python worker.py --processos 4  # quatro processos consumindo a mesma fila
+
+Consome a tabela relatorioJobs; pode rodar em quantas máquinas/containers forem
+necessários, desde que apontem para o mesmo DATABASE_URL.
+"""
+import argparse
+import multiprocessing
+import signal
+import threading
+
+from services_jobs import run_worker
+
+
+def _run_process():
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    signal.signal(signal.SIGINT, lambda *_: stop_event.set())
+    run_worker(stop_event=stop_event)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker da fila de relatórios")
+    parser.add_argument("--processos", type=int, default=1, help="Número de processos worker")
+    args = parser.parse_args()
+
+    if args.processos <= 1:
+        print("Worker de relatórios iniciado")
+        _run_process()
+        return
+
+    processes = [multiprocessing.Process(target=_run_process, name=f"relatorio-worker-{i}") for i in range(args.processos)]
+    for process in processes:
+        process.start()
+    print(f"Worker de relatórios iniciado com {len(processes)} processos")
+
+    def stop(*_):
+        for process in processes:
+            process.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
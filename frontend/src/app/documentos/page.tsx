@@ -72,7 +72,7 @@ function HistoryModal({ docId, titulo, onClose }: HistoryModalProps) {
                                         <div className="flex justify-between items-start relative z-10">
                                             <div className="text-left">
                                                 <div className="font-bold text-gray-800 text-sm">{ap.perfilNome}</div>
-                                                <div className="text-xs text-gray-400 mt-0.5">{ap.data}</div>
+                                                <div className="text-xs text-gray-400 mt-0.5">{new Date(ap.data).toLocaleString('pt-BR')}</div>
                                             </div>
                                             <span className={`inline-flex items-center space-x-1 px-3 py-1 rounded-full border text-[10px] font-black uppercase tracking-widest ${apStatusInfo.color}`}>
                                                 <apStatusInfo.icon size={10} />
@@ -452,6 +452,7 @@ function DocumentosList() {
                                         <span className="text-sm font-medium text-gray-600 bg-gray-100 px-2 py-1 rounded-md">
                                             {doc.competencia}
                                         </span>
+                                        <div className="text-xs text-gray-400 mt-1">{new Date(doc.data).toLocaleString('pt-BR')}</div>
                                     </td>
                                     <td className="py-5 px-6">
                                         <div className={`flex items-center justify-center space-x-1.5 px-3 py-1.5 rounded-full border text-xs font-bold leading-none ${statusInfo.color}`}>